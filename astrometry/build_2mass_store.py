@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Add a local extract of 2MASS, in the fixed-width format written by
+`find2mass`, to a reference store for fetch_2mass.py.
+'''
+
+import argparse
+import itertools
+from qa_common import get_logger
+from qa_common.instrument import instrumented
+from qa_common.reference_store import ReferenceStore, parse_find2mass
+
+logger = get_logger(__file__)
+
+
+def read_chunks(infile, nlines):
+    while True:
+        lines = list(itertools.islice(infile, nlines))
+        if not lines:
+            return
+        yield parse_find2mass(''.join(lines))
+
+
+@instrumented
+def main(args):
+    store = ReferenceStore(args.store)
+    for fname in args.extract:
+        logger.info('Reading %s', fname)
+        with open(fname) as infile:
+            for sources in read_chunks(infile, args.chunk_size):
+                store.add(sources)
+
+    # Only record the box once all of its sources are in the store
+    if args.box:
+        store.add([], box=args.box)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('extract', nargs='+', help='find2mass output files')
+    parser.add_argument('-s', '--store', required=True,
+                        help='Reference store directory')
+    parser.add_argument('-b', '--box', nargs=3, type=float,
+                        metavar=('RA', 'DEC', 'WIDTH'),
+                        help='Box, in degrees, which the extract covers in '
+                        'full. Without it the sources are only used with '
+                        'fetch_2mass.py --offline')
+    parser.add_argument('--chunk-size', type=int, default=1000000,
+                        help='Lines to parse at once [default: 1000000]')
+    main(parser.parse_args())
@@ -1,62 +1,156 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+'''
+Extract the pointing and astrometric solution of every reduced frame.
+
+Headers are read in a pool of threads, keeping only the table keys and the
+WCS cards, and the WCS of all frames is then evaluated at once with
+`qa_common.projection`. With `--grid N` the solutions are also evaluated on
+an N x N grid of pixels per frame, written to `--grid-output` with the
+offset of each position from the median over the frames, to show how stable
+the distortion is through the night.
+'''
+
 import argparse
-import csv
-import fitsio
-from astropy import wcs
+from multiprocessing.pool import ThreadPool
+import numpy as np
 
 from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.cache import open_memo, add_cache_arguments
+from qa_common.binary_table import write_table, add_format_argument
+from qa_common.projection import Projections, wcs_cards
+from qa_common.sky import offsets
+from qa_common import header_index
 
 logger = get_logger(__file__)
 
-class Extracted(object):
-    keys = ['fname', 'mjd', 'cmd_ra', 'cmd_dec',
-            'tel_ra', 'tel_dec', 'crval1', 'crval2', 'cd1_1', 'cd1_2',
-            'cd2_1', 'cd2_2', 'pv2_1', 'pv2_3', 'pv2_5',
-            'skylevel', 'skynoise', 'numbrms', 'stdcrms']
-    wcs_keys = ['solved_ra', 'solved_dec']
-
-    all_keys = keys + wcs_keys
-
-    def __init__(self, fname):
-        self.fname = fname
-
-    def writerow(self, writer):
-        writer.writerow(self.extract_data())
-
-    def extract_data(self):
-        self.header = fitsio.read_header(self.fname)
-        extracted = {
-                key: getattr(self, key) for key in self.keys
-                }
-        extracted.update(self.wcs_solution())
-
-        return extracted
-
-    def __getattr__(self, name):
-        return self.header[name]
-
-
-    def wcs_solution(self):
-        file_wcs = wcs.WCS(self.header)
-        coordinates = file_wcs.all_pix2world([1024, ], [1024, ], 1)
-        solved_ra = coordinates[0][0]
-        solved_dec = coordinates[1][0]
-
-        return {'solved_ra': solved_ra, 'solved_dec': solved_dec}
-
+KEYS = ['fname', 'mjd', 'cmd_ra', 'cmd_dec',
+        'tel_ra', 'tel_dec', 'crval1', 'crval2', 'cd1_1', 'cd1_2',
+        'cd2_1', 'cd2_2', 'pv2_1', 'pv2_3', 'pv2_5',
+        'skylevel', 'skynoise', 'numbrms', 'stdcrms']
+WCS_KEYS = ['solved_ra', 'solved_dec']
+ALL_KEYS = KEYS + WCS_KEYS
+GRID_KEYS = ['fname', 'mjd', 'x', 'y', 'ra', 'dec', 'dra', 'ddec']
+
+# Pixel at which the solution is reported, 1-based
+CENTRE = (1024., 1024.)
+
+
+def read_header(fname):
+    '''
+    The table keys and WCS cards of the primary header of `fname`
+    '''
+    header = header_index.read_header(fname)
+    return {'keys': dict((key, header[key]) for key in KEYS),
+            'wcs': wcs_cards(header)}
+
+
+def astropy_pix2world(cards, x, y):
+    # Imported here as it is only needed for unusual projections, and slow
+    from astropy import wcs
+    from astropy.io import fits
+    header = fits.Header()
+    for (key, value) in sorted(cards.items()):
+        header[key] = value
+    return wcs.WCS(header).all_pix2world(x, y, 1)
+
+
+def pix2world(headers, x, y):
+    '''
+    Sky positions of pixels `x`, `y` (n, k) on the `n` frames of
+    `headers`, using astropy for any frame the vectorised projection does
+    not support
+    '''
+    projections = Projections([header['wcs'] for header in headers])
+    ra, dec = projections.pix2world(x, y)
+    for i in np.flatnonzero(~projections.supported):
+        logger.debug('Projection %s not vectorised, using astropy',
+                     projections.projection[i])
+        ra[i], dec[i] = astropy_pix2world(headers[i]['wcs'],
+                                          np.broadcast_to(x, ra.shape)[i],
+                                          np.broadcast_to(y, ra.shape)[i])
+    return ra, dec
+
+
+def solve(headers):
+    '''
+    Table rows of `headers`, with the sky position of the centre pixel
+    '''
+    ra, dec = pix2world(headers, *CENTRE)
+    rows = []
+    for (header, solved_ra, solved_dec) in zip(headers, ra[:, 0], dec[:, 0]):
+        row = dict(header['keys'])
+        row.update(solved_ra=solved_ra, solved_dec=solved_dec)
+        rows.append(row)
+    return rows
+
+
+def pixel_grid(headers, size):
+    '''
+    (n, size * size) pixel positions evenly covering each frame
+    '''
+    x, y = [], []
+    for header in headers:
+        cards = header['wcs']
+        xx, yy = np.meshgrid(
+            np.linspace(1., cards.get('NAXIS1', 2048), size),
+            np.linspace(1., cards.get('NAXIS2', 2048), size))
+        x.append(xx.ravel())
+        y.append(yy.ravel())
+    return np.array(x), np.array(y)
+
+
+def solve_grid(headers, size):
+    '''
+    Grid table rows: the sky position of each grid pixel on each frame, and
+    its offset in arcseconds from the median position over the frames
+    '''
+    x, y = pixel_grid(headers, size)
+    ra, dec = pix2world(headers, x, y)
+    dra, ddec = offsets(ra, dec, ra[:1], dec[:1])
+    dra = (dra - np.median(dra, axis=0)) * 3600.
+    ddec = (ddec - np.median(ddec, axis=0)) * 3600.
+    return [(header['keys']['fname'], header['keys']['mjd']) + values
+            for (i, header) in enumerate(headers)
+            for values in zip(x[i], y[i], ra[i], dec[i], dra[i], ddec[i])]
+
+
+def extract(fname):
+    return solve([read_header(fname)])[0]
+
+
+@instrumented
 def main(args):
     logger.info('Output file: %s', args.output)
-    writer = csv.DictWriter(args.output, fieldnames=Extracted.all_keys)
-    writer.writeheader()
 
     logger.info('Parsing filelist')
     with open(args.filelist) as infile:
-        for line in infile:
-            fname = line.strip('\n')
-            Extracted(fname).writerow(writer)
+        files = [line.strip('\n') for line in infile]
+
+    memo = open_memo('extract_wcs_parameters.headers', args.cache,
+                     hash_contents=args.cache_hash)
+    pool = ThreadPool(args.threads)
+    with stage('read'):
+        try:
+            headers = memo.map(read_header, files, mapper=pool.map)
+        finally:
+            memo.close()
+            pool.close()
+            pool.join()
+
+    with stage('extract'):
+        rows = solve(headers)
+
+    with stage('write'):
+        write_table(args.output, rows, ALL_KEYS, format=args.format)
 
+    if args.grid and headers:
+        with stage('grid'):
+            grid_rows = solve_grid(headers, args.grid)
+            write_table(args.grid_output, grid_rows, GRID_KEYS,
+                        format=args.format)
 
 
 if __name__ == '__main__':
@@ -64,4 +158,15 @@ if __name__ == '__main__':
     parser.add_argument('filelist')
     parser.add_argument('-o', '--output', help='Output image',
             required=False, default='-', type=argparse.FileType(mode='w'))
-    main(parser.parse_args())
+    parser.add_argument('-t', '--threads', type=int, default=8,
+            help='Number of threads reading headers [default: 8]')
+    parser.add_argument('--grid', type=int, default=0, metavar='N',
+            help='Also evaluate the solutions on an N x N pixel grid')
+    parser.add_argument('--grid-output', type=argparse.FileType(mode='w'),
+            help='Output table of the grid solutions')
+    add_cache_arguments(parser)
+    add_format_argument(parser)
+    args = parser.parse_args()
+    if args.grid and args.grid_output is None:
+        parser.error('--grid requires --grid-output')
+    main(args)
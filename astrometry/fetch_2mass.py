@@ -6,78 +6,83 @@ import os
 import subprocess as sp
 import fitsio
 import numpy as np
-import tempfile
 import csv
 from qa_common import get_logger
+from qa_common.instrument import instrumented
+from qa_common.reference_store import ReferenceStore, parse_find2mass
 
 logger = get_logger(__file__)
 
+STORE_ENV = 'QA_2MASS_STORE'
+KEYS = ['ra', 'dec', 'jmag', 'name_2mass']
+
+
 class Catalogue(object):
-    def __init__(self, ra, dec, box_width=3, max_objects=1E6):
+    def __init__(self, ra, dec, box_width=3, max_objects=1E6, store=None,
+                 offline=False):
         self.ra = ra
         self.dec = dec
         self.box_width = box_width
         self.max_objects = int(max_objects)
+        self.store = store
+        self.offline = offline
 
-        logger.info('Searching in box',
-                    ra=self.ra,
-                    dec=self.dec,
-                    box_width=self.box_width)
+        logger.info('Searching in box, ra: %s, dec: %s, box width: %s',
+                    self.ra, self.dec, self.box_width)
 
-    def build(self, output_filename):
+    def fetch(self):
+        '''
+        Run `find2mass` for the box, returning the parsed sources
+        '''
         ra = str(self.ra)
-        dec = '+{}'.format(self.dec) if self.dec > 0 else '-{}'.format(self.dec)
+        dec = '{:+}'.format(self.dec)
 
-        cmd = map(str, ['find2mass',
+        cmd = [str(arg) for arg in ['find2mass',
             ra, dec,
             '-m', self.max_objects,
-            '-bd', self.box_width])
-
-        logger.debug("Running command: %s", ' '.join(cmd)
-        output = sp.check_output(cmd, stderr=sp.PIPE)
+            '-bd', self.box_width]]
+
+        logger.debug("Running command: %s", ' '.join(cmd))
+        return parse_find2mass(sp.check_output(cmd))
+
+    def sources(self):
+        '''
+        Sources in the box, from the reference store if it covers the box,
+        otherwise from `find2mass`, adding them to the store
+        '''
+        box = (self.ra, self.dec, self.box_width)
+        if self.store is not None:
+            if self.store.covers(*box):
+                logger.info('Reading sources from store %s',
+                            self.store.directory)
+                return self.store.box_search(*box)
+            if self.offline:
+                logger.warning('Store %s does not cover the whole box, '
+                               'it may be missing sources',
+                               self.store.directory)
+                return self.store.box_search(*box)
+
+        sources = self.fetch()
+        if self.store is not None:
+            # A truncated result does not cover the box
+            complete = len(sources) < self.max_objects
+            self.store.add(sources, box=box if complete else None)
+        return sources
 
+    def build(self, output_filename):
+        sources = self.sources()
+        logger.info('Writing %s sources to %s', len(sources), output_filename)
         with open(output_filename, 'w') as outfile:
-            keys = ['ra', 'dec', 'jmag', 'name_2mass']
-            writer = csv.DictWriter(outfile, fieldnames=keys)
-            writer.writeheader()
-
-            for line in output.split("\n"):
-                if line and '#' not in line:
-                    data = self.extract_all(line)
-
-                    writer.writerow(data)
-
-
-    @staticmethod
-    def _extract(line, beginning, end):
-        return line[beginning:end]
-
-    def extract_ra(self, line):
-        return float(self._extract(line, 0, 10))
-
-    def extract_dec(self, line):
-        return float(self._extract(line, 12, 21))
-
-    def extract_jmag(self, line):
-        return float(self._extract(line, 54, 60))
-    
-    def extract_name(self, line):
-        return self._extract(line, 36, 52)
-
-    def extract_all(self, line):
-        ra = self.extract_ra(line)
-        dec = self.extract_dec(line)
-        jmag = self.extract_jmag(line)
-        name = self.extract_name(line)
-
-        return {'ra': ra,
-                'dec': dec,
-                'jmag': jmag,
-                'name_2mass': name,
-                }
+            writer = csv.writer(outfile)
+            writer.writerow(KEYS)
+            writer.writerows(zip(sources['ra'], sources['dec'],
+                                 sources['jmag'].astype(float),
+                                 np.char.decode(sources['name_2mass'],
+                                                'ascii')))
 
 
-def build_catalogue(input_filename, output_filename):
+def build_catalogue(input_filename, output_filename, store=None,
+                    offline=False):
     with fitsio.FITS(input_filename) as infile:
         data = zip(*infile[1]['RA', 'DEC'].read())
 
@@ -85,17 +90,29 @@ def build_catalogue(input_filename, output_filename):
     av_ra = np.average(ra)
     av_dec = np.average(dec)
 
-    catalogue = Catalogue(av_ra, av_dec).build(output_filename)
+    Catalogue(av_ra, av_dec, store=store, offline=offline).build(
+        output_filename)
 
 
+@instrumented
 def main(args):
     logger.debug('Matching from catalogue %s', args.catalogue)
-    logger.debug('Output file: %s', output)
-    build_catalogue(args.catalogue, args.output)
+    logger.debug('Output file: %s', args.output)
+    store_dir = args.store or os.environ.get(STORE_ENV)
+    if args.offline and not store_dir:
+        raise SystemExit('--offline requires a reference store')
+    store = ReferenceStore(store_dir) if store_dir else None
+    build_catalogue(args.catalogue, args.output, store=store,
+                    offline=args.offline)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('catalogue', help='Input catalogue')
     parser.add_argument('-o', '--output', required=True,
             type=str, help='Output image name')
+    parser.add_argument('-s', '--store', required=False,
+            help='Local 2MASS reference store [default: ${}]'.format(
+                STORE_ENV))
+    parser.add_argument('--offline', action='store_true', default=False,
+            help='Only read from the reference store, never run find2mass')
     main(parser.parse_args())
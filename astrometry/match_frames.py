@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Match every frame catalogue of a night with a 2MASS reference catalogue
+from fetch_2mass.py, and write a table of the astrometric residuals of
+each frame.
+
+The reference KD-tree is built once, before the worker processes are
+forked, so the workers share it rather than rebuilding it for each frame.
+Rows are written as the frames are matched.
+
+Residuals are catalogue minus reference position, in arcseconds, with the
+right ascension residual multiplied by cos(dec). The `*_trend` columns are
+the slopes of a plane fitted to each residual against the pixel position,
+in arcseconds per 1000 pixels.
+'''
+
+import argparse
+import os
+from multiprocessing import Pool
+import numpy as np
+import fitsio
+
+from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.skymatch import SkyMatcher, MODES, read_reference
+from qa_common.sky import offsets
+from qa_common.binary_table import write_table, add_format_argument
+
+logger = get_logger(__file__)
+
+KEYS = ['fname', 'mjd', 'nsources', 'nmatched', 'median_separation',
+        'rms_separation', 'ra_offset', 'dec_offset', 'ra_x_trend',
+        'ra_y_trend', 'dec_x_trend', 'dec_y_trend']
+
+# Fewest matches to fit the residual trends with
+MIN_MATCHES = 3
+
+# Set in each worker by `init_worker`
+_state = {}
+
+
+def init_worker(matcher, reference, radius, mode):
+    _state.update(matcher=matcher, reference=reference, radius=radius,
+                  mode=mode)
+
+
+def residual_trends(x, y, residual):
+    '''
+    Slopes of the plane `residual = a + b x + c y`, per 1000 pixels
+    '''
+    design = np.column_stack([np.ones_like(x), x, y])
+    coefficients = np.linalg.lstsq(design, residual, rcond=None)[0]
+    return coefficients[1:] * 1000.
+
+
+def frame_residuals(fname, matcher, reference, radius, mode='best'):
+    '''
+    Match the catalogue `fname`, with positions in radians, within
+    `radius` degrees and summarise the residuals
+    '''
+    with fitsio.FITS(fname) as infile:
+        mjd = infile[0].read_header()['MJD']
+        catalogue = infile[1].read(columns=['RA', 'DEC', 'X_coordinate',
+                                            'Y_coordinate'])
+
+    ra, dec = np.degrees(catalogue['RA']), np.degrees(catalogue['DEC'])
+    index1, index2, separation = matcher.match(ra, dec, radius, mode=mode)
+    row = dict((key, np.nan) for key in KEYS)
+    row.update(fname=os.path.basename(fname), mjd=mjd,
+               nsources=catalogue.size, nmatched=index1.size)
+    logger.debug('%s => %d of %d matched', fname, index1.size, catalogue.size)
+    if index1.size < MIN_MATCHES:
+        return row
+
+    separation = separation * 3600.
+    dra, ddec = offsets(ra[index1], dec[index1], reference['ra'][index2],
+                        reference['dec'][index2])
+    dra, ddec = dra * 3600., ddec * 3600.
+    x = catalogue['X_coordinate'][index1].astype(float)
+    y = catalogue['Y_coordinate'][index1].astype(float)
+
+    row.update(median_separation=np.median(separation),
+               rms_separation=np.sqrt(np.mean(separation ** 2)),
+               ra_offset=np.median(dra), dec_offset=np.median(ddec))
+    row['ra_x_trend'], row['ra_y_trend'] = residual_trends(x, y, dra)
+    row['dec_x_trend'], row['dec_y_trend'] = residual_trends(x, y, ddec)
+    return row
+
+
+def match_frame(fname):
+    return frame_residuals(fname, **_state)
+
+
+@instrumented
+def main(args):
+    with open(args.filelist) as infile:
+        files = [line.strip('\n') for line in infile if line.strip()]
+    logger.info('Matching %s frames with %s', len(files), args.reference)
+
+    with stage('read'):
+        reference = read_reference(args.reference)
+        matcher = SkyMatcher(reference['ra'], reference['dec'])
+
+    # On fork the workers inherit the tree rather than unpickling it
+    pool = Pool(args.jobs, initializer=init_worker,
+                initargs=(matcher, reference, args.error / 3600., args.mode))
+    with stage('extract'):
+        try:
+            rows = pool.imap(match_frame, files, chunksize=args.chunksize)
+            write_table(args.output, rows, KEYS, format=args.format)
+        finally:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('filelist', help='File listing the frame catalogues')
+    parser.add_argument('--2mass', dest='reference', required=True,
+                        help='Reference catalogue from fetch_2mass.py')
+    parser.add_argument('-o', '--output', required=False, default='-',
+                        type=argparse.FileType(mode='w'),
+                        help='Output table')
+    parser.add_argument('-e', '--error', type=float, default=10.,
+                        help='Match radius in arcseconds [default: 10]')
+    parser.add_argument('-m', '--mode', choices=MODES, default='best',
+                        help='Which matches to keep [default: best]')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of processes [default: one per cpu]')
+    parser.add_argument('--chunksize', type=int, default=4,
+                        help='Frames sent to a process at a time '
+                        '[default: 4]')
+    add_format_argument(parser)
+    main(parser.parse_args())
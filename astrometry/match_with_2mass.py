@@ -1,60 +1,102 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+'''
+Match a CASU catalogue with a 2MASS reference catalogue from fetch_2mass.py.
+
+The output table has the matched rows of both catalogues side by side, as
+written by stilts `tskymatch2`: columns whose names clash (ignoring case)
+get `_1` and `_2` suffixes, e.g. `RA_1` and `ra_2`, and the `Separation`
+column holds the separation in arcseconds. The `dRA_cosDEC` and `dDEC`
+columns hold the offsets of the catalogue positions from the reference
+positions in arcseconds, so the plots do not need to recompute them.
+'''
+
 import argparse
-import os
-import subprocess as sp
+import numpy as np
+import fitsio
 from qa_common import get_logger
+from qa_common.instrument import instrumented
+from qa_common.skymatch import SkyMatcher, MODES, read_reference
+from qa_common.sky import offsets, SEPARATION_COLUMN, OFFSET_COLUMNS
 
 logger = get_logger(__file__)
 
-class Stilts(object):
-    stilts_file = os.path.join(os.path.dirname(__file__),
-            'stilts.jar')
-    service_url = 'http://wfaudata.roe.ac.uk/twomass-dsa/DirectCone?DSACAT=TWOMASS&DSATAB=twomass_psc&'
-
-    def __init__(self):
-        self.command = ['java', '-jar', self.stilts_file, ]
-
-    def build_command(self, *args, **kwargs):
-        cmd = self.command[:]
-        cmd.extend(args)
-        for key, value in kwargs.iteritems():
-            cmd.append('{}={}'.format(key, value))
-
-        cmd = map(str, cmd)
-
-        logger.debug('Running command: %s', ' '.join(cmd)
-
-        return cmd
-
-    def run_command(self, *args, **kwargs):
-        sp.check_call(self.build_command(*args, **kwargs))
-
-    @classmethod
-    def run(cls, *args, **kwargs):
-        self = cls()
-        self.run_command(*args, **kwargs)
-
-
-def match(input_catalogue, reference_catalogue, output_filename, error=10):
-    in1 = '{}#1'.format(input_catalogue)
-    in2 = '{}'.format(reference_catalogue)
-
-    ra1 = 'radiansToDegrees(RA)'
-    dec1 = 'radiansToDegrees(DEC)'
-
-    ra2 = 'ra'
-    dec2 = 'dec'
-
-    Stilts.run('tskymatch2', in1=in1, in2=in2,
-            out=output_filename,
-            ifmt2='csv',
-            error=error, ra1=ra1, dec1=dec1, ra2=ra2, dec2=dec2)
-
-
+# Header keys fitsio writes itself
+STRUCTURAL_KEYS = ('XTENSION', 'BITPIX', 'NAXIS', 'PCOUNT', 'GCOUNT',
+                   'TFIELDS', 'TTYPE', 'TFORM', 'TUNIT', 'TNULL', 'TSCAL',
+                   'TZERO', 'TDISP', 'TDIM', 'THEAP', 'EXTNAME', 'CHECKSUM',
+                   'DATASUM')
+
+
+def output_names(names1, names2):
+    '''
+    Output column names for the columns of both tables, with `_1` and `_2`
+    added to names appearing in both
+    '''
+    lower1 = set(name.lower() for name in names1)
+    lower2 = set(name.lower() for name in names2)
+    return ([name + '_1' if name.lower() in lower2 else name
+             for name in names1],
+            [name + '_2' if name.lower() in lower1 else name
+             for name in names2])
+
+
+def join_columns(table1, table2, index1, index2, extra=()):
+    '''
+    Structured array of the matched rows of `table1` and `table2`, which
+    are structured arrays, followed by the `extra` (name, column) pairs
+    '''
+    names1, names2 = output_names(table1.dtype.names, table2.dtype.names)
+    columns = ([(name, table1[key][index1])
+                for (name, key) in zip(names1, table1.dtype.names)] +
+               [(name, table2[key][index2])
+                for (name, key) in zip(names2, table2.dtype.names)] +
+               list(extra))
+
+    output = np.empty(len(index1), dtype=[
+        (str(name), column.dtype, column.shape[1:])
+        for (name, column) in columns])
+    for (name, column) in columns:
+        output[str(name)] = column
+    return output
+
+
+def match(input_catalogue, reference_catalogue, output_filename, error=10,
+          mode='best'):
+    '''
+    Match `input_catalogue`, with positions in radians, to
+    `reference_catalogue`, with positions in degrees, within `error`
+    arcseconds
+    '''
+    with fitsio.FITS(input_catalogue) as infile:
+        catalogue = infile[1].read()
+        header = infile[1].read_header()
+    reference = read_reference(reference_catalogue)
+
+    ra, dec = np.degrees(catalogue['RA']), np.degrees(catalogue['DEC'])
+    matcher = SkyMatcher(reference['ra'], reference['dec'])
+    index1, index2, separation = matcher.match(ra, dec, error / 3600.,
+                                               mode=mode)
+    logger.info('Matched %s of %s sources with %s reference sources',
+                index1.size, catalogue.size, reference.size)
+    dra, ddec = offsets(ra[index1], dec[index1], reference['ra'][index2],
+                        reference['dec'][index2])
+
+    records = [record for record in header.records()
+               if not record['name'].upper().startswith(STRUCTURAL_KEYS)]
+    fitsio.write(output_filename,
+                 join_columns(catalogue, reference, index1, index2, [
+                     (SEPARATION_COLUMN, separation * 3600.),
+                     (OFFSET_COLUMNS[0], dra * 3600.),
+                     (OFFSET_COLUMNS[1], ddec * 3600.)]),
+                 header=records, clobber=True)
+
+
+@instrumented
 def main(args):
-    match(args.catalogue, getattr(args, '2mass'), args.output)
+    match(args.catalogue, getattr(args, '2mass'), args.output,
+          error=args.error, mode=args.mode)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -62,5 +104,8 @@ if __name__ == '__main__':
     parser.add_argument('--2mass', help='Input catalogue')
     parser.add_argument('-o', '--output', required=True,
             type=str, help='Output image name')
+    parser.add_argument('-e', '--error', type=float, default=10.,
+            help='Match radius in arcseconds [default: 10]')
+    parser.add_argument('-m', '--mode', choices=MODES, default='best',
+            help='Which matches to keep [default: best]')
     main(parser.parse_args())
-
@@ -5,25 +5,15 @@ import sys
 import numpy as np
 import argparse
 import fitsio
-from astropy import units as u
-from astropy.coordinates import ICRS
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
+from qa_common.sky import match_separations
 
+@instrumented
 def main(args):
     with fitsio.FITS(args.catalogue) as infile:
-        hdu = infile[1]
-        ra1 = hdu['RA_1'][:]
-        dec1 = hdu['DEC_1'][:]
-
-        ra2 = hdu['ra_2'][:]
-        dec2 = hdu['dec_2'][:]
-
-
-    coords1 = ICRS(ra=ra1, dec=dec1, unit=(u.radian, u.radian))
-    coords2 = ICRS(ra=ra2, dec=dec2, unit=(u.degree, u.degree))
-
-    separations = coords1.separation(coords2).degree * 3600.
+        separations = match_separations(infile[1])
 
     fig, axes = plt.subplots(figsize=(11, 8))
 
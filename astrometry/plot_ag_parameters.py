@@ -5,29 +5,33 @@ from __future__ import division, print_function, absolute_import
 import argparse
 from itertools import product, cycle
 import logging
-from astropy.io import fits
 import numpy as np
 from qa_common.plotting import plt, subplots
+from qa_common.instrument import instrumented
 from qa_common.qa_logging import get_logger
+from qa_common.photometry_file import PhotometryFile
 
 logger = get_logger(__file__)
 
 
+@instrumented
 def main(args):
     if args.verbose:
         logger.setLevel('DEBUG')
     logger.debug(args)
 
     logger.info('Reading autoguider stats from %s', args.filename)
-    imagelist = fits.getdata(args.filename)
+    keys = ['ag_err', 'ag_corr', 'ag_delt']
+    axes_labels = ['x', 'y']
+    full_keys = [a + b for (a, b) in product(keys, axes_labels)]
+    with PhotometryFile.open(args.filename) as infile:
+        mjd = infile.column('imagelist', 'tmid')
+        imagelist = {key: infile.column('imagelist', key)
+                     for key in full_keys}
 
     colours = ['#d95f02', '#1b9e77']
-    mjd = imagelist['tmid']
     mjd0 = int(mjd.min())
-    mjd -= mjd0
-    keys = ['ag_err', 'ag_corr', 'ag_delt']
-    axes_labels = ['x', 'y']
-    full_keys = (a + b for (a, b) in product(keys, axes_labels))
+    mjd = mjd - mjd0
     with subplots(6, 1, sharex=True, figsize=(11, 11)) as (fig, axes):
         for (key, ax, colour) in zip(full_keys, axes, cycle(colours)):
             logger.debug('Plotting %s', key)
@@ -39,7 +43,7 @@ def main(args):
     fig.savefig(args.output, bbox_inches='tight')
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output',
@@ -47,4 +51,8 @@ if __name__ == '__main__':
                         type=argparse.FileType(mode='w'),
                         default='-')
     parser.add_argument('-v', '--verbose', action='store_true')
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
@@ -3,38 +3,18 @@
 
 import numpy as np
 import argparse
-import csv
 import sys
 
 from qa_common.plotting import plt
-from qa_common import plot_night_breaks, get_logger
+from qa_common.instrument import instrumented
+from qa_common import CSVContainer, plot_night_breaks, get_logger
 
 logger = get_logger(__file__)
 
-class Extracted(object):
-    def __init__(self, infile):
-        self.infile = infile
-        reader = csv.DictReader(infile)
-        self.data = [row for row in reader]
-        keys = self.data[0].keys()
-
-        for key in keys:
-            try:
-                setattr(self, key, np.array([float(row[key])
-                    for row in self.data]))
-            except ValueError:
-                setattr(self, key, np.array([row[key]
-                    for row in self.data]))
-
-    @classmethod
-    def from_file(cls, filename):
-        with open(filename) as infile:
-            return cls(filename)
-
-
+@instrumented
 def main(args):
     logger.info('Reading data from %s', args.extracted)
-    e = Extracted(args.extracted)
+    e = CSVContainer(args.extracted, sort_key=None)
 
     mjd = e.mjd
     mjd0 = int(mjd.min())
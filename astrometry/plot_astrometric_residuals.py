@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+
+from qa_common.plotting import plt
+from qa_common.instrument import instrumented
+from qa_common import CSVContainer, plot_night_breaks, get_logger
+
+logger = get_logger(__file__)
+
+@instrumented
+def main(args):
+    logger.info('Reading data from %s', args.extracted)
+    e = CSVContainer(args.extracted)
+
+    mjd = e.mjd
+    mjd0 = int(mjd.min())
+    mjd -= mjd0
+
+    logger.info('Plotting')
+    fig, axes = plt.subplots(4, 1, sharex=True, figsize=(11, 11))
+
+    axes[0].plot(mjd, e.nmatched, 'k.', label='matched')
+    axes[0].plot(mjd, e.nsources, marker='.', ls='None', color='0.6',
+                 label='sources')
+    axes[0].legend(loc='best')
+    axes[0].set_ylabel(r'Sources')
+
+    axes[1].plot(mjd, e.median_separation, marker='.', ls='None',
+                 label='median')
+    axes[1].plot(mjd, e.rms_separation, marker='.', ls='None', label='rms')
+    axes[1].legend(loc='best')
+    axes[1].set_ylabel(r'Separation / arcsec')
+
+    axes[2].plot(mjd, e.ra_offset, marker='.', ls='None',
+                 label=r'$\Delta \alpha \cos \delta$')
+    axes[2].plot(mjd, e.dec_offset, marker='.', ls='None',
+                 label=r'$\Delta \delta$')
+    axes[2].axhline(0, color='k', ls=':')
+    axes[2].legend(loc='best')
+    axes[2].set_ylabel(r'Offset / arcsec')
+
+    for key in ['ra_x_trend', 'ra_y_trend', 'dec_x_trend', 'dec_y_trend']:
+        axes[3].plot(mjd, e[key], marker='.', ls='None',
+                     label=key.replace('_trend', '').replace('_', ' vs '))
+    axes[3].axhline(0, color='k', ls=':')
+    axes[3].legend(loc='best', ncol=2)
+    axes[3].set_ylabel(r'Trend / arcsec per 1000 pix')
+
+    axes[-1].set_xlabel('MJD - {}'.format(mjd0))
+
+    for ax in axes:
+        ax.grid(True, axis='y')
+        plot_night_breaks(ax, mjd)
+
+    fig.tight_layout()
+
+    if args.output is not None:
+        logger.info('Saving to %s', args.output)
+        fig.savefig(args.output, bbox_inches='tight')
+    else:
+        plt.show()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('extracted', help='Residuals from match_frames.py',
+            type=argparse.FileType(mode='r'))
+    parser.add_argument('-o', '--output', required=False,
+            type=argparse.FileType(mode='w'), help='Output image name')
+    main(parser.parse_args())
@@ -8,12 +8,14 @@ import itertools
 import sys
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
 
 
 def hide_labels(axis):
     axis.get_xaxis().set_visible(False)
     axis.get_yaxis().set_visible(False)
 
+@instrumented
 def main(args):
     with fitsio.FITS(args.catalogue) as infile:
         hdu = infile[1]
@@ -10,6 +10,7 @@ import csv
 import sys
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
 
 def missing_from_2mass(args):
     with fitsio.FITS(args.match) as infile:
@@ -49,6 +50,7 @@ def missing_from_casu(args):
         if int(name) not in matched_names:
             yield (name, ra, dec, flux, mag)
 
+@instrumented
 def main(args):
     fig, axes = plt.subplots(2, 1, figsize=(11, 11))
     m_casu = list(missing_from_casu(args))
@@ -4,12 +4,12 @@
 import numpy as np
 import argparse
 import fitsio
-from astropy import units as u
-from astropy.coordinates import ICRS
 from scipy import stats
 import sys
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
+from qa_common.sky import match_separations
 
 def link_y_limits(ax1, ax2):
     ax1_y = ax1.get_ylim()
@@ -43,24 +43,14 @@ def compute_binned_errors(x, y, nbins):
 def compute_bin_centres(ledges):
     return ledges + np.diff(ledges)[0] / 2.
 
+@instrumented
 def main(args):
     with fitsio.FITS(args.catalogue) as infile:
         hdu = infile[1]
-        ra1 = hdu['RA_1'][:]
-        dec1 = hdu['DEC_1'][:]
-
-        ra2 = hdu['ra_2'][:]
-        dec2 = hdu['dec_2'][:]
-
+        separations = match_separations(hdu)
         x = hdu['X_coordinate'][:]
         y = hdu['Y_coordinate'][:]
 
-
-    coords1 = ICRS(ra=ra1, dec=dec1, unit=(u.radian, u.radian))
-    coords2 = ICRS(ra=ra2, dec=dec2, unit=(u.degree, u.degree))
-
-    separations = coords1.separation(coords2).degree * 3600.
-
     fig, axes = plt.subplots(2, 2, sharex=True, figsize=(11, 8))
     [(x_axis, y_axis), (x_zoomed, y_zoomed)] = axes
 
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Time the QA hot paths on synthetic data at several scales, optionally
+saving the results or comparing them with saved results.
+
+Each benchmark runs `--repeat` times and the fastest run is reported. With
+`--compare` any benchmark more than `--tolerance` slower than the saved
+result is flagged, and the exit status is 1, e.g.
+
+    python benchmarks/bench_hot_paths.py --save baseline
+    # ... change something ...
+    python benchmarks/bench_hot_paths.py --compare baseline
+
+Saved results are json files in `benchmarks/results`, and the synthetic
+data is kept in `--data-dir` so it is only generated once.
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+import fnmatch
+import imp
+import json
+import logging
+import os
+import platform
+import subprocess as sp
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import fitsio
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.realpath(os.path.join(HERE, '..'))
+sys.path[:0] = [HERE, ROOT]
+
+import synthetic
+from qa_common.qa_logging import configure
+
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+Scale = namedtuple('Scale', ['nstars', 'nframes', 'nraw', 'raw_shape',
+                             'nreduced'])
+
+SCALES = OrderedDict([
+    # Raw frames must be 2088 columns wide, the dark current assumes 2048
+    ('small', Scale(500, 200, 4, (256, 2088), 20)),
+    ('medium', Scale(2000, 1000, 8, synthetic.RAW_SHAPE, 100)),
+    ('large', Scale(10000, 3000, 16, synthetic.RAW_SHAPE, 400)),
+])
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    '''
+    Register a benchmark. The decorated function takes the synthetic data
+    of a scale and returns the function to time.
+    '''
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def load_script(path):
+    '''
+    Import a QA script as a module, without running its main block
+    '''
+    path = os.path.join(ROOT, path)
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    return imp.load_source('_bench_' + name, path)
+
+
+class Data(object):
+    '''
+    Synthetic data for a scale, generated in `directory` on first use
+    '''
+
+    def __init__(self, directory, scale):
+        self.directory = directory
+        self.scale = scale
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    @property
+    def photometry_file(self):
+        fname = self.path('output.fits')
+        if not os.path.isfile(fname):
+            synthetic.make_photometry_file(fname, nstars=self.scale.nstars,
+                                           nframes=self.scale.nframes)
+        return fname
+
+    @property
+    def raw_frames(self):
+        directory = self.path('raw')
+        if not os.path.isdir(directory):
+            synthetic.make_raw_frames(directory, nframes=self.scale.nraw,
+                                      shape=self.scale.raw_shape)
+        return sorted(self.path('raw', fname)
+                      for fname in os.listdir(directory))
+
+    @property
+    def reduced_frames(self):
+        directory = self.path('reduced')
+        if not os.path.isdir(directory):
+            synthetic.make_reduced_frames(directory,
+                                          nframes=self.scale.nreduced)
+        return sorted(self.path('reduced', fname)
+                      for fname in os.listdir(directory)
+                      if fname.endswith('.fits'))
+
+    @property
+    def raw_image(self):
+        return fitsio.read(self.raw_frames[-1]).astype(float)
+
+
+@benchmark('flux_vs_rms.extract_flux_data')
+def bench_flux_vs_rms(data):
+    module = load_script('photometry/flux_vs_rms.py')
+    fname = data.photometry_file
+    return lambda: module.extract_flux_data(fname, 'flux')
+
+
+@benchmark('rms_vs_time.extract_flux_data')
+def bench_rms_vs_time(data):
+    module = load_script('photometry/rms_vs_time.py')
+    fname = data.photometry_file
+    return lambda: module.extract_flux_data(fname, 'flux')
+
+
+@benchmark('multi_binning.noisecharacterise')
+def bench_noisecharacterise(data):
+    module = load_script('photometry/multi_binning.py')
+    datadict = module.load_data(data.photometry_file, 'flux')
+    flux_limits = [(1e2, 1e5)]
+    return lambda: module.noisecharacterise(0, flux_limits, datadict)
+
+
+@benchmark('multi_binning.binning')
+def bench_binning(data):
+    module = load_script('photometry/multi_binning.py')
+    flux = fitsio.read(data.photometry_file, 'flux')
+    return lambda: [module.binning(flux, size) for size in [2, 10, 50]]
+
+
+@benchmark('plot_hist_equalised.histogram_equalise')
+def bench_histogram_equalise(data):
+    module = load_script('scripts/plot_hist_equalised.py')
+    image = data.raw_image
+    return lambda: module.histogram_equalise(image)
+
+
+@benchmark('scan_raw_frames.sigma_clipped_mean')
+def bench_sigma_clipped_mean(data):
+    module = load_script('reduction/scan_raw_frames.py')
+    image = data.raw_image
+    return lambda: module.sigma_clipped_mean(image)
+
+
+@benchmark('scan_raw_frames.extract_from_file')
+def bench_scan_raw_frames(data):
+    module = load_script('reduction/scan_raw_frames.py')
+    files = data.raw_frames
+    return lambda: [module.extract_from_file(fname) for fname in files]
+
+
+@benchmark('extract_wcs_parameters.extract')
+def bench_extract_wcs_parameters(data):
+    module = load_script('astrometry/extract_wcs_parameters.py')
+    files = data.reduced_frames
+    return lambda: [module.extract(fname) for fname in files]
+
+
+@benchmark('extract_psf_measurements.extract')
+def bench_extract_psf_measurements(data):
+    module = load_script('photometry/extract_psf_measurements.py')
+    files = ['{}.phot'.format(fname) for fname in data.reduced_frames]
+    return lambda: [module.extract(fname) for fname in files]
+
+
+@benchmark('extract_npoint_sources.extract')
+def bench_extract_npoint_sources(data):
+    module = load_script('photometry/extract_npoint_sources.py')
+    files = ['{}.phot'.format(fname) for fname in data.reduced_frames]
+    return lambda: [module.extract(fname) for fname in files]
+
+
+def time_function(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return {'best': min(times), 'median': float(np.median(times))}
+
+
+def git_revision():
+    try:
+        return sp.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                               cwd=ROOT, stderr=sp.STDOUT).decode().strip()
+    except (OSError, sp.CalledProcessError):
+        return None
+
+
+def results_filename(name):
+    if os.path.sep in name or name.endswith('.json'):
+        return name
+    return os.path.join(RESULTS_DIR, '{}.json'.format(name))
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Print the change from `baseline` of each result, returning the keys of
+    the regressions
+    '''
+    regressions = []
+    print('{:>9} {:>9} {:>7}  {}'.format('baseline', 'now', 'ratio',
+                                         'benchmark'))
+    for (key, result) in results.items():
+        if key not in baseline:
+            continue
+        ratio = result['best'] / baseline[key]['best']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = '  slower'
+        print('{:9.4f} {:9.4f} {:7.2f}  {}{}'.format(
+            baseline[key]['best'], result['best'], ratio, key, flag))
+    return regressions
+
+
+def main(args):
+    # The scripts log every file they read. Configure logging first so
+    # their loggers do not reset the level
+    configure()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    names = [name for name in BENCHMARKS
+             if not args.select or any(fnmatch.fnmatch(name, pattern)
+                                       for pattern in args.select)]
+    results = OrderedDict()
+    print('{:>9} {:>9}  {}'.format('best', 'median', 'benchmark'))
+    for scale_name in args.scales:
+        data = Data(os.path.join(args.data_dir, scale_name),
+                    SCALES[scale_name])
+        for name in names:
+            key = '{}[{}]'.format(name, scale_name)
+            function = BENCHMARKS[name](data)
+            results[key] = time_function(function, args.repeat)
+            print('{:9.4f} {:9.4f}  {}'.format(results[key]['best'],
+                                               results[key]['median'], key))
+            sys.stdout.flush()
+
+    if args.save:
+        fname = results_filename(args.save)
+        if not os.path.isdir(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        with open(fname, 'w') as outfile:
+            json.dump({'revision': git_revision(), 'time': time.time(),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__, 'host': platform.node(),
+                       'results': results}, outfile, indent=2)
+        print('Results saved to {}'.format(fname))
+
+    if args.compare:
+        with open(results_filename(args.compare)) as infile:
+            baseline = json.load(infile)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('{} benchmarks more than {:.0%} slower'.format(
+                len(regressions), args.tolerance))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-s', '--scales', nargs='+', choices=list(SCALES),
+                        default=['small', 'medium'],
+                        help='Data scales to run [default: small medium]')
+    parser.add_argument('-k', '--select', action='append',
+                        help='Only run benchmarks matching this glob pattern. '
+                        'May be given multiple times')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Take the fastest of this many runs [default: 3]')
+    parser.add_argument('-d', '--data-dir',
+                        default=os.path.join(ROOT, 'tmp', 'benchmark-data'),
+                        help='Directory for the synthetic data '
+                        '[default: tmp/benchmark-data]')
+    parser.add_argument('--save', metavar='NAME',
+                        help='Save the results as benchmarks/results/NAME.json '
+                        '(or to a path)')
+    parser.add_argument('--compare', metavar='NAME',
+                        help='Compare with saved results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Fractional slowdown counted as a regression '
+                        '[default: 0.25]')
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Measure the start-up cost of the QA scripts: the time to import each
+script's module level in a fresh interpreter, without running it. Exits
+with status 1 if any script is over the import-time budget.
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+import glob
+import os
+import subprocess as sp
+import sys
+import time
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPT_DIRS = ['reduction', 'photometry', 'astrometry', 'scripts', 'view']
+
+# Import the script under another name, so its main block does not run
+MEASURE = '''
+import imp, os, sys, time
+sys.path[:0] = [os.path.dirname({path!r}), {root!r}]
+sys.argv = [{path!r}]
+start = time.time()
+imp.load_source('_qa_script', {path!r})
+sys.stdout.write('{{!r}}\\n'.format(time.time() - start))
+'''
+
+
+def measure(path, python=sys.executable):
+    '''
+    Import time of `path`, and wall time of the whole process, in seconds
+    '''
+    start = time.time()
+    process = sp.Popen([python, '-c', MEASURE.format(root=ROOT, path=path)],
+                       stdout=sp.PIPE, stderr=sp.PIPE, cwd=ROOT)
+    stdout, stderr = process.communicate()
+    wall = time.time() - start
+    if process.returncode != 0:
+        error = stderr.decode('utf-8', 'replace').strip().split('\n')[-1]
+        raise RuntimeError(error)
+    return float(stdout.decode('utf-8').strip().split('\n')[-1]), wall
+
+
+def find_scripts(names=None):
+    if names:
+        return [os.path.realpath(name) for name in names]
+    return sorted(path for directory in SCRIPT_DIRS
+                  for path in glob.glob(os.path.join(ROOT, directory, '*.py')))
+
+
+def main(args):
+    baseline = min(measure(os.devnull)[1] for _ in range(args.repeat))
+    print('Interpreter start-up: {:.3f} s'.format(baseline))
+    print('{:>8} {:>8}  {}'.format('import', 'process', 'script'))
+
+    over_budget, total = [], 0.
+    for path in find_scripts(args.scripts):
+        name = os.path.relpath(path, ROOT)
+        try:
+            import_time, wall = min(measure(path)
+                                    for _ in range(args.repeat))
+        except RuntimeError as err:
+            print('{:>8} {:>8}  {} ({})'.format('-', '-', name, err))
+            continue
+
+        total += wall
+        flag = ''
+        if import_time > args.budget:
+            over_budget.append(name)
+            flag = '  over budget'
+        print('{:8.3f} {:8.3f}  {}{}'.format(import_time, wall, name, flag))
+
+    print('Total process time: {:.2f} s'.format(total))
+    if over_budget:
+        print('{} scripts over the {:.2f} s budget'.format(
+            len(over_budget), args.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('scripts', nargs='*',
+                        help='Scripts to measure [default: all QA scripts]')
+    parser.add_argument('-b', '--budget', type=float, default=1.0,
+                        help='Maximum import time of a script in seconds '
+                        '[default: 1.0]')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Take the fastest of this many runs [default: 3]')
+    main(parser.parse_args())
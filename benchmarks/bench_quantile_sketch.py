@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Compare the streaming quantile sketch used by rms_vs_time with exact
+per-frame quantiles from scoreatpercentile, on random lightcurves.
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from scipy.stats import scoreatpercentile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from qa_common.sketch import QuantileSketch, DEFAULT_SKETCH_SIZE
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def rank_error(values, estimates, q):
+    n = values.shape[0]
+    below = (values < estimates).sum(axis=0)
+    at_or_below = (values <= estimates).sum(axis=0)
+    target = q * n
+    return np.maximum(0, np.maximum(below - target, target - at_or_below)) / n
+
+
+def main(args):
+    values = np.random.RandomState(args.seed).standard_normal(
+        size=(args.napertures, args.nframes))
+
+    start = time.time()
+    exact = scoreatpercentile(values, [100 * q for q in QUANTILES], axis=0)
+    exact_time = time.time() - start
+
+    start = time.time()
+    sketch = QuantileSketch(args.nframes, k=args.sketch_size)
+    for row in range(0, args.napertures, args.block_size):
+        sketch.update(values[row:row + args.block_size])
+    estimates = sketch.quantiles(QUANTILES)
+    sketch_time = time.time() - start
+
+    sketch_items = sum(level.size for level in sketch.levels)
+    print('Apertures: {}, frames: {}, sketch size: {}'.format(
+        args.napertures, args.nframes, args.sketch_size))
+    print('scoreatpercentile: {:.3f} s, {:.1f} MB of input'.format(
+        exact_time, values.nbytes / 1024 ** 2))
+    print('sketch: {:.3f} s, {:.1f} MB retained'.format(
+        sketch_time, sketch_items * 8 / 1024 ** 2))
+    print('rank error bound: {:.4f}'.format(
+        QuantileSketch.error_bound(args.napertures, args.sketch_size)))
+    for (q, exact_value, estimate) in zip(QUANTILES, exact, estimates):
+        print('q={}: max rank error {:.4f}, max value error {:.4g}'.format(
+            q, rank_error(values, estimate, q).max(),
+            np.abs(exact_value - estimate).max()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--napertures', type=int, default=20000)
+    parser.add_argument('-f', '--nframes', type=int, default=500)
+    parser.add_argument('-k', '--sketch-size', type=int,
+                        default=DEFAULT_SKETCH_SIZE)
+    parser.add_argument('-b', '--block-size', type=int, default=1000,
+                        help='Apertures per streamed block')
+    parser.add_argument('-s', '--seed', type=int, default=42)
+    main(parser.parse_args())
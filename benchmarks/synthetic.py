@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Build synthetic pipeline data for tests and benchmarks: AperturePhot
+`output.fits` files, raw `IMAGE*.fits` frames with overscan strips, the
+reduced images and `.phot` catalogues the extraction scripts read, and a
+2MASS reference catalogue of the stars in the catalogues.
+
+Run as a script to build a pipeline run directory which `run_qa.py` can
+process, e.g.
+
+    python benchmarks/synthetic.py /tmp/synthetic-run --stars 2000 --frames 600
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+import os
+import numpy as np
+import fitsio
+
+FIRST_MJD = 57000.
+# Fraction of a day between frames within a night
+CADENCE = 13. / 86400.
+ZERO_POINT = 21.18
+
+# Raw frames: 2048 rows of 20 overscan columns either side of 2048 pixels
+RAW_SHAPE = (2048, 2088)
+OVERSCAN_WIDTH = 20
+BIAS_LEVEL = 1000.
+READ_NOISE = 5.
+
+# Reduced frames: a 5 arcsec/pixel field of fixed stars
+FIELD_RA, FIELD_DEC = 1.5, -28.5
+PIXEL_SCALE = 5. / 3600.
+FIELD_SEED = 1234
+
+IMAGELIST_COLUMNS = (['TMID', 'EXPOSURE', 'AIRMASS', 'SEEING', 'FRAME_SN',
+                      'SHIFT', 'CLOUDS'] +
+                     ['AG_{}{}'.format(key, axis)
+                      for key in ['ERR', 'CORR', 'DELT'] for axis in 'XY'])
+
+
+def frame_times(nframes, nnights=3):
+    '''
+    Mid-exposure mjds of `nframes` frames spread evenly over `nnights`
+    nights
+    '''
+    per_night = int(np.ceil(nframes / nnights))
+    index = np.arange(nframes)
+    return (FIRST_MJD + 0.1 + index // per_night +
+            (index % per_night) * CADENCE)
+
+
+def make_photometry_file(fname, nstars=1000, nframes=300, nnights=3,
+                         seed=0):
+    '''
+    Write an AperturePhot output file with `nstars` apertures and `nframes`
+    frames: imagelist and catalogue tables, and flux, tamflux, casudet,
+    fluxerr, ccdx and ccdy images of shape (nstars, nframes).
+
+    Fluxes have 1% white noise, a slow per-night trend, and every fifth
+    frame a shorter exposure. The first aperture is saturated at zero flux
+    in a few frames, as real bad apertures are.
+    '''
+    state = np.random.RandomState(seed)
+    tmid = frame_times(nframes, nnights)
+    exposure = np.where(np.arange(nframes) % 5 == 0, 10., 30.)
+    airmass = 1. + 0.5 * np.abs(np.sin(np.pi * (tmid % 1.)))
+
+    imagelist = np.zeros(nframes, dtype=[(name, 'f8')
+                                         for name in IMAGELIST_COLUMNS])
+    imagelist['TMID'] = tmid
+    imagelist['EXPOSURE'] = exposure
+    imagelist['AIRMASS'] = airmass
+    imagelist['SEEING'] = state.normal(2., 0.1, nframes)
+    imagelist['FRAME_SN'] = state.normal(100., 5., nframes)
+    imagelist['SHIFT'] = state.normal(0., 0.2, nframes)
+    imagelist['CLOUDS'] = np.abs(state.normal(0., 0.05, nframes))
+    for axis in 'XY':
+        imagelist['AG_ERR' + axis] = state.normal(0., 0.5, nframes)
+        imagelist['AG_CORR' + axis] = state.normal(0., 0.5, nframes)
+        imagelist['AG_DELT' + axis] = state.normal(0., 0.1, nframes)
+
+    mean_flux = 10 ** state.uniform(2, 5, nstars)
+    catalogue = np.zeros(nstars, dtype=[('OBJ_ID', 'S26'), ('FLUX_MEAN', 'f8'),
+                                        ('RA', 'f8'), ('DEC', 'f8')])
+    catalogue['OBJ_ID'] = ['SYN{:06d}'.format(i) for i in range(nstars)]
+    catalogue['FLUX_MEAN'] = mean_flux
+    catalogue['RA'] = state.uniform(0., 3., nstars)
+    catalogue['DEC'] = state.uniform(-30., -27., nstars)
+
+    trend = 1. + 0.005 * np.sin(2 * np.pi * (tmid % 1.) * 3.)
+    noise = 1. + state.normal(0., 0.01, (nstars, nframes))
+    flux = mean_flux[:, np.newaxis] * exposure * trend * noise
+    flux[0, ::7] = 0.
+
+    ccdx = (state.uniform(0., 2048., nstars)[:, np.newaxis] +
+            state.normal(0., 0.2, (nstars, nframes)))
+    ccdy = (state.uniform(0., 2048., nstars)[:, np.newaxis] +
+            state.normal(0., 0.2, (nstars, nframes)))
+
+    with fitsio.FITS(fname, 'rw', clobber=True) as outfile:
+        outfile.write(imagelist, extname='IMAGELIST')
+        outfile.write(catalogue, extname='CATALOGUE')
+        outfile.write(flux, extname='FLUX')
+        outfile.write(flux * 1.01, extname='TAMFLUX')
+        outfile.write(state.normal(0., 0.01, (nstars, nframes)),
+                      extname='CASUDET')
+        outfile.write(np.sqrt(np.abs(flux)), extname='FLUXERR')
+        outfile.write(ccdx, extname='CCDX')
+        outfile.write(ccdy, extname='CCDY')
+    return fname
+
+
+def make_raw_frame(fname, mjd, image_type='IMAGE', exposure=30.,
+                   image_id=0, shape=RAW_SHAPE, seed=0):
+    '''
+    Write a raw uint16 frame with overscan strips of `OVERSCAN_WIDTH`
+    columns at either side. The bias rises by 4 ADU from left to right;
+    dark frames add 0.01 ADU/s of dark current and science frames a sky
+    background.
+    '''
+    state = np.random.RandomState(seed)
+    nrows, ncols = shape
+    bias = BIAS_LEVEL + np.linspace(0., 4., ncols)
+    image = bias + state.normal(0., READ_NOISE, shape)
+
+    science = (slice(None), slice(OVERSCAN_WIDTH, ncols - OVERSCAN_WIDTH))
+    if image_type == 'DARK':
+        image[science] += 0.01 * exposure
+    elif image_type == 'IMAGE':
+        image[science] += state.poisson(100., (nrows, ncols -
+                                                2 * OVERSCAN_WIDTH))
+
+    header = [
+        {'name': 'MJD', 'value': mjd},
+        {'name': 'EXPOSURE', 'value': exposure},
+        {'name': 'IMAGE_ID', 'value': image_id},
+        {'name': 'IMGTYPE', 'value': image_type},
+        {'name': 'ROOFSTAT',
+         'value': 'full open' if image_type == 'IMAGE' else 'closed'},
+        {'name': 'AIRMASS', 'value': 1.2},
+        {'name': 'CCDTEMP', 'value': -70.},
+        {'name': 'CHSTEMP', 'value': 20.},
+        {'name': 'BIASSEC',
+         'value': '[1:{},1:{}]'.format(OVERSCAN_WIDTH, nrows)},
+    ]
+    fitsio.write(fname, np.clip(image, 0, 65535).astype(np.uint16),
+                 header=header, clobber=True)
+    return fname
+
+
+def make_raw_frames(directory, nframes=10, ndarks=2, shape=RAW_SHAPE,
+                    seed=0):
+    '''
+    Write `nframes` raw frames to `directory`, the first `ndarks` of them
+    darks, returning their filenames
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return [make_raw_frame(os.path.join(directory,
+                                        'IMAGE{:06d}.fits'.format(i)),
+                           mjd=mjd, image_id=i, shape=shape, seed=seed + i,
+                           image_type='DARK' if i < ndarks else 'IMAGE')
+            for (i, mjd) in enumerate(frame_times(nframes, nnights=1))]
+
+
+def wcs_header(ra, dec):
+    '''
+    ZPN header cards of a 5 arcsec/pixel field centred on (`ra`, `dec`)
+    '''
+    scale = 5. / 3600.
+    return [
+        {'name': 'CTYPE1', 'value': 'RA---ZPN'},
+        {'name': 'CTYPE2', 'value': 'DEC--ZPN'},
+        {'name': 'CRPIX1', 'value': 1024.5},
+        {'name': 'CRPIX2', 'value': 1024.5},
+        {'name': 'CRVAL1', 'value': ra},
+        {'name': 'CRVAL2', 'value': dec},
+        {'name': 'CD1_1', 'value': -scale},
+        {'name': 'CD1_2', 'value': 1e-7},
+        {'name': 'CD2_1', 'value': -1e-7},
+        {'name': 'CD2_2', 'value': scale},
+        {'name': 'PV2_1', 'value': 1.},
+        {'name': 'PV2_3', 'value': 8.},
+        {'name': 'PV2_5', 'value': 900.},
+    ]
+
+
+def field_sources(nsources):
+    '''
+    Pixel positions, sky positions in degrees and J magnitudes of the
+    `nsources` stars of the reduced frames, which are the same in every
+    frame
+    '''
+    state = np.random.RandomState(FIELD_SEED)
+    x = state.uniform(0, 2048, nsources)
+    y = state.uniform(0, 2048, nsources)
+    dec = FIELD_DEC + (y - 1024.5) * PIXEL_SCALE
+    ra = (FIELD_RA - (x - 1024.5) * PIXEL_SCALE / np.cos(np.radians(dec)))
+    return x, y, ra % 360., dec, state.uniform(8., 15., nsources)
+
+
+def make_reference_catalogue(fname, nsources=500):
+    '''
+    Write the stars of the reduced frames as a fetch_2mass.py csv file
+    '''
+    _, _, ra, dec, jmag = field_sources(nsources)
+    with open(fname, 'w') as outfile:
+        outfile.write('ra,dec,jmag,name_2mass\n')
+        for (i, (ra_i, dec_i, jmag_i)) in enumerate(zip(ra, dec, jmag)):
+            outfile.write('{:.7f},{:.7f},{:.3f},{:016d}\n'.format(
+                ra_i, dec_i, jmag_i, i))
+    return fname
+
+
+def make_reduced_frame(fname, mjd, nsources=500, shape=(64, 64), seed=0):
+    '''
+    Write a reduced image `fname`, with the header keys read by
+    extract_wcs_parameters and binning_per_brightness, and its `<fname>.phot` catalogue of `nsources`
+    sources with the psf header keys read by extract_psf_measurements.
+    The catalogue positions are those of `field_sources` with 0.3 arcsec
+    of noise. The image itself is small: the extraction scripts only read
+    headers.
+    '''
+    state = np.random.RandomState(seed)
+    ra = FIELD_RA + state.normal(0., 1e-3)
+    dec = FIELD_DEC + state.normal(0., 1e-3)
+    header = wcs_header(ra, dec) + [
+        {'name': 'FNAME', 'value': os.path.basename(fname)},
+        {'name': 'MJD', 'value': mjd},
+        {'name': 'EXPOSURE', 'value': 30.},
+        {'name': 'AIRMASS', 'value': 1. + abs(state.normal(0., 0.2))},
+        {'name': 'CHSTEMP', 'value': state.normal(20., 1.)},
+        {'name': 'CMD_RA', 'value': FIELD_RA},
+        {'name': 'CMD_DEC', 'value': FIELD_DEC},
+        {'name': 'TEL_RA', 'value': ra},
+        {'name': 'TEL_DEC', 'value': dec},
+        {'name': 'SKYLEVEL', 'value': state.normal(100., 5.)},
+        {'name': 'SKYNOISE', 'value': state.normal(10., 0.5)},
+        {'name': 'NUMBRMS', 'value': nsources},
+        {'name': 'STDCRMS', 'value': abs(state.normal(0.1, 0.01))},
+    ]
+    fitsio.write(fname, np.zeros(shape, dtype=np.float32), header=header,
+                 clobber=True)
+
+    x, y, source_ra, source_dec, jmag = field_sources(nsources)
+    noise = 0.3 / 3600.
+    catalogue = np.zeros(nsources, dtype=[('RA', 'f8'), ('DEC', 'f8'),
+                                          ('X_coordinate', 'f4'),
+                                          ('Y_coordinate', 'f4'),
+                                          ('Aper_flux_3', 'f4')])
+    catalogue['RA'] = np.radians(source_ra + state.normal(
+        0., noise, nsources) / np.cos(np.radians(source_dec)))
+    catalogue['DEC'] = np.radians(source_dec +
+                                  state.normal(0., noise, nsources))
+    catalogue['X_coordinate'] = x + state.normal(0., 0.05, nsources)
+    catalogue['Y_coordinate'] = y + state.normal(0., 0.05, nsources)
+    catalogue['Aper_flux_3'] = 10 ** ((ZERO_POINT - jmag) / 2.5)
+    psf_header = [{'name': 'MJD', 'value': mjd}] + [
+        {'name': 'PSF_{}_{}'.format(psf_type, i),
+         'value': state.normal(2., 0.1)}
+        for psf_type in 'TAB' for i in range(1, 10)]
+
+    phot_fname = '{}.phot'.format(fname)
+    with fitsio.FITS(phot_fname, 'rw', clobber=True) as outfile:
+        outfile.write(None, header=[{'name': 'MJD', 'value': mjd}])
+        outfile.write(catalogue, header=psf_header)
+    return fname, phot_fname
+
+
+def make_reduced_frames(directory, nframes=10, nsources=500, seed=0):
+    '''
+    Write `nframes` reduced images and catalogues to `directory`, returning
+    the (image, catalogue) filenames
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return [make_reduced_frame(
+        os.path.join(directory, 'proc{:06d}_image.fits'.format(i)),
+        mjd=mjd, nsources=nsources, seed=seed + i)
+        for (i, mjd) in enumerate(frame_times(nframes))]
+
+
+def make_run(rootdir, nstars=1000, nframes=300, nraw=10, nreduced=10,
+             raw_shape=RAW_SHAPE, seed=0):
+    '''
+    Build a pipeline run directory in `rootdir` with the layout `run_qa.py`
+    expects, and the reference catalogue `2mass.csv` for its `--2mass`
+    '''
+    make_raw_frames(os.path.join(rootdir, 'OriginalData', 'images'),
+                    nframes=nraw, shape=raw_shape, seed=seed)
+    make_reduced_frames(os.path.join(rootdir, 'Reduction', 'output',
+                                     'synthetic'),
+                        nframes=nreduced, seed=seed)
+    make_reference_catalogue(os.path.join(rootdir, '2mass.csv'))
+    photometry_dir = os.path.join(rootdir, 'AperturePhot', 'output')
+    if not os.path.isdir(photometry_dir):
+        os.makedirs(photometry_dir)
+    make_photometry_file(os.path.join(photometry_dir, 'output.fits'),
+                         nstars=nstars, nframes=nframes, seed=seed)
+    return rootdir
+
+
+def main(args):
+    make_run(args.rootdir, nstars=args.stars, nframes=args.frames,
+             nraw=args.raw_frames, nreduced=args.reduced_frames,
+             seed=args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('rootdir', help='Run directory to create')
+    parser.add_argument('--stars', type=int, default=1000,
+                        help='Number of apertures [default: 1000]')
+    parser.add_argument('--frames', type=int, default=300,
+                        help='Number of photometry frames [default: 300]')
+    parser.add_argument('--raw-frames', type=int, default=10,
+                        help='Number of raw frames [default: 10]')
+    parser.add_argument('--reduced-frames', type=int, default=10,
+                        help='Number of reduced frames [default: 10]')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed [default: 0]')
+    main(parser.parse_args())
@@ -5,96 +5,77 @@ from __future__ import division, print_function, absolute_import
 
 
 import argparse
-import fitsio
 import numpy as np
-import os
-from qa_common import get_logger
+from qa_common import get_logger, CSVContainer
+from qa_common.instrument import instrumented, stage
 from qa_common.plotting import plt
 from qa_common.filter_objects import good_measurement_indices_from_fits
-from qa_common.photometry import build_bins
+from qa_common.photometry import build_bins, assign_bins, binned_lightcurves
+from qa_common.photometry_file import PhotometryFile
 
 
 logger = get_logger(__file__)
 
-METADATA_KEYS = ['mjd', 'airmass', 'chstemp']
 PLOT_KEYS = ['airmass', 'chstemp', 'median_count_rate']
 MJD0 = None
 
 
-def _extract_metadata(fname):
-    header = fitsio.read_header(fname)
-    data = fitsio.read(fname)
-    initial = {key: header[key] for key in METADATA_KEYS}
-    initial.update({'median_count_rate': np.median(data) / header['exposure']})
-    return initial
-
-
-def extract_metadata(rawfiles):
-    values = map(_extract_metadata, rawfiles)
-    return sorted(values, key=lambda row: row['mjd'])
-
-
 def humanise_key(key):
     return key.replace('_', ' ').capitalize()
 
 
 def plot_metadata_series(axis, metadata, key, x=None, *args, **kwargs):
-    y = np.array([row[key] for row in metadata])
-    x = x if x is not None else np.array([row['mjd'] for row in metadata]) - MJD0
+    y = metadata[key]
+    x = x if x is not None else metadata['mjd'] - MJD0
     axis.plot(x, y, label=humanise_key(key), *args, **kwargs)
     axis.legend(loc='best')
 
 
+@instrumented
 def main(args):
     global MJD0
     ledges, redges = build_bins()
 
-    assert all(os.path.isfile(f) for f in args.reduced_files)
-    metadata = extract_metadata(args.reduced_files)
+    # Extracted once for every hdu, by extract_frame_metadata.py
+    logger.info('Reading frame metadata from %s', args.metadata)
+    with stage('metadata'):
+        metadata = CSVContainer.from_filename(args.metadata)
 
     logger.info('Reading data from %s', args.filename)
-    with fitsio.FITS(args.filename) as infile:
-        flux = infile[args.hdu].read()
-        fluxerr = infile['fluxerr'].read()
-        imagelist = infile['imagelist']
-        airmass = imagelist['airmass'].read()
-        exposure = imagelist['exposure'].read()
-        tmid = imagelist['tmid'].read()
+    with PhotometryFile.open(args.filename) as infile:
+        flux = infile.read(args.hdu)
+        fluxerr = infile.read('fluxerr')
+        exposure = infile.column('imagelist', 'exposure')
+        tmid = infile.column('imagelist', 'tmid')
 
     unique_exposure_times = sorted(list(set(exposure)))
     logger.info('Found %s exposure times: %s', len(unique_exposure_times),
                 unique_exposure_times)
 
     logger.info('Normalising by exposure time')
-    flux /= exposure
-    fluxerr /= exposure
+    flux = flux / exposure
+    fluxerr = fluxerr / exposure
     logger.info('Removing extinction')
 
     MJD0 = int(tmid.min())
-    tmid -= MJD0
+    tmid = tmid - MJD0
 
-    flux_mean = np.average(flux, axis=1, weights=1. / fluxerr ** 2)
+    weights = 1. / fluxerr ** 2
+    flux_mean = np.average(flux, axis=1, weights=weights)
+    lightcurves = binned_lightcurves(flux, weights,
+                                     assign_bins(flux_mean, ledges, redges),
+                                     len(ledges))
 
     fig, axes = plt.subplots(len(ledges) + len(PLOT_KEYS), 1, sharex=True,
                              figsize=(8, 15))
 
     colours = ['r', 'g', 'b', 'c', 'm', 'k', 'y']
     plot_border = 0.02
-    for (ledge, redge, axis) in zip(ledges, redges, axes[len(PLOT_KEYS):]):
+    for (binned_lc, axis) in zip(lightcurves, axes[len(PLOT_KEYS):]):
         for exptime, colour in zip(unique_exposure_times, colours):
-            ind = (flux_mean >= ledge) & (flux_mean < redge)
             exptime_ind = exposure == exptime
-            chosen_flux = flux[ind][:, exptime_ind]
-
-            chosen_fluxerr = fluxerr[ind][:, exptime_ind]
-            try:
-                binned_lc = np.average(chosen_flux, axis=0,
-                                   weights=1. / chosen_fluxerr ** 2)
-            except ZeroDivisionError:
-                binned_lc = np.average(chosen_flux, axis=0)
-
-            axis.plot(tmid[exptime_ind], binned_lc, '.', zorder=2,
-                      color=colour)
+            axis.plot(tmid[exptime_ind], binned_lc[exptime_ind], '.',
+                      zorder=2, color=colour)
 
         axis.yaxis.set_major_locator(plt.MaxNLocator(5))
         axis.set_xlim(tmid.min() - 0.005,
@@ -114,11 +95,18 @@ def main(args):
     else:
         plt.show()
 
-if __name__ == '__main__':
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output', required=False,
             type=argparse.FileType(mode='w'))
-    parser.add_argument('-r', '--reduced-files', nargs='+')
+    parser.add_argument('-m', '--metadata', required=True,
+                        help='Frame metadata table, from '
+                        'extract_frame_metadata.py')
     parser.add_argument('-H', '--hdu', required=False, default='flux')
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
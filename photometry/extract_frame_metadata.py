@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Extract the metadata of every reduced frame plotted alongside the binned
+lightcurves: the airmass, camera temperature and median count rate.
+
+The metadata is the same for every flux hdu, so it is extracted once here
+and read by each hdu's `binning_per_brightness.py` plot.
+'''
+
+import argparse
+import os
+from functools import partial
+from multiprocessing import Pool, cpu_count
+import fitsio
+import numpy as np
+from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.cache import open_memo, add_cache_arguments
+from qa_common.binary_table import write_table, add_format_argument
+from qa_common import header_index
+
+logger = get_logger(__file__)
+
+METADATA_KEYS = ['mjd', 'airmass', 'chstemp']
+KEYS = METADATA_KEYS + ['median_count_rate']
+
+# Rows of each frame read to estimate its median, see `sampled_median`
+SAMPLE_ROWS = 64
+
+# This runs alongside other jobs, so does not take every cpu
+MAX_PROCESSES = 4
+
+
+def sampled_median(fname, nrows=SAMPLE_ROWS):
+    '''
+    Median pixel value of the primary image of `fname`, estimated from
+    `nrows` evenly spaced rows, or from the whole image if `nrows` is 0 or
+    covers it.
+
+    For pixels scattered by sky noise sigma, the median of n of them has a
+    standard error of about sqrt(pi / 2) sigma / sqrt(n). The default 64
+    rows of a 2048 pixel wide frame are 131072 pixels, so the estimate is
+    within about 0.0035 sigma of the median of all pixels, for 3% of the
+    reads. Rows span the whole frame so gradients across it are sampled
+    evenly, but structure on scales finer than the row spacing (32 rows by
+    default) along the columns is not.
+    '''
+    with fitsio.FITS(fname) as infile:
+        image = infile[0]
+        height = image.get_dims()[0]
+        if not nrows or nrows >= height:
+            return np.median(image.read())
+        rows = np.linspace(0, height - 1, nrows).astype(int)
+        return np.median(np.concatenate([image[row:row + 1, :]
+                                         for row in rows]))
+
+
+def extract(fname, nrows=SAMPLE_ROWS):
+    header = header_index.read_header(fname)
+    row = dict((key, header[key]) for key in METADATA_KEYS)
+    row['median_count_rate'] = sampled_median(fname, nrows) / header['exposure']
+    return row
+
+
+def extract_metadata(fnames, nrows=SAMPLE_ROWS, processes=None, cache=None,
+                     cache_hash=False):
+    '''
+    Metadata rows of every frame in `fnames`, sorted by mjd. Frames are read
+    in a pool of `processes`, and the results cached per frame.
+    '''
+    # The estimate depends on the sampling, so each has its own namespace
+    memo = open_memo('extract_frame_metadata.{}'.format(nrows), cache,
+                     hash_contents=cache_hash)
+    pool = Pool(processes)
+    try:
+        rows = memo.map(partial(extract, nrows=nrows), fnames,
+                        mapper=pool.map)
+    finally:
+        memo.close()
+        pool.close()
+        pool.join()
+    return sorted(rows, key=lambda row: row['mjd'])
+
+
+@instrumented
+def main(args):
+    filenames = [os.path.realpath(line.strip()) for line in args.filelist]
+    logger.info('Extracting metadata of %s frames', len(filenames))
+    with stage('extract'):
+        rows = extract_metadata(filenames, args.sample_rows,
+                                processes=args.jobs, cache=args.cache,
+                                cache_hash=args.cache_hash)
+
+    with stage('write'):
+        write_table(args.output, rows, KEYS, format=args.format)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filelist', type=argparse.FileType(mode='r'))
+    parser.add_argument('-o', '--output', required=False,
+                        type=argparse.FileType(mode='w'), default='-')
+    parser.add_argument('-s', '--sample-rows', type=int, default=SAMPLE_ROWS,
+                        help='Rows of each frame read for its median count '
+                        'rate, 0 for all [default: {}]'.format(SAMPLE_ROWS))
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=min(cpu_count(), MAX_PROCESSES),
+                        help='Number of processes [default: one per cpu, at '
+                        'most {}]'.format(MAX_PROCESSES))
+    add_cache_arguments(parser)
+    add_format_argument(parser)
+    main(parser.parse_args())
@@ -3,39 +3,53 @@
 
 import argparse
 import os
-from multiprocessing import Pool
+from multiprocessing import Pool, cpu_count
 from collections import namedtuple
-from astropy.io import fits
 from qa_common import get_logger
-import csv
+from qa_common.instrument import instrumented, stage
+from qa_common.binary_table import write_table, add_format_argument
+from qa_common import header_index
+from qa_common.external_sort import sorted_rows
+from qa_common.util import default_chunksize
 
 Extraction = namedtuple('Extraction', ['mjd', 'nsources'])
 
+# Rows written to a binary table at a time
+CHUNK_ROWS = 10000
+
 logger = get_logger(__file__)
 
 
 def extract(filename):
-    with fits.open(filename) as infile:
-        header = infile[0].header
-        cat = infile[1].data
-
-    nsources = len(cat)
+    # The catalogue length is in its header, so no table data is read
+    mjd = header_index.read_header(filename, 0)['mjd']
+    nsources = header_index.read_header(filename, 1)['naxis2']
     logger.debug('%s => %d', filename, nsources)
-    return Extraction(header['mjd'], len(cat))
+    return Extraction(mjd, nsources)
 
 
+@instrumented
 def main(args):
     logger.info('Extracting number of point sources')
-    filenames = (os.path.realpath(line.strip()) for line in args.filelist)
+    filenames = [os.path.realpath(line.strip()) for line in args.filelist]
+    chunksize = args.chunksize or default_chunksize(len(filenames),
+                                                    cpu_count())
     pool = Pool()
-    results = pool.map(extract, filenames)
-    results.sort(key=lambda row: row.mjd)
 
+    # Rows are written as they are extracted, through an external sort
+    # unless --no-sort
     logger.info('Rendering point source info to %s', args.output)
-    writer = csv.DictWriter(args.output, fieldnames=Extraction._fields)
-    writer.writeheader()
-    for row in results:
-        writer.writerow(dict(zip(Extraction._fields, row)))
+    with stage('extract'):
+        try:
+            rows = pool.imap_unordered(extract, filenames,
+                                       chunksize=chunksize)
+            if not args.no_sort:
+                rows = sorted_rows(rows, key=lambda row: row.mjd)
+            write_table(args.output, rows, Extraction._fields,
+                        format=args.format, chunk_size=CHUNK_ROWS)
+        finally:
+            pool.close()
+            pool.join()
 
 
 if __name__ == '__main__':
@@ -45,4 +59,11 @@ if __name__ == '__main__':
                         required=False,
                         type=argparse.FileType(mode='w'),
                         default='-')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Files sent to a process at a time '
+                        '[default: chosen from the number of files]')
+    parser.add_argument('--no-sort', action='store_true',
+                        help='Write rows as they are extracted, rather than '
+                        'in mjd order')
+    add_format_argument(parser)
     main(parser.parse_args())
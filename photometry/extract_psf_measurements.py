@@ -3,11 +3,16 @@
 
 import argparse
 from qa_common import get_logger
-import csv
+from qa_common.instrument import instrumented, stage
+from qa_common.cache import open_memo, add_cache_arguments
+from qa_common.binary_table import write_table, add_format_argument
+from qa_common import header_index
+from qa_common.external_sort import sorted_rows
+from qa_common.util import default_chunksize
 from collections import namedtuple
-from multiprocessing import Pool
+from functools import partial
+from multiprocessing import Pool, cpu_count
 import os
-from astropy.io import fits
 import itertools
 
 logger = get_logger(__file__)
@@ -20,25 +25,41 @@ psf_keys = ['psf_{typ}_{i}'.format(typ=typ,
 all_keys = ['mjd'] + psf_keys
 Extraction = namedtuple('Extraction', all_keys)
 
+# Rows written to a binary table at a time
+CHUNK_ROWS = 10000
+
 
 def extract(filename):
-    with fits.open(filename) as infile:
-        header = infile[1].header
-        return Extraction(*[header[key] for key in all_keys])
+    header = header_index.read_header(filename, 1)
+    return tuple(header[key] for key in all_keys)
 
 
+@instrumented
 def main(args):
     logger.info('Extracting psf data')
-    filenames = (os.path.realpath(line.strip()) for line in args.filelist)
+    filenames = [os.path.realpath(line.strip()) for line in args.filelist]
+    chunksize = args.chunksize or default_chunksize(len(filenames),
+                                                    cpu_count())
     pool = Pool()
-    results = pool.map(extract, filenames)
-    results.sort(key=lambda row: row.mjd)
+    memo = open_memo('extract_psf_measurements', args.cache,
+                     hash_contents=args.cache_hash)
 
+    # Rows are written as they are extracted, through an external sort
+    # unless --no-sort
     logger.info('Rendering point source info to %s', args.output)
-    writer = csv.DictWriter(args.output, fieldnames=Extraction._fields)
-    writer.writeheader()
-    for row in results:
-        writer.writerow(dict(zip(Extraction._fields, row)))
+    with stage('extract'):
+        try:
+            rows = memo.imap(extract, filenames, mapper=partial(
+                pool.imap_unordered, chunksize=chunksize))
+            if not args.no_sort:
+                rows = sorted_rows(rows, key=lambda row: row[0])
+            write_table(args.output, (Extraction(*row) for row in rows),
+                        Extraction._fields, format=args.format,
+                        chunk_size=CHUNK_ROWS)
+        finally:
+            memo.close()
+            pool.close()
+            pool.join()
 
 
 if __name__ == '__main__':
@@ -48,4 +69,12 @@ if __name__ == '__main__':
                         required=False,
                         type=argparse.FileType(mode='w'),
                         default='-')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Files sent to a process at a time '
+                        '[default: chosen from the number of files]')
+    parser.add_argument('--no-sort', action='store_true',
+                        help='Write rows as they are extracted, rather than '
+                        'in mjd order')
+    add_cache_arguments(parser)
+    add_format_argument(parser)
     main(parser.parse_args())
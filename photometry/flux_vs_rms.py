@@ -1,15 +1,17 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import fitsio
 import numpy as np
 import os
 import argparse
 from collections import namedtuple
 import sys
 from qa_common.filter_objects import good_measurement_indices
-from qa_common.plotting import plt
+from qa_common.instrument import instrumented
+from qa_common.plotting import plt, density_scatter
 from qa_common import get_logger
+from qa_common.photometry_file import PhotometryFile
+from qa_common.aperture_stats import aperture_statistics
 
 logger = get_logger(__file__)
 
@@ -17,20 +19,13 @@ summary = namedtuple('Summary', ['mags', 'frms'])
 
 
 def extract_flux_data(fname, hdu, zp=21.18, airmass_correct=False):
-    with fitsio.FITS(fname) as infile:
-        flux = infile[hdu].read()
-        imagelist = infile['imagelist']
-        airmass = imagelist['airmass'].read()
-        exptime = imagelist['exposure'].read()
+    with PhotometryFile.open(fname) as infile:
+        exptime = infile.column('imagelist', 'exposure')
+        logger.info('Computing exposure time normalised statistics')
+        stats = aperture_statistics(infile, hdu, ['mean', 'std'],
+                                    scale=exptime)
 
-        ccdx = infile['ccdx'][:,:1].flatten()
-        ccdy = infile['ccdy'][:,:1].flatten()
-
-    logger.info('Normalising by exposure time')
-    flux /= exptime
-
-    av_flux = np.average(flux, axis=1)
-    std_flux = np.std(flux, axis=1)
+    av_flux, std_flux = stats['mean'], stats['std']
 
     before_size = av_flux.size
 
@@ -46,20 +41,25 @@ def extract_flux_data(fname, hdu, zp=21.18, airmass_correct=False):
 
 
 def plot_summary(s, colour, label='', ax=None):
+    '''
+    Set the axis scales and limits first, as many stars are drawn as a
+    density image binned on them
+    '''
     ax = ax if ax else plt.gca()
 
-    ax.plot(s.mags, s.frms, ls='None', marker='.', color=colour, label=label)
+    density_scatter(ax, s.mags, s.frms, color=colour, label=label)
 
 
+@instrumented
 def main(args):
     logger.info('Loading flux data from %s', args.filename)
     extracted = extract_flux_data(args.filename, hdu=args.hdu)
 
     fig, ax = plt.subplots(figsize=(11, 8))
-    plot_summary(extracted, 'r', ax=ax)
     ax.set(xlabel='Kepler magnitude', ylabel='FRMS', yscale='log',
             title='{}:{}'.format(os.path.basename(args.filename), args.hdu),
             xlim=(5, 20), ylim=(1E-3, 10))
+    plot_summary(extracted, 'r', ax=ax)
     ax.yaxis.set_major_formatter(plt.ScalarFormatter())
     ax.grid(True)
     fig.tight_layout()
@@ -71,7 +71,7 @@ def main(args):
         plt.show()
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('-o', '--output',
                         required=False,
@@ -79,5 +79,8 @@ if __name__ == '__main__':
                         help='Output image name')
     parser.add_argument('filename', help='File to analyse')
     parser.add_argument('-H', '--hdu', help='HDU to analyse', required=True)
+    return parser
+
 
-    main(parser.parse_args())
+if __name__ == '__main__':
+    main(build_parser().parse_args())
@@ -1,47 +1,57 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from astropy.io import fits
-from qa_common.plotting import plt, subplots
+from qa_common.plotting import plt, subplots, density_scatter
+from qa_common.instrument import instrumented
 from qa_common.qa_logging import get_logger
+from qa_common.photometry_file import PhotometryFile
+from qa_common.aperture_stats import aperture_statistics
 import numpy as np
 import argparse
 
 logger = get_logger(__file__)
 
 
+@instrumented
 def main(args):
     logger.info('Loading data from %s', args.filename)
-    with fits.open(args.filename) as infile:
-        flux = infile['flux'].data
-        detflux = infile['casudet'].data
+    with PhotometryFile.open(args.filename) as infile:
+        logger.debug('Computing statistics')
+        flux_stats = aperture_statistics(infile, 'flux', ['median', 'std'])
+        # Remember detflux is in magnitudes
+        det_stats = aperture_statistics(infile, 'casudet', ['median', 'std'])
 
-    logger.debug('Computing statistics')
+    med_mags = det_stats['median']
+    med_flux = flux_stats['median']
 
-    # Remember detflux is in magnitudes
-    med_mags = np.median(detflux, axis=1)
-    med_flux = np.median(flux, axis=1)
-
-    undetrended_frms = flux.std(axis=1) / med_flux
-    detrended_frms = detflux.std(axis=1)
+    undetrended_frms = flux_stats['std'] / med_flux
+    detrended_frms = det_stats['std']
 
     logger.info('Plotting to %s', args.output)
     with subplots(xlabels=['Magnitude'], ylabels=['Fractional rms']) as (fig, axes):
-        axes[0].semilogy(med_mags, undetrended_frms, '.', alpha=0.3, label='Raw')
-        axes[0].semilogy(med_mags, detrended_frms, '.', alpha=0.3, label='CASU')
+        # Limits first, as the density images are binned on them
+        axes[0].set_yscale('log')
         axes[0].set_xlim(10, 18)
         axes[0].set_ylim(1E-3, 1E-1)
+        density_scatter(axes[0], med_mags, undetrended_frms, color='C0',
+                        alpha=0.3, label='Raw')
+        density_scatter(axes[0], med_mags, detrended_frms, color='C1',
+                        alpha=0.3, label='CASU')
         axes[0].legend(loc='best')
         axes[0].grid(True, which='both')
 
     fig.savefig(args.output, bbox_inches='tight')
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output',
                         required=False,
                         default='-',
                         type=argparse.FileType(mode='w'))
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
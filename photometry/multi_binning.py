@@ -5,26 +5,33 @@ import os
 import sys
 import numpy as np
 from qa_common import get_logger
+from qa_common.instrument import instrumented
 from qa_common.plotting import plt
 from qa_common.filter_objects import good_measurement_indices
 from qa_common.util import NullPool
+from qa_common.photometry_file import PhotometryFile
+from qa_common.nights import NightIndex
+from qa_common.binning import (block_reduce, CumulativeMeanBinner,
+                               STATISTICS)
 import matplotlib.colors as colors
 import matplotlib.cm as cmx
-import fitsio
 from scipy.optimize import leastsq
 import argparse
 from collections import namedtuple
 import multiprocessing as mp
 from functools import partial
 import logging
-from scipy import stats
 
 NoiseResult = namedtuple('NoiseResult', ['x', 'y', 'yerr', 'white'])
 
 logger = get_logger(__file__)
 
+# Data for the worker processes. Set before the pool is created so workers
+# inherit it through fork, rather than having it pickled with every task
+_shared = {}
 
 
+@instrumented
 def main(args):
     filename = args.filename
     data_dict = load_data(filename, hdu=args.hdu)
@@ -49,12 +56,17 @@ def main(args):
 
     flux_limits = [(left_edges[i], right_edges[i]) for i in
                    xrange(len(left_edges))]
-    fn = partial(noisecharacterise, datadict=data_dict,
-                 flux_limits=flux_limits,
-                 ax=axis)
+    fn = partial(shared_noisecharacterise, flux_limits=flux_limits,
+                 statistic=args.statistic)
 
+    _shared['datadict'] = data_dict
     pool = pool_class()
-    plot_data = pool.map(fn, range(0, len(left_edges)))
+    try:
+        plot_data = pool.map(fn, range(0, len(left_edges)))
+    finally:
+        pool.close()
+        pool.join()
+        _shared.clear()
 
     for i, r in enumerate(plot_data):
         colorVal = scalarMap.to_rgba(values[i])
@@ -95,50 +107,45 @@ def create_colourbar(fig, values, mymap, cNorm):
 def load_data(filename, hdu, mask=None):
     mask = mask if mask is not None else []
 
-    dateclip = datesplit(filename)
-
-    with fitsio.FITS(filename) as infile:
-        imagelist = infile['imagelist']
-        tmid = imagelist['tmid'].read()
-        airmass = imagelist['airmass'].read()
-        exposure = imagelist['exposure'].read()
-
-        flux = infile[hdu].read()
+    with PhotometryFile.open(filename) as infile:
+        tmid = infile.column('imagelist', 'tmid')
+        exposure = infile.column('imagelist', 'exposure')
+        flux = infile.read(hdu)
+        mean_fluxes = infile.column('catalogue', 'flux_mean')
 
-        catalogue = infile['catalogue']
-        mean_fluxes = catalogue['flux_mean'].read()
-
-        ccdx = infile['ccdx'][:, :1].flatten()
-        ccdy = infile['ccdy'][:, :1].flatten()
+    nights = datesplit(filename, tmid)
 
     # Normalise by exposure time
-    flux /= exposure
+    flux = flux / exposure
 
-    logger.info('Nights in data: %s', dateclip[:, 0])
+    logger.info('Nights in data: %s', nights.start_times)
 
-    if len(mask) > 0:
-        dateclip = dateclip[mask]
-    logger.info("Number of nights used: %s", dateclip[:, 0])
+    chosen = mask if len(mask) > 0 else None
+    logger.info("Number of nights used: %s",
+                len(nights) if chosen is None else len(chosen))
 
-    cut = []
-    for time in tmid:
-        clip = [((time > date[0]) & (time < date[1])) for date in dateclip]
-        cut += [any(clip)]
-    cut = np.array(cut)
+    cut = nights.frame_mask(chosen)
 
     tmid = tmid[cut]
     flux = flux[:, cut]
+    # Shared with the worker processes, which must not write to it
+    flux.setflags(write=False)
 
-    outdict = {'time': tmid, 'flux': flux, 'mean_fluxes': mean_fluxes[cut]} 
+    outdict = {'time': tmid, 'flux': flux, 'mean_fluxes': mean_fluxes} 
 
     return outdict
 
 
-def noisecharacterise(i, flux_limits, datadict, c='b', model=True, ax=None):
+def shared_noisecharacterise(i, flux_limits, statistic='median'):
+    '''noisecharacterise on the data inherited from the parent process'''
+    return noisecharacterise(i, flux_limits, _shared['datadict'],
+                             statistic=statistic)
+
+
+def noisecharacterise(i, flux_limits, datadict, c='b', model=True,
+                      statistic='median'):
     '''Characterises the noise level of bright, non saturated stars from the 
     output of sysrem as a function of number of bins'''
-    ax = ax if ax is not None else plt.gca()
-
     tmid = datadict['time']
 
     cadence = np.median(np.diff(tmid)) * 24 * 60
@@ -193,11 +200,16 @@ def noisecharacterise(i, flux_limits, datadict, c='b', model=True, ax=None):
     rms_error = [
         (np.std(rms[sane_keys])) / np.sqrt(len(rms[sane_keys]) * 1000)]
 
+    if statistic == 'mean':
+        binner = CumulativeMeanBinner(flux_sane)
+    else:
+        binner = partial(binning, flux_sane, statistic=statistic)
+
     for N in binrange:
 
         logger.debug('bin size: %s', N)
 
-        binned = binning(flux_sane, N)
+        binned = binner(N)
 
         avflux = np.median(binned, axis=1)
         stdflux = np.std(binned, axis=1)
@@ -242,41 +254,16 @@ def noisecharacterise(i, flux_limits, datadict, c='b', model=True, ax=None):
         white_curve)
 
 
-def datesplit(filename):
-    '''returns an array index that can be used a cut an output file in desired
-    dateranges'''
-    time = fitsio.read(filename, 'imagelist')['TMID']
-    nights_used = [time[0]]
-    for i in range(1, len(time)):
-        shift = time[i] - time[i - 1]
-        if shift > 0.5:
-            nights_used += [time[i]]
-
-    nights_used += [1e9]
+def datesplit(filename, tmid=None):
+    '''returns the night index used to cut an output file into nights'''
+    return NightIndex.for_file(filename, gap_size=0.5, mjd=tmid)
 
-    nights_used = np.array(nights_used)
 
-    dateclip = []
-    for i in range(len(nights_used) - 1):
-        dateclip += [nights_used[i:i + 2]]
-    dateclip = np.array(dateclip)
-
-    return dateclip
-
-
-def binning(series, bin):
-    '''bins a time series to the level specified by `bin`'''
+def binning(series, bin, statistic='median'):
+    '''bins a time series to the level specified by `bin`, in consecutive
+    blocks of `bin` frames'''
     logger.debug('Binning')
-    bins = np.floor(len(series[0, :]) / bin)
-    x = np.arange(series.shape[1])
-
-    binned = []
-    for lc in series:
-        by, _, _ = stats.binned_statistic(
-            x, lc, bins=bins, statistic='median')
-        binned.append(by)
-    binned = np.array(binned)
-
+    binned = block_reduce(series, bin, statistic)
     logger.debug('Binning complete')
 
     return binned
@@ -296,7 +283,8 @@ def noisemodel(x, N):
 
     return curve
 
-if __name__ == '__main__':
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output', help='Save to output file',
@@ -305,8 +293,16 @@ if __name__ == '__main__':
                         action='store_true', default=False)
     parser.add_argument('-H', '--hdu', required=True,
             help='HDU to plot')
+    parser.add_argument('-s', '--statistic', choices=STATISTICS,
+                        default='median',
+                        help='Binning statistic; mean computes every bin '
+                        'size from one cumulative sum [default: median]')
+    return parser
+
+
+if __name__ == '__main__':
     try:
-        main(parser.parse_args())
+        main(build_parser().parse_args())
     except Exception as e:
         logger.exception('Failure')
         sys.exit(0)
@@ -5,24 +5,26 @@
 Compute the pixel centre of mass
 '''
 
-import fitsio
 import argparse
 import numpy as np
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
 from qa_common import plot_night_breaks, get_logger
+from qa_common.photometry_file import PhotometryFile
 
 logger = get_logger(__file__)
 
+@instrumented
 def main(args):
     logger.info('Reading data from %s', args.fname)
-    with fitsio.FITS(args.fname) as infile:
-        ccdx = infile['ccdx'].read()
-        ccdy = infile['ccdy'].read()
-        mjd = infile['imagelist']['tmid'].read()
+    with PhotometryFile.open(args.fname) as infile:
+        ccdx = infile.read('ccdx')
+        ccdy = infile.read('ccdy')
+        mjd = infile.column('imagelist', 'tmid')
 
     mjd0 = int(mjd.min())
-    mjd -= mjd0
+    mjd = mjd - mjd0
     fn = np.median
 
     logger.info('Plotting')
@@ -46,9 +48,13 @@ def main(args):
         plt.show()
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('fname')
     parser.add_argument('-o', '--output', required=False,
             type=argparse.FileType(mode='w'))
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
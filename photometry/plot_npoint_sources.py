@@ -3,17 +3,17 @@
 
 import argparse
 from qa_common.plotting import plt
-from qa_common import get_logger
-import csv
+from qa_common.instrument import instrumented
+from qa_common import CSVContainer, get_logger
 import numpy as np
 
 logger = get_logger(__file__)
 
 
+@instrumented
 def main(args):
-    reader = csv.DictReader(args.data)
-    mjd, nsources = map(np.array, zip(*[(float(row['mjd']), float(row['nsources']))
-                                        for row in reader]))
+    data = CSVContainer(args.data)
+    mjd, nsources = data.mjd, data.nsources
     logger.info('Read point source data')
     error = np.sqrt(nsources)
 
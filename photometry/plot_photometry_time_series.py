@@ -1,25 +1,26 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import fitsio
 import argparse
 import numpy as np
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
 from qa_common import plot_night_breaks, get_logger
+from qa_common.photometry_file import PhotometryFile
 
 logger = get_logger(__file__)
 
+@instrumented
 def main(args):
     logger.info('Reading data')
-    with fitsio.FITS(args.filename) as infile:
-        imagelist_hdu = infile['imagelist']
-        mjd = imagelist_hdu['tmid'].read()
-        seeing = imagelist_hdu['seeing'].read()
-        frame_sn = imagelist_hdu['frame_sn'].read()
+    with PhotometryFile.open(args.filename) as infile:
+        mjd = infile.column('imagelist', 'tmid')
+        seeing = infile.column('imagelist', 'seeing')
+        frame_sn = infile.column('imagelist', 'frame_sn')
 
     mjd0 = int(mjd.min())
-    mjd -= mjd0
+    mjd = mjd - mjd0
 
 
     logger.info('Plotting')
@@ -40,10 +41,14 @@ def main(args):
     else:
         plt.show()
 
-if __name__ == '__main__':
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output', required=False,
             type=argparse.FileType(mode='w'))
-    main(parser.parse_args())
+    return parser
 
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
@@ -2,9 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-from qa_common.plotting import plt
-from qa_common import get_logger
-import csv
+from qa_common.plotting import plt, interleaved_scatter
+from qa_common.instrument import instrumented
+from qa_common import CSVContainer, get_logger
 import numpy as np
 import itertools
 from functools import partial
@@ -28,13 +28,6 @@ colours = {
         }
 
 
-def random_zorder(x, y, nvalues, min_zorder=10):
-    order = np.random.randint(min_zorder, min_zorder + nvalues,
-            size=x.size)
-    for zorder in np.sort(np.unique(order)):
-        ind = order == zorder
-        yield (x[ind], y[ind], zorder)
-
 def compute_stats(data):
     data = np.array(data)
     low, high = np.percentile(data, [16, 84], axis=0)
@@ -43,22 +36,21 @@ def compute_stats(data):
 
 
 def render(ax, mjd, data, key_type):
-    zorder_min = 10
+    series = []
     stack = []
     for key in psf_keys:
         if key_type in key:
             index = int(key.split('_')[-1])
-            colour = colours[index]
-            for (x, y, zorder) in random_zorder(mjd, data[key], len(psf_indices)):
-                ax.plot(x, y, '.', color=colour, label=key, zorder=zorder,
-                        markersize=markersize)
+            series.append((mjd, data[key], colours[index]))
             stack.append(data[key])
+    interleaved_scatter(ax, series, markersize=markersize, zorder=10)
     # low, med, high = compute_stats(np.array(stack))
     # _errorbar(ax, mjd, med, low, high)
 
 
+@instrumented
 def main(args):
-    data = np.genfromtxt(args.data, delimiter=',', names=True)
+    data = CSVContainer(args.data)
 
     mjd = data['mjd']
     mjd0 = int(mjd.min())
@@ -70,19 +62,17 @@ def main(args):
     render(axes[3], mjd, data, key_type='T')
 
     stack = []
+    fwhm_series, e_series = [], []
     for i in psf_indices:
         A = data['psf_A_{}'.format(i)]
         B = data['psf_B_{}'.format(i)]
         fwhm = (A + B) / 2.
-        for (x, y, zorder) in random_zorder(mjd, fwhm, len(psf_indices)):
-            axes[0].plot(x, y, '.', zorder=zorder, color=colours[i],
-                    markersize=markersize)
+        fwhm_series.append((mjd, fwhm, colours[i]))
         e = np.sqrt(1. - (B / A) ** 2)
         stack.append(e)
-        for (x, y, zorder) in random_zorder(mjd, e, len(psf_indices)):
-            axes[4].plot(x, y, '.', color=colours[i],
-                    zorder=zorder, label='Ecc. {}'.format(i),
-                    markersize=markersize)
+        e_series.append((mjd, e, colours[i]))
+    interleaved_scatter(axes[0], fwhm_series, markersize=markersize, zorder=10)
+    interleaved_scatter(axes[4], e_series, markersize=markersize, zorder=10)
     low, med, high = compute_stats(stack)
     # _errorbar(axes[4], mjd, med, low, high)
 
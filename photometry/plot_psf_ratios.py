@@ -3,8 +3,8 @@
 
 import argparse
 from qa_common.plotting import plt
-from qa_common import get_logger
-import csv
+from qa_common.instrument import instrumented
+from qa_common import CSVContainer, get_logger
 import numpy as np
 import itertools
 from functools import partial
@@ -20,8 +20,9 @@ psf_keys = ['psf_{typ}_{i}'.format(typ=typ,
 def eccentricity(a, b):
     return np.sqrt(1. - (b / a) ** 2)
 
+@instrumented
 def main(args):
-    data = np.genfromtxt(args.data, delimiter=',', names=True)
+    data = CSVContainer(args.data)
 
     mjd = data['mjd']
     mjd0 = int(mjd.min())
@@ -9,8 +9,11 @@ import numpy as np
 import argparse
 
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
+from qa_common.nights import NightIndex
 
 
+@instrumented
 def main(args):
     with fitsio.FITS(args.filename) as infile:
         imagelist = infile['imagelist']
@@ -22,15 +25,13 @@ def main(args):
     fig, axes = plt.subplots(n_coeffs, 1, sharex=True, figsize=(11, 8))
 
     frames = np.arange(mjd.size)
+    breaks = NightIndex.for_file(args.filename, mjd=mjd).breaks
 
     for i, axis in enumerate(axes):
         data = coeffs[:, i]
 
         axis.plot(frames, data, 'k.', label="{}".format(i + 1))
 
-        # Detect night boundaries
-        d_mjd = np.diff(mjd)
-        breaks = np.where(np.diff(mjd) > 0.3)[0]
         for b in breaks:
             axis.axvline(b, ls=':', color='k')
 
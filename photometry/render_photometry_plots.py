@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Render every photometry plot from a single AperturePhot output file.
+
+The output file is opened once and the arrays shared between plots (flux
+hdus, the imagelist table, ccdx/ccdy) are kept in memory, rather than each
+plotting script re-reading them.
+'''
+
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import imp
+import os
+import sys
+from collections import OrderedDict
+
+from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.plotting import plt
+from qa_common.photometry_file import PhotometryFile
+
+logger = get_logger(__file__)
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_HDUS = ['flux', 'tamflux', 'casudet']
+
+
+class Plot(object):
+    '''
+    Description of how to call a plotting script's `main` in-process
+
+    The remaining arguments of `main` take the defaults of the script's
+    `build_parser`, and `filename_arg` is the attribute its `main` reads
+    the input file from.
+    '''
+
+    def __init__(self, script, per_hdu=False, filename_arg='filename'):
+        self.script = script
+        self.per_hdu = per_hdu
+        self.filename_arg = filename_arg
+        self._module = None
+        self._defaults = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            path = os.path.join(ROOT, self.script)
+            name = os.path.splitext(os.path.basename(path))[0]
+            directory = os.path.dirname(path)
+            if directory not in sys.path:
+                sys.path.insert(0, directory)
+            self._module = imp.load_source(name.replace('-', '_'), path)
+        return self._module
+
+    @property
+    def defaults(self):
+        '''
+        Argparse defaults of the script, converted by their type as
+        `parse_args` would
+        '''
+        if self._defaults is None:
+            parser = self.module.build_parser()
+            defaults = {}
+            for action in parser._actions:
+                if action.default is argparse.SUPPRESS:
+                    continue
+                default = action.default
+                if isinstance(default, str) and action.type is not None:
+                    default = action.type(default)
+                defaults[action.dest] = default
+            defaults.update(parser._defaults)
+            self._defaults = defaults
+        return self._defaults
+
+    def build_args(self, filename, output, hdu=None, **kwargs):
+        args = dict(self.defaults, output=output, **kwargs)
+        args[self.filename_arg] = filename
+        if self.per_hdu:
+            args['hdu'] = hdu
+        return argparse.Namespace(**args)
+
+    def render(self, filename, output, hdu=None, **kwargs):
+        self.module.main(self.build_args(filename, output, hdu, **kwargs))
+
+
+PLOTS = OrderedDict([
+    ('flux-vs-rms', Plot('photometry/flux_vs_rms.py', per_hdu=True)),
+    ('casu-flux-vs-rms', Plot('photometry/flux_vs_rms_with_casu.py')),
+    ('rms-vs-time', Plot('photometry/rms_vs_time.py', per_hdu=True)),
+    ('casu-rms-vs-time', Plot('photometry/rms_vs_time_with_casu.py')),
+    ('rms-with-binning', Plot('photometry/multi_binning.py', per_hdu=True)),
+    ('photometry-time-series',
+     Plot('photometry/plot_photometry_time_series.py')),
+    ('binned-lightcurves-by-brightness',
+     Plot('photometry/binning_per_brightness.py', per_hdu=True)),
+    ('autoguider-results', Plot('astrometry/plot_ag_parameters.py')),
+    ('pixel-centre-of-mass', Plot('photometry/pixel-com.py',
+                                  filename_arg='fname')),
+])
+
+
+def parse_plot_spec(spec):
+    '''
+    Parse a plot specification of the form `name[:hdu]=output`
+    '''
+    try:
+        name, output = spec.split('=', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Plot specification {} must be of the form name[:hdu]=output'.format(
+                spec))
+
+    name, _, hdu = name.partition(':')
+    if name not in PLOTS:
+        raise argparse.ArgumentTypeError('Unknown plot {}, choose from {}'.format(
+            name, ', '.join(PLOTS)))
+
+    if PLOTS[name].per_hdu and not hdu:
+        raise argparse.ArgumentTypeError('Plot {} requires an hdu'.format(name))
+
+    return name, hdu or None, output
+
+
+def default_plot_specs(plots, hdus, output_dir, extension):
+    for name in plots:
+        if PLOTS[name].per_hdu:
+            for hdu in hdus:
+                yield (name, hdu, os.path.join(
+                    output_dir, '{}-{}.{}'.format(name, hdu, extension)))
+        else:
+            yield (name, None, os.path.join(
+                output_dir, '{}.{}'.format(name, extension)))
+
+
+def render_plots(filename, plot_specs, preload=None, **kwargs):
+    '''
+    Render each `(name, hdu, output)` plot from `filename`, returning the
+    names of the plots which failed.
+
+    The hdus in `preload` are read up front, any others when first used.
+    '''
+    failures = []
+    with stage('read'):
+        source = PhotometryFile.shared(filename, hdus=preload)
+    try:
+        for (name, hdu, output) in plot_specs:
+            label = '{}:{}'.format(name, hdu) if hdu else name
+            logger.info('Rendering %s to %s', label, output)
+            try:
+                PLOTS[name].render(filename, output, hdu, **kwargs)
+            except Exception:
+                logger.exception('Failed to render %s', label)
+                failures.append(label)
+            finally:
+                plt.close('all')
+    finally:
+        source.close()
+
+    return failures
+
+
+@instrumented
+def main(args):
+    if args.plot:
+        plot_specs = args.plot
+    else:
+        plot_specs = list(default_plot_specs(args.plots or list(PLOTS),
+                                             args.hdus, args.output_dir,
+                                             args.extension))
+
+    failures = render_plots(args.filename, plot_specs,
+                            preload=args.preload,
+                            metadata=args.metadata)
+    if failures:
+        logger.error('Failed plots: %s', ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('filename', help='AperturePhot output file')
+    parser.add_argument('--plot', action='append', type=parse_plot_spec,
+                        help='Plot to render, as name[:hdu]=output. '
+                        'May be given multiple times')
+    parser.add_argument('-d', '--output-dir', default='.',
+                        help='Output directory when no --plot is given')
+    parser.add_argument('--plots', nargs='+', choices=list(PLOTS),
+                        help='Plots to render when no --plot is given '
+                        '[default: all]')
+    parser.add_argument('-H', '--hdus', nargs='+', default=DEFAULT_HDUS,
+                        help='Hdus to render when no --plot is given '
+                        '[default: {}]'.format(' '.join(DEFAULT_HDUS)))
+    parser.add_argument('--preload', nargs='*', default=[],
+                        help='Hdus to read before plotting')
+    parser.add_argument('-m', '--metadata',
+                        help='Frame metadata table for the brightness binning '
+                        'plot, from extract_frame_metadata.py')
+    parser.add_argument('-e', '--extension', default='png',
+                        help='Output extension [default: png]')
+    main(parser.parse_args())
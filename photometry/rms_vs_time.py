@@ -3,48 +3,85 @@
 
 
 import sys
-import fitsio
 import numpy as np
 import argparse
 from collections import namedtuple
-from scipy.stats import scoreatpercentile
 
 from qa_common.filter_objects import good_measurement_indices
+from qa_common.instrument import instrumented
 from qa_common.plotting import plt
 from qa_common import get_logger
+from qa_common.photometry_file import PhotometryFile
+from qa_common.nights import NightIndex
+from qa_common.aperture_stats import aperture_statistics, scaled_blocks
+from qa_common.sketch import (QuantileSketch, StreamingMoments,
+                              DEFAULT_SKETCH_SIZE)
 
 logger = get_logger(__file__)
 
 summary = namedtuple('Summary', ['mjd', 'flux', 'breaks', 'lq', 'uq', 'std'])
 
-def extract_flux_data(fname, hdu, chosen_exptime=None):
-    logger.info("Extracting from %s", fname)
-    with fitsio.FITS(fname) as infile:
-        flux = infile[hdu].read()
-        imagelist = infile['imagelist']
-        airmass = imagelist['airmass'].read()
-        exptime = imagelist['exposure'].read()
-        mjd = imagelist['tmid'].read()
-
-        ccdx = infile['ccdx'][:, :1].flatten()
-        ccdy = infile['ccdy'][:, :1].flatten()
-
+def normalised_blocks(infile, hdu, exptime):
+    '''
+    Lightcurves normalised by exposure time and per-aperture median, in
+    blocks of apertures. Apertures with a non-positive median are dropped.
+    '''
     logger.info('Normalising by exposure time')
-    flux /= exptime
-
-    per_ap_median = np.median(flux, axis=1)
+    per_ap_median = aperture_statistics(infile, hdu, ['median'],
+                                        scale=exptime)['median']
     ind = (per_ap_median > 0)
-    normalise_flux = ((flux[ind].T / per_ap_median[ind]) - 1.0).T
-    assert normalise_flux.shape[1] == flux.shape[1], (normalise_flux.shape,
-            flux.shape)
 
-    med_flux = np.median(normalise_flux, axis=0)
-    assert med_flux.size == mjd.size, (med_flux.size, mjd.size)
+    for rows, block in scaled_blocks(infile, hdu, scale=exptime):
+        chosen = ind[rows]
+        yield (block[chosen] / per_ap_median[rows][chosen][:, np.newaxis]
+               - 1.0)
 
-    breaks = np.where(np.diff(mjd) > 0.5)[0]
 
-    lq, uq = scoreatpercentile(normalise_flux, [25, 75], axis=0)
+def exact_frame_statistics(blocks):
+    normalise_flux = np.concatenate(list(blocks))
+    med_flux = np.median(normalise_flux, axis=0)
+    lq, uq = np.percentile(normalise_flux, [25, 75], axis=0)
     std = np.std(normalise_flux, axis=0) / np.sqrt(normalise_flux.shape[0])
+    return med_flux, lq, uq, std
+
+
+def sketched_frame_statistics(blocks, nframes, sketch_size):
+    sketch = QuantileSketch(nframes, k=sketch_size)
+    moments = StreamingMoments(nframes)
+    for block in blocks:
+        sketch.update(block)
+        moments.update(block)
+
+    logger.info('Per-frame quantiles of %s apertures, rank error below %.2g%%',
+                sketch.count,
+                100 * QuantileSketch.error_bound(sketch.count, sketch_size))
+    med_flux, lq, uq = sketch.quantiles([0.5, 0.25, 0.75])
+    std = moments.std / np.sqrt(moments.count)
+    return med_flux, lq, uq, std
+
+
+def extract_flux_data(fname, hdu, chosen_exptime=None, exact=False,
+                      sketch_size=DEFAULT_SKETCH_SIZE):
+    '''
+    Per-frame median, quartiles and standard error of the normalised
+    lightcurves. Unless `exact` is set the quantiles come from a streaming
+    sketch, so the full flux matrix is never held in memory.
+    '''
+    logger.info("Extracting from %s", fname)
+    with PhotometryFile.open(fname) as infile:
+        exptime = infile.column('imagelist', 'exposure')
+        mjd = infile.column('imagelist', 'tmid')
+
+        blocks = normalised_blocks(infile, hdu, exptime)
+        if exact:
+            med_flux, lq, uq, std = exact_frame_statistics(blocks)
+        else:
+            med_flux, lq, uq, std = sketched_frame_statistics(
+                blocks, mjd.size, sketch_size)
+
+    assert med_flux.size == mjd.size, (med_flux.size, mjd.size)
+
+    breaks = NightIndex.for_file(fname, gap_size=0.5, mjd=mjd).breaks
 
     return summary(mjd, med_flux, breaks, lq, uq, std)
 
@@ -71,11 +108,13 @@ def plot_breaks(s, ax=None):
                 zorder=-10)
 
 
+@instrumented
 def main(args):
     fig, ax = plt.subplots(figsize=(11, 8))
 
     flux_data = extract_flux_data(args.filename, hdu=args.hdu,
-            chosen_exptime=args.exptime)
+            chosen_exptime=args.exptime, exact=args.exact,
+            sketch_size=args.sketch_size)
     plot_summary(flux_data, 'b', title=args.hdu, ax=ax)
 
     ax.legend(loc='best')
@@ -96,7 +135,8 @@ def main(args):
         plt.show()
     
 
-if __name__ == '__main__':
+
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('-o', '--output', required=False,
             type=argparse.FileType(mode='w'), help='Output image name')
@@ -108,5 +148,15 @@ if __name__ == '__main__':
                         required=False, default=None, type=float)
     parser.add_argument('-n', '--nsigma', help='Sigma clip the output',
                         required=False, default=None, type=float)
+    parser.add_argument('--exact', action='store_true', default=False,
+                        help='Compute exact per-frame quantiles, holding the '
+                        'whole flux matrix in memory')
+    parser.add_argument('--sketch-size', type=int,
+                        default=DEFAULT_SKETCH_SIZE,
+                        help='Quantile sketch buffer size; larger is more '
+                        'accurate [default: %(default)s]')
+    return parser
 
-    main(parser.parse_args())
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
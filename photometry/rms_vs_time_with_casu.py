@@ -4,9 +4,10 @@
 from __future__ import division, print_function, absolute_import
 import argparse
 from qa_common.plotting import plt, subplots
+from qa_common.instrument import instrumented
 from qa_common.qa_logging import get_logger
 import numpy as np
-from astropy.io import fits
+from qa_common.photometry_file import PhotometryFile
 
 logger = get_logger(__file__)
 
@@ -24,19 +25,19 @@ def errorbar(ax, x, y, e, *args, **kwargs):
                 lw=1., *args, **kwargs)
 
 
+@instrumented
 def main(args):
     if args.verbose:
         logger.setLevel('DEBUG')
     logger.debug(args)
 
-    with fits.open(args.filename) as infile:
-        imagelist = infile['imagelist'].data
-        imag = -2.5 * np.log10(infile['flux'].data)
-        detflux = infile['casudet'].data
+    with PhotometryFile.open(args.filename) as infile:
+        mjd = infile.column('imagelist', 'tmid')
+        imag = -2.5 * np.log10(infile.read('flux'))
+        detflux = infile.read('casudet')
 
-    mjd = imagelist['tmid']
     mjd0 = int(mjd.min())
-    mjd -= mjd0
+    mjd = mjd - mjd0
     normalised_flux = detflux - np.median(detflux, axis=1)[:, np.newaxis]
     normalised_raw = imag - np.median(imag, axis=1)[:, np.newaxis]
 
@@ -69,7 +70,7 @@ def main(args):
     fig.savefig(args.output)
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('-o', '--output',
@@ -77,4 +78,8 @@ if __name__ == '__main__':
                         default='-',
                         type=argparse.FileType(mode='w'))
     parser.add_argument('-v', '--verbose', action='store_true')
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
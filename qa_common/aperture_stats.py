@@ -0,0 +1,78 @@
+'''
+Per-aperture statistics of an (aperture, frame) image hdu, computed from
+blocks of rows so memory use does not grow with the number of apertures.
+
+The block size is chosen so each block, and the temporaries made from it,
+fit in `max_bytes`, which defaults to the `QA_CHUNK_MEMORY` environment
+variable (in MB) or 256 MB.
+'''
+
+import os
+import numpy as np
+
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+CHUNK_MEMORY_ENV = 'QA_CHUNK_MEMORY'
+DEFAULT_CHUNK_MEMORY = 256 * 1024 ** 2
+
+# Copies of a block alive at once: the block itself, the scaled block and
+# the partially sorted copies made by median and percentile
+BLOCK_COPIES = 4
+
+STATISTICS = {
+    'mean': lambda block: np.mean(block, axis=1),
+    'median': lambda block: np.median(block, axis=1),
+    'std': lambda block: np.std(block, axis=1),
+}
+
+
+def chunk_memory():
+    value = os.environ.get(CHUNK_MEMORY_ENV)
+    if value:
+        return int(float(value) * 1024 ** 2)
+    return DEFAULT_CHUNK_MEMORY
+
+
+def rows_per_chunk(nframes, max_bytes=None, itemsize=8):
+    max_bytes = max_bytes if max_bytes is not None else chunk_memory()
+    return max(1, int(max_bytes // (nframes * itemsize * BLOCK_COPIES)))
+
+
+def scaled_blocks(infile, hdu, scale=None, max_bytes=None):
+    '''
+    Iterate over (row slice, block) pairs of an image hdu in an open
+    `PhotometryFile`, optionally dividing each frame by `scale`, e.g. the
+    exposure times
+    '''
+    nframes = infile.shape(hdu)[1]
+    for rows, block in infile.iter_rows(hdu, rows_per_chunk(nframes,
+                                                            max_bytes)):
+        if scale is not None:
+            block = block / scale
+        yield rows, block
+
+
+def aperture_statistics(infile, hdu, statistics=('mean', 'median', 'std'),
+                        percentiles=(), scale=None, max_bytes=None):
+    '''
+    Compute per-aperture statistics of an image hdu in an open
+    `PhotometryFile`.
+
+    Returns a dictionary of statistic name => array with one value per
+    aperture. Percentiles are stored under `p<q>`, e.g. `p25`.
+    '''
+    naps = infile.shape(hdu)[0]
+    results = dict((name, np.empty(naps)) for name in statistics)
+    results.update(('p{:g}'.format(q), np.empty(naps)) for q in percentiles)
+
+    for rows, block in scaled_blocks(infile, hdu, scale, max_bytes):
+        for name in statistics:
+            results[name][rows] = STATISTICS[name](block)
+        if percentiles:
+            values = np.percentile(block, list(percentiles), axis=1)
+            for (q, value) in zip(percentiles, values):
+                results['p{:g}'.format(q)][rows] = value
+
+    return results
@@ -0,0 +1,157 @@
+'''
+Self-describing binary tables, passed from the extract_* to the plot_*
+scripts instead of csv so values are not formatted and parsed again.
+
+A table is the line `MAGIC`, a json schema line listing the name and numpy
+dtype of every column, then the rows as fixed-width little-endian records.
+Reading is a single `np.frombuffer` over the records, so the columns are
+views of the bytes read. Strings are stored with the width of the longest
+value.
+
+`write_table` writes either format, so csv stays available for reading by
+eye; `CSVContainer` reads either.
+'''
+
+import csv
+import itertools
+import json
+import shutil
+import tempfile
+import numpy as np
+
+MAGIC = b'QATABLE 1\n'
+FORMATS = ['csv', 'binary']
+
+# Column types of chunked tables, by numpy kind
+WIDEST = {'b': np.dtype('?'), 'i': np.dtype('<i8'), 'u': np.dtype('<i8'),
+          'f': np.dtype('<f8')}
+
+
+def to_column(values):
+    '''
+    Array of a column's values; anything numpy cannot hold in a fixed-width
+    type (e.g. a mix of numbers and None) is stored as strings
+    '''
+    column = np.array(values)
+    if column.dtype == object:
+        column = np.array([str(value) for value in values])
+    return column.astype(column.dtype.newbyteorder('<'))
+
+
+def records_from_rows(rows, keys):
+    '''
+    Structured array of `rows`, a sequence of dicts (or sequences, in the
+    order of `keys`)
+    '''
+    rows = list(rows)
+    if rows and isinstance(rows[0], dict):
+        rows = [[row[key] for key in keys] for row in rows]
+    if rows:
+        columns = [to_column(values) for values in zip(*rows)]
+    else:
+        columns = [np.array([], dtype='<f8') for _ in keys]
+
+    records = np.empty(len(rows), dtype=[(str(key), column.dtype)
+                                         for (key, column) in
+                                         zip(keys, columns)])
+    for (key, column) in zip(keys, columns):
+        records[str(key)] = column
+    return records
+
+
+def write_binary(outfile, records):
+    schema = [[name, records.dtype[name].str]
+              for name in records.dtype.names]
+    outfile.write(MAGIC)
+    outfile.write(json.dumps({'columns': schema}).encode('utf-8') + b'\n')
+    outfile.write(records.tobytes())
+
+
+def chunk_dtype(records):
+    '''
+    Table dtype for chunks like `records`: the widest type of each numeric
+    kind, so later chunks with larger values still fit
+    '''
+    return np.dtype([(name, WIDEST.get(records.dtype[name].kind,
+                                       records.dtype[name]))
+                     for name in records.dtype.names])
+
+
+def write_binary_chunks(outfile, rows, keys, chunk_size):
+    '''
+    Write `rows` as a binary table `chunk_size` rows at a time, so they are
+    never all in memory. The schema is fixed by the first chunk (see
+    `chunk_dtype`): later chunks must cast safely to it, e.g. an integer
+    column cannot later hold floats and later strings must be no longer
+    than the first. The records are spilled to a temporary file and only
+    copied to `outfile` once every chunk has been checked, so a failure
+    never leaves a half-written table.
+    '''
+    rows = iter(rows)
+    first = records_from_rows(itertools.islice(rows, chunk_size), keys)
+    dtype = chunk_dtype(first)
+    with tempfile.TemporaryFile() as spill:
+        spill.write(first.astype(dtype).tobytes())
+        for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)),
+                          []):
+            records = records_from_rows(chunk, keys)
+            for name in dtype.names:
+                if not np.can_cast(records.dtype[name], dtype[name], 'safe'):
+                    raise ValueError(
+                        'Column {} changes type from {} to {}'.format(
+                            name, dtype[name], records.dtype[name]))
+            spill.write(records.astype(dtype).tobytes())
+
+        write_binary(outfile, np.empty(0, dtype=dtype))
+        spill.seek(0)
+        shutil.copyfileobj(spill, outfile)
+
+
+def write_csv(outfile, rows, keys):
+    writer = csv.DictWriter(outfile, fieldnames=keys)
+    writer.writeheader()
+    for row in rows:
+        if not isinstance(row, dict):
+            row = dict(zip(keys, row))
+        writer.writerow(row)
+
+
+def write_table(outfile, rows, keys, format='csv', chunk_size=None):
+    '''
+    Write `rows`, dicts or sequences in the order of `keys`, as `format`.
+    Csv rows are written as they arrive; binary rows are collected first,
+    unless `chunk_size` is given (see `write_binary_chunks`).
+    '''
+    if format == 'csv':
+        write_csv(outfile, rows, keys)
+    elif format == 'binary' and chunk_size:
+        write_binary_chunks(getattr(outfile, 'buffer', outfile), rows, keys,
+                            chunk_size)
+    elif format == 'binary':
+        write_binary(getattr(outfile, 'buffer', outfile),
+                     records_from_rows(rows, keys))
+    else:
+        raise ValueError('Unknown table format {}, choose from {}'.format(
+            format, ', '.join(FORMATS)))
+    outfile.flush()
+
+
+def parse_binary(content):
+    '''
+    Structured array of the records in `content`, which must start with
+    `MAGIC`. The records share memory with `content`, so pass a bytearray
+    for writable columns.
+    '''
+    end = content.index(b'\n', len(MAGIC))
+    header = json.loads(bytes(content[len(MAGIC):end]).decode('utf-8'))
+    dtype = np.dtype([(str(name), str(code))
+                      for (name, code) in header['columns']])
+    return np.frombuffer(content, dtype=dtype, offset=end + 1)
+
+
+def add_format_argument(parser):
+    '''
+    Add the output table format option to an extraction script's parser
+    '''
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help='Output table format [default: csv]')
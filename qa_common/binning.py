@@ -0,0 +1,59 @@
+'''
+Block binning of (star, frame) flux matrices.
+
+Every lightcurve is split into consecutive blocks of `size` frames, dropping
+any partial block at the end, and each block is reduced to one value. All
+stars are binned at once.
+'''
+
+import numpy as np
+
+STATISTICS = ['median', 'mean']
+
+
+def block_view(flux, size):
+    '''
+    View of `flux` with shape (nstars, nblocks, size)
+    '''
+    flux = np.atleast_2d(flux)
+    nblocks = flux.shape[1] // size
+    return flux[:, :nblocks * size].reshape(flux.shape[0], nblocks, size)
+
+
+def block_median(flux, size):
+    return np.median(block_view(flux, size), axis=2)
+
+
+def block_mean(flux, size):
+    return block_view(flux, size).mean(axis=2)
+
+
+def block_reduce(flux, size, statistic='median'):
+    if statistic == 'median':
+        return block_median(flux, size)
+    elif statistic == 'mean':
+        return block_mean(flux, size)
+    raise ValueError('Unknown statistic {}, choose from {}'.format(
+        statistic, ', '.join(STATISTICS)))
+
+
+class CumulativeMeanBinner(object):
+    '''
+    Block means for any bin size from a single cumulative sum along the
+    frames, so binning at many sizes costs one pass over the data plus a
+    gather of the block edges per size.
+
+    The sums are accumulated in double precision; nans propagate to every
+    later block of the lightcurve, so filter them out first.
+    '''
+
+    def __init__(self, flux):
+        flux = np.atleast_2d(flux)
+        self.nframes = flux.shape[1]
+        self.cumsum = np.zeros((flux.shape[0], self.nframes + 1))
+        np.cumsum(flux, axis=1, out=self.cumsum[:, 1:])
+
+    def __call__(self, size):
+        nblocks = self.nframes // size
+        edges = np.arange(nblocks + 1) * size
+        return np.diff(self.cumsum[:, edges], axis=1) / size
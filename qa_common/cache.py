@@ -0,0 +1,286 @@
+'''
+On-disk caches keyed on file identity.
+
+`FileMemo` stores the result of a per-file extraction function, keyed on the
+file path, size and modification time (and optionally a hash of its
+contents), so unchanged files are not opened again. `inputs_digest` hashes a
+set of input files, so a job can tell whether its inputs have changed.
+'''
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import time
+
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+CACHE_ENV = 'QA_CACHE'
+CACHE_SIZE_ENV = 'QA_CACHE_SIZE'
+MISSING = object()
+
+
+def content_hash(fname, blocksize=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(fname, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_key(fname, hash_contents=False):
+    '''
+    Identity of a file: (real path, size, mtime, ''), or with
+    `hash_contents` (real path, size, None, content hash) so rewriting a
+    file with the same contents does not change its identity
+    '''
+    path = os.path.realpath(fname)
+    stat = os.stat(path)
+    if hash_contents:
+        return (path, stat.st_size, None, content_hash(path))
+    return (path, stat.st_size, stat.st_mtime, '')
+
+
+def inputs_digest(filenames, extra=(), hash_contents=False):
+    '''
+    Hash of the identity of every file in `filenames`, plus any strings in
+    `extra` (e.g. the command line). Missing files hash as missing.
+    '''
+    digest = hashlib.sha1()
+    for value in extra:
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\0')
+    for fname in filenames:
+        try:
+            key = file_key(fname, hash_contents=hash_contents)
+        except OSError:
+            key = (fname, 'missing')
+        digest.update(repr(key).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class WithFilename(object):
+    '''
+    Wrap `fn` to return (filename, result), so results arriving out of
+    order can be matched to their files. A class so it can be pickled.
+    '''
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, fname):
+        return fname, self.fn(fname)
+
+
+class FileMemo(object):
+    '''
+    Cache of per-file results stored in a sqlite database.
+
+    Results are stored per `namespace`, which should change whenever the
+    extraction function changes its output: `open_memo` adds a hash of the
+    calling script's source to it, so editing an extractor starts a new
+    namespace rather than returning stale results. When the database grows
+    beyond `max_bytes` the least recently used results are evicted.
+
+    The cache is shared by concurrent jobs, so nothing is written while
+    results are being computed: new results and access times are written
+    together in short transactions (see `write`).
+    '''
+
+    def __init__(self, path, namespace, max_bytes=DEFAULT_MAX_BYTES,
+                 hash_contents=False):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('''create table if not exists memo (
+            namespace text, path text, size integer, mtime real, digest text,
+            value blob, nbytes integer, accessed real,
+            primary key (namespace, path))''')
+        self.connection.commit()
+        # (time, namespace, path) of the results returned since the last write
+        self.accessed = []
+
+    def get(self, fname):
+        '''
+        Return the cached value for `fname`, or `MISSING`. Its access time
+        is recorded on the next `write`.
+        '''
+        path, size, mtime, digest = file_key(fname, self.hash_contents)
+        row = self.connection.execute(
+            '''select size, mtime, digest, value from memo
+            where namespace = ? and path = ?''',
+            (self.namespace, path)).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime, digest):
+            return MISSING
+
+        self.accessed.append((time.time(), self.namespace, path))
+        return pickle.loads(bytes(row[3]))
+
+    def put(self, fname, value):
+        path, size, mtime, digest = file_key(fname, self.hash_contents)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.connection.execute(
+            'insert or replace into memo values (?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.namespace, path, size, mtime, digest, sqlite3.Binary(blob),
+             len(blob), time.time()))
+
+    def write(self, results=()):
+        '''
+        Store `results`, (filename, value) pairs, and the access times of the
+        cached results returned since the last write, in one transaction
+        '''
+        for (fname, value) in results:
+            self.put(fname, value)
+        self.connection.executemany(
+            'update memo set accessed = ? where namespace = ? and path = ?',
+            self.accessed)
+        self.accessed = []
+        self.evict()
+        self.connection.commit()
+
+    def map(self, fn, fnames, mapper=map):
+        '''
+        Equivalent to `mapper(fn, fnames)`, but only calling `fn` for files
+        which are not cached. Results are returned in the order of `fnames`.
+        '''
+        fnames = list(fnames)
+        results = [self.get(fname) for fname in fnames]
+        missing = [i for (i, result) in enumerate(results)
+                   if result is MISSING]
+        logger.info('%s: %s of %s files cached', self.namespace,
+                    len(fnames) - len(missing), len(fnames))
+
+        computed = list(mapper(fn, [fnames[i] for i in missing]))
+        for (i, value) in zip(missing, computed):
+            results[i] = value
+
+        self.write((fnames[i], value) for (i, value) in zip(missing, computed))
+        return results
+
+    def imap(self, fn, fnames, mapper=None, commit_every=100):
+        '''
+        Generator of the results of `fn` for `fnames`, in no particular
+        order: cached results first, then results as `mapper`, e.g.
+        `Pool.imap_unordered`, returns them
+        '''
+        # Not a default argument, which would be the `map` method
+        mapper = mapper or map
+        missing = []
+        for fname in fnames:
+            result = self.get(fname)
+            if result is MISSING:
+                missing.append(fname)
+            else:
+                yield result
+        logger.info('%s: %s files not cached', self.namespace, len(missing))
+
+        pending = []
+        try:
+            for (fname, value) in mapper(WithFilename(fn), missing):
+                pending.append((fname, value))
+                if len(pending) >= commit_every:
+                    self.write(pending)
+                    pending = []
+                yield value
+        finally:
+            self.write(pending)
+
+    def total_bytes(self):
+        return self.connection.execute(
+            'select coalesce(sum(nbytes), 0) from memo').fetchone()[0]
+
+    def evict(self):
+        '''
+        Remove the least recently used results until the cache is smaller
+        than `max_bytes`
+        '''
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        rows = self.connection.execute(
+            'select namespace, path, nbytes from memo order by accessed')
+        to_remove = []
+        for (namespace, path, nbytes) in rows:
+            if excess <= 0:
+                break
+            to_remove.append((namespace, path))
+            excess -= nbytes
+
+        logger.info('Evicting %s cached results', len(to_remove))
+        self.connection.executemany(
+            'delete from memo where namespace = ? and path = ?', to_remove)
+
+    def close(self):
+        self.write()
+        self.connection.close()
+
+
+class NullMemo(object):
+    '''
+    Stand-in for `FileMemo` when no cache is configured
+    '''
+
+    def map(self, fn, fnames, mapper=map):
+        return list(mapper(fn, list(fnames)))
+
+    def imap(self, fn, fnames, mapper=None):
+        return (mapper or map)(fn, list(fnames))
+
+    def close(self):
+        pass
+
+
+def source_version(fname):
+    '''
+    Short hash of the source file `fname`, or of its `.py` if it is compiled
+    '''
+    if fname.endswith(('.pyc', '.pyo')):
+        fname = fname[:-1]
+    try:
+        return content_hash(fname)[:12]
+    except (IOError, OSError):
+        return 'unknown'
+
+
+def open_memo(namespace, path=None, max_bytes=None, hash_contents=False,
+              source=None):
+    '''
+    Open the per-file cache at `path`, defaulting to the `QA_CACHE`
+    environment variable. Returns a `NullMemo` if neither is set.
+
+    The results are stored under `namespace` plus a hash of `source`, which
+    defaults to the file of the calling module, so that changing the
+    extractor invalidates its cached results.
+    '''
+    path = path or os.environ.get(CACHE_ENV)
+    if not path:
+        return NullMemo()
+
+    if source is None:
+        source = sys._getframe(1).f_globals.get('__file__', '')
+    namespace = '{}.{}'.format(namespace, source_version(source))
+
+    if max_bytes is None:
+        max_bytes = int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_BYTES))
+    return FileMemo(path, namespace, max_bytes=max_bytes,
+                    hash_contents=hash_contents)
+
+
+def add_cache_arguments(parser):
+    '''
+    Add the per-file cache options to an extraction script's parser
+    '''
+    parser.add_argument('--cache', required=False,
+                        help='Per-file cache database [default: ${}]'.format(
+                            CACHE_ENV))
+    parser.add_argument('--cache-hash', action='store_true', default=False,
+                        help='Compare file contents rather than '
+                        'modification times against the cache')
@@ -1,18 +1,87 @@
+'''
+Columns of a csv or binary table as numpy arrays.
+
+The table is parsed column-wise: every column is converted to float in one
+numpy call, falling back to strings if any value is not numeric. The parsed
+columns are saved next to the csv file as `<file>.columns.npz`, and read from
+there instead of the csv while it is newer than the csv. Binary tables are
+read directly.
+'''
+
 import csv
+import os
 import numpy as np
 
+from .binary_table import MAGIC, parse_binary
 from .qa_logging import get_logger
 
 
 logger = get_logger(__file__)
 
+KEYS_ENTRY = '_keys'
+
+
+def parse_column(values, converter=None):
+    '''
+    Convert a sequence of strings to an array, using `converter` on every
+    value if given, otherwise to float if possible or strings if not
+    '''
+    if converter is not None:
+        return np.array([converter(value) for value in values])
+
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        return np.array(values)
+
+
+def read_columns(infile):
+    '''
+    Read a csv file into a list of keys and a dict of raw (float or string)
+    columns
+    '''
+    reader = csv.reader(infile)
+    try:
+        keys = next(reader)
+    except StopIteration:
+        return [], {}
+
+    rows = [row for row in reader if row]
+    if rows:
+        columns = zip(*rows)
+    else:
+        columns = [()] * len(keys)
+    return keys, dict((key, parse_column(column))
+                      for (key, column) in zip(keys, columns))
+
+
+def read_table(infile):
+    '''
+    Read a binary table (see `binary_table`) or csv file into a list of keys
+    and a dict of columns, and whether it was binary
+    '''
+    # A bytearray keeps the binary columns writable
+    content = bytearray(getattr(infile, 'buffer', infile).read())
+    if content.startswith(MAGIC):
+        records = parse_binary(content)
+        keys = list(records.dtype.names)
+        return keys, dict((key, records[key]) for key in keys), True
+
+    text = bytes(content)
+    if not isinstance(text, str):
+        text = text.decode('utf-8')
+    keys, columns = read_columns(text.splitlines())
+    return keys, columns, False
+
 
 class CSVContainer(object):
 
-    def __init__(self, infile, sort_key='mjd', key_type_map={}):
+    def __init__(self, infile, sort_key='mjd', key_type_map={},
+                 use_sidecar=True):
         self.infile = infile
         self.key_type_map = key_type_map
         self.sort_key = sort_key
+        self.use_sidecar = use_sidecar
         self.load_data()
         self.data = None
 
@@ -21,22 +90,76 @@ class CSVContainer(object):
         with open(filename) as infile:
             return cls(infile, *args, **kwargs)
 
+    @staticmethod
+    def sidecar_filename(filename):
+        return '{}.columns.npz'.format(filename)
+
     def load_data(self):
-        reader = csv.DictReader(self.infile)
-        self.data = [row for row in reader]
+        # Tables may have a column called fname, so use a local name
+        fname = getattr(self.infile, 'name', None)
+        is_file = fname is not None and os.path.isfile(fname)
+        columns = None
+        if self.use_sidecar and is_file:
+            columns = self.load_sidecar(fname)
+
+        if columns is None:
+            self.keys, columns, is_binary = read_table(self.infile)
+            if self.use_sidecar and is_file and not is_binary:
+                self.save_sidecar(fname, self.keys, columns)
+
+        for key in self.keys:
+            column = columns[key]
+            # Columns stored with a type in a binary table are not converted
+            converter = self.key_type_map.get(key)
+            if converter is not None and column.dtype.kind in 'SU':
+                column = parse_column(column, converter)
+            setattr(self, key, column)
 
         self.sort_data()
 
-        for key in self.data[0]:
-            converter = self.key_type_map.get(key, float)
-            setattr(self, key,
-                    np.array([converter(row[key]) for row in self.data]))
+    def load_sidecar(self, fname):
+        '''
+        Return the columns saved next to `fname`, or None if there are none
+        or they are older than the csv file
+        '''
+        sidecar = self.sidecar_filename(fname)
+        if not (os.path.isfile(sidecar) and
+                os.path.getmtime(sidecar) >= os.path.getmtime(fname)):
+            return None
 
-    def sort_data(self):
         try:
-            self.data.sort(key=lambda row: row[self.sort_key])
-        except KeyError as err:
+            with np.load(sidecar) as infile:
+                self.keys = [str(key) for key in infile[KEYS_ENTRY]]
+                return dict((key, infile[key]) for key in self.keys)
+        except Exception as err:
+            logger.warning('Cannot read columns from %s: %s', sidecar, err)
+            return None
+
+    def save_sidecar(self, fname, keys, columns):
+        sidecar = self.sidecar_filename(fname)
+        # Several jobs may read the same table, so write it atomically
+        tmp_filename = '{}.{}.tmp'.format(sidecar, os.getpid())
+        try:
+            with open(tmp_filename, 'wb') as outfile:
+                np.savez(outfile, **dict(columns, **{KEYS_ENTRY: keys}))
+            os.rename(tmp_filename, sidecar)
+        except (IOError, OSError) as err:
+            logger.debug('Cannot save columns to %s: %s', sidecar, err)
+
+    def sort_data(self):
+        if self.sort_key is None:
+            return
+        if self.sort_key not in self.keys:
             logger.warn('Cannot find key %s in data, no sorting', self.sort_key)
+            return
+        self.select(np.argsort(self[self.sort_key], kind='mergesort'))
+
+    def select(self, ind):
+        '''
+        Keep only the rows selected by the boolean or index array `ind`
+        '''
+        for key in self.keys:
+            self[key] = self[key][ind]
 
     @staticmethod
     def bool_converter(value):
@@ -51,4 +174,4 @@ class CSVContainer(object):
     def __str__(self):
         return '<{0} fname:{1}>'.format(
             self.__class__.__name__,
-            self.fname)
+            getattr(self.infile, 'name', None))
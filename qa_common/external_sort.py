@@ -0,0 +1,57 @@
+'''
+Sort a stream of rows without holding it all in memory.
+
+Rows are collected into runs of `run_size`, each run is sorted, and every
+run but the last is written to a temporary file. The runs are then merged
+lazily, so at most one run and one row of each spilled run are in memory
+at once.
+'''
+
+import heapq
+import itertools
+import pickle
+import tempfile
+
+RUN_SIZE = 100000
+
+
+def read_run(spill):
+    spill.seek(0)
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+
+def write_run(run, tmpdir=None):
+    spill = tempfile.TemporaryFile(dir=tmpdir)
+    for item in run:
+        pickle.dump(item, spill, protocol=pickle.HIGHEST_PROTOCOL)
+    return spill
+
+
+def sorted_rows(rows, key, run_size=RUN_SIZE, tmpdir=None):
+    '''
+    Generator of `rows` sorted by `key`. Rows with equal keys keep their
+    order.
+    '''
+    # Rows are decorated with their position, so rows themselves are never
+    # compared
+    decorated = ((key(row), i, row) for (i, row) in enumerate(rows))
+    spills = []
+    try:
+        run = sorted(itertools.islice(decorated, run_size))
+        while True:
+            following = sorted(itertools.islice(decorated, run_size))
+            if not following:
+                break
+            spills.append(write_run(run, tmpdir))
+            run = following
+
+        for (_, _, row) in heapq.merge(run, *[read_run(spill)
+                                              for spill in spills]):
+            yield row
+    finally:
+        for spill in spills:
+            spill.close()
@@ -1,10 +1,7 @@
-import numpy as np
+from .nights import NightIndex
 
 def find_night_breaks(mjd, gap_size):
-    mjd_a = np.array(mjd)
-    frames = np.arange(mjd_a.size)
-    ind = np.diff(mjd_a) > gap_size
-    return frames[ind]
+    return NightIndex(mjd, gap_size=gap_size).breaks
 
 def plot_night_breaks(ax, mjd, gap_size=0.3, ls='--', color='k'):
     breaks = find_night_breaks(mjd, gap_size)
@@ -0,0 +1,180 @@
+'''
+Index of the FITS headers of a pipeline run in a sqlite database, so the
+extraction scripts can look up header cards without opening the files.
+
+Every hdu header of each file is stored as json, keyed on the file path and
+hdu number, with the size and modification time of the file. `update` only
+reads files which are new or have changed since they were indexed.
+
+`read_header` returns the indexed header of a file while the index is up to
+date for it, and otherwise reads the file, so the index only ever makes
+reads cheaper: extraction scripts work the same without one.
+'''
+
+import fnmatch
+import json
+import os
+import sqlite3
+import threading
+
+import fitsio
+
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+INDEX_ENV = 'QA_HEADER_INDEX'
+
+# (directory relative to the run directory, file pattern) of indexed files
+INDEXED_FILES = [
+    (os.path.join('OriginalData', 'images'), 'IMAGE*.fits*'),
+    (os.path.join('Reduction', 'output'), 'proc*.fits'),
+    (os.path.join('Reduction', 'output'), 'proc*.phot'),
+]
+
+# Cards without values
+SKIP_CARDS = set(['COMMENT', 'HISTORY', ''])
+
+
+class Header(dict):
+    '''
+    Header cards, looked up ignoring case as in `fitsio.FITSHDR`
+    '''
+
+    def __init__(self, cards=()):
+        super(Header, self).__init__(
+            (key.upper(), value) for (key, value) in dict(cards).items())
+
+    def __getitem__(self, key):
+        return super(Header, self).__getitem__(key.upper())
+
+    def __contains__(self, key):
+        return super(Header, self).__contains__(key.upper())
+
+    def get(self, key, default=None):
+        return super(Header, self).get(key.upper(), default)
+
+
+def find_indexed_files(rootdir):
+    '''
+    Files of the run in `rootdir` which are indexed, sorted
+    '''
+    found = set()
+    for (directory, pattern) in INDEXED_FILES:
+        for (dirpath, _, filenames) in os.walk(
+                os.path.join(rootdir, directory), followlinks=True):
+            found.update(os.path.join(dirpath, filename)
+                         for filename in fnmatch.filter(filenames, pattern))
+    return sorted(found)
+
+
+def file_state(fname):
+    stat = os.stat(fname)
+    return stat.st_size, stat.st_mtime
+
+
+def read_headers(fname):
+    '''
+    List of the headers of every hdu of `fname`
+    '''
+    with fitsio.FITS(fname) as infile:
+        return [Header((key, hdu_header[key]) for key in hdu_header.keys()
+                       if key not in SKIP_CARDS)
+                for hdu_header in (hdu.read_header() for hdu in infile)]
+
+
+def read_file(fname):
+    '''
+    (path, size, mtime, headers) of `fname`, for `HeaderIndex.update`
+    '''
+    path = os.path.realpath(fname)
+    size, mtime = file_state(path)
+    return path, size, mtime, read_headers(path)
+
+
+class HeaderIndex(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('''create table if not exists headers (
+            path text, hdu integer, size integer, mtime real, cards text,
+            primary key (path, hdu))''')
+        self.connection.commit()
+
+    def lookup(self, fname, hdu=0):
+        '''
+        Indexed header of `hdu` of `fname`, or None if it is not indexed or
+        the file has changed since
+        '''
+        path = os.path.realpath(fname)
+        row = self.connection.execute(
+            'select size, mtime, cards from headers where path = ? and hdu = ?',
+            (path, hdu)).fetchone()
+        if row is None or tuple(row[:2]) != file_state(path):
+            return None
+        return Header(json.loads(row[2]))
+
+    def indexed_state(self):
+        return dict((path, (size, mtime)) for (path, size, mtime) in
+                    self.connection.execute(
+                        'select path, size, mtime from headers where hdu = 0'))
+
+    def update(self, fnames, mapper=map):
+        '''
+        Index the headers of those `fnames` which are new or changed,
+        reading them with `mapper`, and remove files which no longer exist.
+        Returns the number of files read.
+        '''
+        indexed = self.indexed_state()
+        paths = [os.path.realpath(fname) for fname in fnames]
+        stale = [path for path in paths
+                 if indexed.get(path) != file_state(path)]
+        logger.info('%s of %s files already indexed', len(paths) - len(stale),
+                    len(paths))
+
+        for (path, size, mtime, headers) in mapper(read_file, stale):
+            self.connection.execute('delete from headers where path = ?',
+                                    (path,))
+            self.connection.executemany(
+                'insert into headers values (?, ?, ?, ?, ?)',
+                [(path, hdu, size, mtime, json.dumps(header, default=str))
+                 for (hdu, header) in enumerate(headers)])
+
+        missing = [(path,) for path in indexed if not os.path.exists(path)]
+        if missing:
+            logger.info('Removing %s deleted files', len(missing))
+            self.connection.executemany('delete from headers where path = ?',
+                                        missing)
+        self.connection.commit()
+        return len(stale)
+
+    def read_header(self, fname, hdu=0):
+        header = self.lookup(fname, hdu)
+        if header is None:
+            return fitsio.read_header(fname, hdu)
+        return header
+
+    def close(self):
+        self.connection.close()
+
+
+# Indexes opened by `read_header`, per process and thread, as sqlite
+# connections must not be shared with forked workers or other threads
+_indexes = {}
+
+
+def read_header(fname, hdu=0, path=None):
+    '''
+    Header of `hdu` of `fname`, from the index at `path` (default
+    `$QA_HEADER_INDEX`) if it is up to date for the file, otherwise read
+    from the file
+    '''
+    path = path or os.environ.get(INDEX_ENV)
+    if not path or not os.path.isfile(path):
+        return fitsio.read_header(fname, hdu)
+
+    key = (os.getpid(), threading.current_thread().ident, path)
+    if key not in _indexes:
+        _indexes[key] = HeaderIndex(path)
+    return _indexes[key].read_header(fname, hdu)
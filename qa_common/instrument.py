@@ -0,0 +1,213 @@
+'''
+Timing, memory and I/O instrumentation for the QA scripts.
+
+`stage` measures a block of code and `instrumented` measures a script's
+`main`. Each measurement records
+
+* `wall`, `cpu`: wall clock and cpu (user + system) seconds
+* `children_cpu`: cpu seconds of child processes which finished during the
+    stage, e.g. a closed `multiprocessing.Pool`
+* `peak_rss_mb`: peak resident memory of the process so far
+* `bytes_read`, `disk_bytes_read`: bytes returned by read calls and bytes
+    fetched from storage, from `/proc/self/io`. Reads in child processes
+    are not counted. `None` where `/proc` is unavailable
+
+If `TIMING_ENV` is set, each measurement is appended as a json line to the
+file it names, so every script of a QA run writes to the same file. If
+`PROFILE_ENV` is set, the outermost instrumented `main` is run under
+cProfile and the statistics are dumped to
+`<PROFILE_ENV>/<script>.<pid>.prof`.
+'''
+
+import functools
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+TIMING_ENV = 'QA_TIMING_FILE'
+PROFILE_ENV = 'QA_PROFILE_DIR'
+RUN_ENV = 'QA_RUN_ID'
+PROC_IO = '/proc/self/io'
+
+# Nesting depth of the stages currently running
+_depth = [0]
+
+
+def io_counters():
+    '''
+    (bytes returned by read calls, bytes read from storage) of this
+    process, or (None, None)
+    '''
+    try:
+        with open(PROC_IO) as infile:
+            counters = dict(line.split(':') for line in infile if ':' in line)
+        return int(counters['rchar']), int(counters['read_bytes'])
+    except (IOError, OSError, KeyError, ValueError):
+        return None, None
+
+
+def peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, OS X bytes
+    if sys.platform == 'darwin':
+        return maxrss / 1024. ** 2
+    return maxrss / 1024.
+
+
+class Usage(object):
+    '''
+    Snapshot of the resources used by this process so far
+    '''
+
+    def __init__(self):
+        self.time = time.time()
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cpu = own.ru_utime + own.ru_stime
+        self.children_cpu = children.ru_utime + children.ru_stime
+        self.bytes_read, self.disk_bytes_read = io_counters()
+
+    def since(self, start):
+        '''
+        Resources used between the `start` snapshot and this one
+        '''
+        def difference(name):
+            end_value, start_value = getattr(self, name), getattr(start, name)
+            if end_value is None or start_value is None:
+                return None
+            return end_value - start_value
+
+        return {
+            'start': start.time,
+            'wall': self.time - start.time,
+            'cpu': self.cpu - start.cpu,
+            'children_cpu': self.children_cpu - start.children_cpu,
+            'peak_rss_mb': peak_rss_mb(),
+            'bytes_read': difference('bytes_read'),
+            'disk_bytes_read': difference('disk_bytes_read'),
+        }
+
+
+def script_name(path=None):
+    return os.path.basename(path or sys.argv[0] or 'python')
+
+
+def write_record(record, fname=None):
+    '''
+    Append `record` to the timing file as one json line. The line is
+    written with a single call to an `O_APPEND` file, so concurrent scripts
+    do not interleave their lines.
+    '''
+    fname = fname or os.environ.get(TIMING_ENV)
+    if not fname:
+        return
+    try:
+        directory = os.path.dirname(fname)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd = os.open(fname, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record, sort_keys=True) + '\n').encode(
+                'utf-8'))
+        finally:
+            os.close(fd)
+    except (IOError, OSError) as err:
+        logger.warning('Cannot write timing record to %s: %s', fname, err)
+
+
+@contextmanager
+def stage(name, script=None):
+    '''
+    Measure the enclosed block as stage `name` of `script` (by default the
+    running script), logging and recording the result. Yields the record,
+    which is filled in when the block exits.
+    '''
+    record = {'script': script_name(script), 'stage': name,
+              'depth': _depth[0], 'pid': os.getpid(),
+              'run': os.environ.get(RUN_ENV),
+              'argv': [script_name(sys.argv[0])] + sys.argv[1:]}
+    start = Usage()
+    status = 'failed'
+    _depth[0] += 1
+    try:
+        yield record
+        status = 'ok'
+    except SystemExit as err:
+        status = 'ok' if not err.code else 'failed'
+        raise
+    finally:
+        _depth[0] -= 1
+        record.update(Usage().since(start), status=status)
+        logger.info('%s %s: %.2f s wall, %.2f s cpu, %.0f MB peak rss',
+                    record['script'], name, record['wall'], record['cpu'],
+                    record['peak_rss_mb'])
+        write_record(record)
+
+
+@contextmanager
+def profiled(script):
+    '''
+    Run the enclosed block under cProfile if `PROFILE_ENV` is set
+    '''
+    directory = os.environ.get(PROFILE_ENV)
+    if not directory:
+        yield
+        return
+
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fname = os.path.join(directory, '{}.{}.prof'.format(
+            os.path.splitext(script)[0], os.getpid()))
+        profile.dump_stats(fname)
+        logger.info('Profile written to %s', fname)
+
+
+def instrumented(main):
+    '''
+    Decorate a script's `main`, measuring it as stage `main` of the script
+    it is defined in. Only the outermost instrumented call is profiled, so
+    scripts calling other scripts' `main` produce a single profile.
+    '''
+    script = script_name(main.__globals__.get('__file__'))
+
+    @functools.wraps(main)
+    def wrapper(*args, **kwargs):
+        if _depth[0]:
+            with stage('main', script=script):
+                return main(*args, **kwargs)
+        with profiled(script), stage('main', script=script):
+            return main(*args, **kwargs)
+
+    return wrapper
+
+
+def read_timings(fname, run=None):
+    '''
+    Records in the timing file `fname`, optionally only those of `run`.
+    Lines which cannot be parsed, e.g. from a script killed while writing,
+    are skipped.
+    '''
+    records = []
+    with open(fname) as infile:
+        for line in infile:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if run is None or record.get('run') == run:
+                records.append(record)
+    return records
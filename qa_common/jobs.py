@@ -0,0 +1,275 @@
+'''
+Dependency-aware parallel job runner.
+
+Each `Job` runs one command and declares the files it reads and writes, and
+the jobs it depends on. `JobGraph.run` starts every job whose dependencies
+have finished, running up to `nworkers` at once.
+
+A job with a `stamp` file records a digest of its command and inputs there
+when it succeeds, and is skipped next time if its outputs exist and the
+digest has not changed. The check happens when the job becomes ready, so a
+dependency which rewrites its outputs with identical contents does not
+cause a job hashing its inputs to rerun.
+'''
+
+import os
+import signal
+import subprocess as sp
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from .cache import inputs_digest
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+
+class Job(object):
+    '''
+    A single command to run.
+
+    * `command`: argument list, run without a shell
+    * `inputs`: files the command reads
+    * `outputs`: files the command writes. Jobs without outputs always run
+    * `depends_on`: names of jobs which must finish first
+    * `require_success`: skip this job if any dependency failed
+    * `timeout`: seconds before the command is killed, or `None`
+    * `stdout`: optional filename to redirect the standard output to
+    * `stamp`: file recording the digest of the inputs of the last
+        successful run. Without a stamp the job is skipped if its outputs
+        exist
+    * `hash_inputs`: include the input file contents in the digest, rather
+        than just their sizes and modification times
+    * `launcher`: arguments put before the command when running it, e.g. to
+        run it in a persistent worker. They are not part of the digest
+    '''
+
+    def __init__(self, name, command, inputs=(), outputs=(), depends_on=(),
+                 require_success=True, timeout=None, stdout=None, stamp=None,
+                 hash_inputs=False, launcher=()):
+        self.name = name
+        self.command = [str(arg) for arg in command]
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends_on = list(depends_on)
+        self.require_success = require_success
+        self.timeout = timeout
+        self.stdout = stdout
+        self.stamp = stamp
+        self.hash_inputs = hash_inputs
+        self.launcher = [str(arg) for arg in launcher]
+
+    def digest(self):
+        return inputs_digest(self.inputs, extra=self.command,
+                             hash_contents=self.hash_inputs)
+
+    def is_up_to_date(self):
+        if not self.outputs or not all(os.path.exists(fname)
+                                       for fname in self.outputs):
+            return False
+        if self.stamp is None:
+            return True
+        if not os.path.exists(self.stamp):
+            return False
+        with open(self.stamp) as infile:
+            return infile.read().strip() == self.digest()
+
+    def record(self):
+        '''
+        Write the input digest to the stamp file after a successful run
+        '''
+        if self.stamp is None:
+            return
+        stamp_dir = os.path.dirname(self.stamp)
+        if stamp_dir and not os.path.isdir(stamp_dir):
+            os.makedirs(stamp_dir)
+        with open(self.stamp, 'w') as outfile:
+            outfile.write(self.digest() + '\n')
+
+    def run(self):
+        '''
+        Run the command, returning its exit code
+        '''
+        # A failed run must not leave the previous stamp in place
+        if self.stamp is not None and os.path.exists(self.stamp):
+            os.remove(self.stamp)
+
+        logger.debug('Running %s: %s', self.name, ' '.join(self.command))
+        stdout = open(self.stdout, 'w') if self.stdout is not None else None
+        try:
+            # Run in a new session so a timeout kills the whole process group
+            process = sp.Popen(self.launcher + self.command, stdout=stdout,
+                               preexec_fn=os.setsid)
+            return wait_with_timeout(process, self.timeout)
+        finally:
+            if stdout is not None:
+                stdout.close()
+
+    def __str__(self):
+        return '<Job {}>'.format(self.name)
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def wait_with_timeout(process, timeout, poll_interval=0.1):
+    if timeout is None:
+        return process.wait()
+
+    deadline = time.time() + timeout
+    while process.poll() is None:
+        if time.time() > deadline:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            raise JobTimeout('Timed out after {} seconds'.format(timeout))
+        time.sleep(poll_interval)
+    return process.returncode
+
+
+class JobResult(object):
+    SUCCESS, FAILED, SKIPPED, UP_TO_DATE = (
+        'success', 'failed', 'skipped', 'up to date')
+
+    def __init__(self, job, status, duration=0., message=''):
+        self.job = job
+        self.status = status
+        self.duration = duration
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.status in (self.SUCCESS, self.UP_TO_DATE)
+
+
+class JobGraph(object):
+
+    def __init__(self, jobs=()):
+        self.jobs = []
+        self.by_name = {}
+        for job in jobs:
+            self.add(job)
+
+    def add(self, job):
+        if job.name in self.by_name:
+            raise ValueError('Duplicate job name {}'.format(job.name))
+        self.jobs.append(job)
+        self.by_name[job.name] = job
+        return job
+
+    def validate(self):
+        '''
+        Check every dependency exists and there are no cycles
+        '''
+        for job in self.jobs:
+            for name in job.depends_on:
+                if name not in self.by_name:
+                    raise ValueError('Job {} depends on unknown job {}'.format(
+                        job.name, name))
+        self.topological_order()
+
+    def topological_order(self):
+        order, visiting, visited = [], set(), set()
+
+        def visit(job):
+            if job.name in visited:
+                return
+            if job.name in visiting:
+                raise ValueError('Dependency cycle through {}'.format(job.name))
+            visiting.add(job.name)
+            for name in job.depends_on:
+                visit(self.by_name[name])
+            visiting.remove(job.name)
+            visited.add(job.name)
+            order.append(job)
+
+        for job in self.jobs:
+            visit(job)
+        return order
+
+    def run(self, nworkers=1, force=False):
+        '''
+        Run every job, returning a dictionary of job name => `JobResult`.
+
+        Failed jobs cause their dependents to be skipped, but do not stop
+        unrelated jobs.
+        '''
+        self.validate()
+        results = {}
+        finished = threading.Condition()
+        running = set()
+        pool = ThreadPool(nworkers)
+
+        def on_complete(result):
+            with finished:
+                running.discard(result.job.name)
+                results[result.job.name] = result
+                finished.notify()
+
+        try:
+            with finished:
+                while len(results) < len(self.jobs):
+                    for job in self.jobs:
+                        if job.name in results or job.name in running:
+                            continue
+
+                        deps = [results.get(name) for name in job.depends_on]
+                        if job.require_success and any(
+                                dep is not None and not dep.ok for dep in deps):
+                            logger.warning('Skipping %s: dependency failed',
+                                           job.name)
+                            results[job.name] = JobResult(
+                                job, JobResult.SKIPPED,
+                                message='dependency failed')
+                        elif all(dep is not None for dep in deps):
+                            running.add(job.name)
+                            pool.apply_async(run_job, (job, force),
+                                             callback=on_complete)
+
+                    if len(results) < len(self.jobs) and running:
+                        finished.wait(1.)
+        finally:
+            pool.close()
+            pool.join()
+
+        return results
+
+
+def run_job(job, force=False):
+    '''
+    Run a job unless it is up to date, converting any error into a failed
+    `JobResult`
+    '''
+    try:
+        if not force and job.is_up_to_date():
+            logger.info('Job %s is up to date, skipping', job.name)
+            return JobResult(job, JobResult.UP_TO_DATE)
+    except Exception as err:
+        logger.warning('Cannot check whether %s is up to date: %s',
+                       job.name, err)
+
+    logger.info('Starting %s', job.name)
+    start = time.time()
+    try:
+        returncode = job.run()
+    except Exception as err:
+        status, message = JobResult.FAILED, str(err)
+    else:
+        if returncode == 0:
+            status, message = JobResult.SUCCESS, ''
+            try:
+                job.record()
+            except Exception as err:
+                logger.warning('Cannot record stamp for %s: %s', job.name, err)
+        else:
+            status, message = (JobResult.FAILED,
+                               'exit code {}'.format(returncode))
+
+    duration = time.time() - start
+    if status == JobResult.SUCCESS:
+        logger.info('Finished %s in %.1f seconds', job.name, duration)
+    else:
+        logger.error('Job %s failed after %.1f seconds: %s', job.name,
+                     duration, message)
+    return JobResult(job, status, duration, message)
@@ -0,0 +1,128 @@
+'''
+Night boundaries of a time series.
+
+A new night starts wherever consecutive times are more than `gap_size` days
+apart. `NightIndex` stores the first frame of each night, so tools can take
+the frames of a night as a slice, and can be saved next to a photometry file
+so the boundaries are only found once.
+'''
+
+import os
+import numpy as np
+
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+DEFAULT_GAP_SIZE = 0.3
+
+
+class NightIndex(object):
+
+    def __init__(self, mjd, gap_size=DEFAULT_GAP_SIZE):
+        mjd = np.asarray(mjd, dtype=float)
+        self.gap_size = gap_size
+        self.nframes = mjd.size
+        self.starts = np.concatenate(
+            [[0], np.flatnonzero(np.diff(mjd) > gap_size) + 1]).astype(int)
+        self.start_times = mjd[self.starts] if mjd.size else np.array([])
+
+    @classmethod
+    def from_starts(cls, starts, start_times, nframes, gap_size):
+        self = cls.__new__(cls)
+        self.starts = np.asarray(starts, dtype=int)
+        self.start_times = np.asarray(start_times, dtype=float)
+        self.nframes = int(nframes)
+        self.gap_size = float(gap_size)
+        return self
+
+    @property
+    def stops(self):
+        return np.concatenate([self.starts[1:], [self.nframes]])
+
+    @property
+    def breaks(self):
+        '''
+        Index of the last frame before each gap, as returned by
+        `find_night_breaks`
+        '''
+        return self.starts[1:] - 1
+
+    def __len__(self):
+        return self.starts.size if self.nframes else 0
+
+    def slices(self):
+        return [slice(start, stop)
+                for (start, stop) in zip(self.starts, self.stops)]
+
+    def __iter__(self):
+        return iter(self.slices())
+
+    def night_of(self, mjd):
+        '''
+        Night number of each time in `mjd`
+        '''
+        return np.searchsorted(self.start_times, mjd, side='right') - 1
+
+    def frame_mask(self, nights=None):
+        '''
+        Boolean mask of the frames in the chosen nights, or all nights
+        '''
+        mask = np.zeros(self.nframes, dtype=bool)
+        nights = range(len(self)) if nights is None else nights
+        for night in np.atleast_1d(nights):
+            mask[self.starts[night]:self.stops[night]] = True
+        return mask
+
+    def save(self, filename):
+        with open(filename, 'wb') as outfile:
+            np.savez(outfile, starts=self.starts,
+                     start_times=self.start_times, nframes=self.nframes,
+                     gap_size=self.gap_size)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as infile:
+            return cls.from_starts(infile['starts'], infile['start_times'],
+                                   infile['nframes'], infile['gap_size'])
+
+    @staticmethod
+    def sidecar_filename(filename, gap_size):
+        return '{}.nights-{}.npz'.format(filename, gap_size)
+
+    @classmethod
+    def for_file(cls, filename, gap_size=DEFAULT_GAP_SIZE, mjd=None):
+        '''
+        Night index for the frames of a photometry file, loaded from the
+        file saved next to it if that is newer than the data and, when
+        `mjd` is given, has as many frames. Otherwise it is built from the
+        imagelist times (or `mjd`) and saved.
+        '''
+        sidecar = cls.sidecar_filename(filename, gap_size)
+        if (os.path.isfile(sidecar) and
+                os.path.getmtime(sidecar) >= os.path.getmtime(filename)):
+            try:
+                index = cls.load(sidecar)
+            except Exception as err:
+                logger.warning('Cannot read night index %s: %s', sidecar, err)
+            else:
+                if mjd is None or index.nframes == len(mjd):
+                    return index
+                logger.info('Night index %s has %s frames, not %s; '
+                            'rebuilding', sidecar, index.nframes, len(mjd))
+
+        if mjd is None:
+            # Imported here so qa_common does not require fitsio
+            from .photometry_file import PhotometryFile
+            with PhotometryFile.open(filename) as infile:
+                mjd = infile.column('imagelist', 'tmid')
+
+        index = cls(mjd, gap_size=gap_size)
+        # Other jobs may read the same file, so write it atomically
+        tmp_filename = '{}.{}.tmp'.format(sidecar, os.getpid())
+        try:
+            index.save(tmp_filename)
+            os.rename(tmp_filename, sidecar)
+        except (IOError, OSError) as err:
+            logger.debug('Cannot save night index %s: %s', sidecar, err)
+        return index
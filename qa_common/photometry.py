@@ -14,3 +14,45 @@ def build_bins():
 
     return ledges, redges
 
+
+def assign_bins(values, ledges, redges):
+    '''
+    Index of the bin [ledge, redge) holding each of `values`, or -1 for
+    values outside every bin. `ledges` must be increasing and the bins must
+    not overlap.
+    '''
+    values = np.asarray(values)
+    redges = np.asarray(redges)
+    index = np.digitize(values, ledges) - 1
+    with np.errstate(invalid='ignore'):
+        inside = (index >= 0) & (values < redges[np.maximum(index, 0)])
+    return np.where(inside, index, -1)
+
+
+def binned_lightcurves(flux, weights, bins, nbins):
+    '''
+    Weighted mean lightcurve (nbins, nframes) of the stars of `flux`
+    (nstars, nframes) in each bin, from their bin indexes `bins` (see
+    `assign_bins`).
+
+    The sums over the stars of every bin are taken at once, as products with
+    the (nbins, nstars) membership matrix of the stars in any bin, so stars
+    in no bin (such as bad apertures with infinite weights) cannot reach the
+    sums. Frames where the weights of a bin sum to zero get the unweighted
+    mean, and bins without stars are nan.
+    '''
+    bins = np.asarray(bins)
+    keep = bins >= 0
+    flux = np.asarray(flux, dtype=float)[keep]
+    weights = np.broadcast_to(weights, keep.shape + flux.shape[1:])[keep]
+    members = (bins[keep] == np.arange(nbins)[:, np.newaxis]).astype(float)
+
+    total = members.dot(weights)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lightcurves = members.dot(weights * flux) / total
+        unweighted = total == 0
+        if unweighted.any():
+            counts = members.sum(axis=1)[:, np.newaxis]
+            means = members.dot(flux) / counts
+            lightcurves[unweighted] = means[unweighted]
+    return lightcurves
@@ -0,0 +1,152 @@
+import fitsio
+
+from .aperture_stats import chunk_memory
+from .qa_logging import get_logger
+
+logger = get_logger(__file__)
+
+# Bytes per value assumed when checking whether a whole hdu fits in memory
+FULL_READ_ITEMSIZE = 8
+
+
+class PhotometryFile(object):
+    '''
+    Read-once access to an AperturePhot `output.fits` file.
+
+    Every HDU or table column is read from disk at most once and kept in
+    memory, so several plots can share the same arrays. The returned arrays
+    are read-only: callers must not modify them in place.
+
+    Scripts should use `PhotometryFile.open(filename)`. When a driver has
+    registered a shared instance for the same file (see `shared`) that
+    instance is returned, otherwise a new, private instance is built.
+    '''
+
+    _shared = {}
+
+    def __init__(self, filename, hdus=None):
+        self.filename = filename
+        self.is_shared = False
+        self._fits = None
+        self._cache = {}
+
+        for hdu in (hdus or []):
+            self.read(hdu)
+
+    @classmethod
+    def open(cls, filename):
+        return cls._shared.get(filename) or cls(filename)
+
+    @classmethod
+    def shared(cls, filename, hdus=None):
+        '''
+        Build an instance which is returned by `open` until it is closed
+        '''
+        self = cls(filename, hdus=hdus)
+        self.is_shared = True
+        cls._shared[filename] = self
+        return self
+
+    @property
+    def fits(self):
+        if self._fits is None:
+            self._fits = fitsio.FITS(self.filename)
+        return self._fits
+
+    def _cached(self, key, reader):
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = reader()
+            value.setflags(write=False)
+            self._cache[key] = value
+            return value
+
+    def read(self, hdu):
+        '''
+        Read a whole image hdu, e.g. `flux` or `ccdx`
+        '''
+        def reader():
+            logger.info('Reading hdu %s from %s', hdu, self.filename)
+            return self.fits[hdu].read()
+        return self._cached((hdu, None), reader)
+
+    def column(self, hdu, column):
+        '''
+        Read a single column from a table hdu, e.g. `imagelist`/`tmid`
+        '''
+        return self._cached((hdu, column.lower()),
+                            lambda: self.fits[hdu][column].read())
+
+    def first_column(self, hdu):
+        '''
+        Read the first column of an image hdu, e.g. the initial `ccdx` value
+        for each aperture. The full image is only read if it is cached
+        already.
+        '''
+        if (hdu, None) in self._cache:
+            return self._cache[(hdu, None)][:, 0]
+        return self._cached((hdu, 0),
+                            lambda: self.fits[hdu][:, :1].flatten())
+
+    def shape(self, hdu):
+        '''
+        (apertures, frames) shape of an image hdu, without reading it
+        '''
+        if (hdu, None) in self._cache:
+            return self._cache[(hdu, None)].shape
+        return tuple(self.fits[hdu].get_dims())
+
+    def iter_rows(self, hdu, chunk_rows):
+        '''
+        Iterate over an image hdu in blocks of at most `chunk_rows`
+        apertures, yielding (row slice, block). Blocks are sliced from the
+        cached array if the hdu has been read already. A shared instance
+        reads and caches the whole hdu first if it fits in the chunk memory
+        budget (see `aperture_stats.chunk_memory`), as the other plots of
+        its driver read it too. Otherwise each block is read from disk and
+        not cached.
+        '''
+        nrows, nframes = self.shape(hdu)
+        cached = self._cache.get((hdu, None))
+        if (cached is None and self.is_shared and
+                nrows * nframes * FULL_READ_ITEMSIZE <= chunk_memory()):
+            cached = self.read(hdu)
+        if cached is None:
+            logger.info('Reading hdu %s from %s in blocks of %s rows',
+                        hdu, self.filename, chunk_rows)
+
+        for start in range(0, nrows, chunk_rows):
+            rows = slice(start, min(start + chunk_rows, nrows))
+            if cached is not None:
+                yield rows, cached[rows]
+            else:
+                yield rows, self.fits[hdu][rows, :]
+
+    def evict(self, hdu):
+        '''
+        Drop every cached array read from `hdu`
+        '''
+        for key in [key for key in self._cache if key[0] == hdu]:
+            del self._cache[key]
+
+    def close(self):
+        if self._fits is not None:
+            self._fits.close()
+            self._fits = None
+        self._cache = {}
+        if self._shared.get(self.filename) is self:
+            del self._shared[self.filename]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # Shared instances are owned by whoever created them
+        if not self.is_shared:
+            self.close()
+
+    def __str__(self):
+        return '<{0} fname:{1}>'.format(
+            self.__class__.__name__,
+            self.filename)
@@ -1,11 +1,38 @@
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+'''
+Plotting helpers.
+
+`plt` stands in for `matplotlib.pyplot`, which is only imported (with the
+Agg backend and the QA style) the first time it is used, so scripts which
+import it but do not plot on every code path do not pay for the import.
+'''
+
 from contextlib import contextmanager
+import numpy as np
+
+
+def load_pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as pyplot
+
+    matplotlib.rc('patch', edgecolor='None')
+    matplotlib.rc('image', cmap='afmhot')
+    matplotlib.rc('figure', figsize=(11, 8))
+    return pyplot
+
+
+class LazyPyplot(object):
+
+    def __init__(self):
+        self._pyplot = None
 
-matplotlib.rc('patch', edgecolor='None')
-matplotlib.rc('image', cmap='afmhot')
-matplotlib.rc('figure', figsize=(11, 8))
+    def __getattr__(self, name):
+        if self._pyplot is None:
+            self._pyplot = load_pyplot()
+        return getattr(self._pyplot, name)
+
+
+plt = LazyPyplot()
 
 
 def compute_limits(data, nsigma=3, precomputed_median=None):
@@ -41,3 +68,107 @@ def subplots(*args, **kwargs):
             ax.set_ylabel(label)
 
     fig.tight_layout()
+
+
+# Above this many points `density_scatter` draws a density image
+DENSITY_THRESHOLD = 10000
+
+
+def density_colourmap(colour, min_alpha=0.25):
+    '''
+    Colour map from a faint to a solid `colour`
+    '''
+    from matplotlib.colors import LinearSegmentedColormap, to_rgba
+    red, green, blue, _ = to_rgba(colour)
+    return LinearSegmentedColormap.from_list(
+        'density', [(red, green, blue, min_alpha), (red, green, blue, 1.)])
+
+
+def density_scatter(ax, x, y, color='k', label=None, marker='.',
+                    markersize=None, alpha=1., max_points=DENSITY_THRESHOLD,
+                    bin_pixels=2, min_count=3):
+    '''
+    Scatter plot of `y` against `x` which stays fast for many points.
+
+    Up to `max_points` points are plotted as markers. Above that the points
+    are counted in square bins of `bin_pixels` screen pixels, and the bins
+    holding at least `min_count` points are drawn as a single image shaded
+    by the log of the count. Points in sparser bins, the outliers, are still
+    drawn as markers.
+
+    The bins are laid out on the axes, so any axis scale works, but the axis
+    limits must not change afterwards: set them (and the scales) before
+    calling, otherwise they are fitted to the data and then fixed.
+
+    Returns the image (or None) and the line of markers, which carries the
+    legend label.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    style = dict(ls='None', marker=marker, color=color, alpha=alpha,
+                 label=label)
+    if markersize is not None:
+        style['markersize'] = markersize
+
+    valid = np.isfinite(x) & np.isfinite(y)
+    if ax.get_xscale() == 'log':
+        valid &= x > 0
+    if ax.get_yscale() == 'log':
+        valid &= y > 0
+    x, y = x[valid], y[valid]
+
+    if x.size <= max_points:
+        return None, ax.plot(x, y, **style)[0]
+
+    if ax.get_autoscalex_on() or ax.get_autoscaley_on():
+        ax.update_datalim(np.column_stack([x, y]))
+        ax.autoscale_view()
+    ax.set_xlim(ax.get_xlim())
+    ax.set_ylim(ax.get_ylim())
+
+    # Position of each point as a fraction of the axes
+    position = ax.transAxes.inverted().transform(
+        ax.transData.transform(np.column_stack([x, y])))
+    extent = ax.get_window_extent()
+    nx = max(int(extent.width / bin_pixels), 1)
+    ny = max(int(extent.height / bin_pixels), 1)
+    ix = np.floor(position[:, 0] * nx).astype(int)
+    iy = np.floor(position[:, 1] * ny).astype(int)
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+    index = (iy * nx + ix)[inside]
+    counts = np.bincount(index, minlength=nx * ny)
+    dense = counts >= min_count
+    if not dense.any():
+        return None, ax.plot(x, y, **style)[0]
+
+    image = np.full(nx * ny, np.nan)
+    image[dense] = np.log10(counts[dense])
+    vmin = np.log10(min_count)
+    mesh = ax.imshow(np.ma.masked_invalid(image.reshape(ny, nx)),
+                     origin='lower', extent=(0, 1, 0, 1),
+                     transform=ax.transAxes, aspect='auto',
+                     interpolation='nearest', cmap=density_colourmap(color),
+                     vmin=vmin, vmax=max(image[dense].max(), vmin + 1e-3))
+
+    outliers = ~dense[index]
+    line = ax.plot(x[inside][outliers], y[inside][outliers], **style)[0]
+    return mesh, line
+
+
+def interleaved_scatter(ax, series, markersize=3., marker='.', **kwargs):
+    '''
+    Plot several series of points, given as (x, y, colour), with a single
+    scatter call. The points are drawn in a random order so no series hides
+    another.
+    '''
+    from matplotlib.colors import to_rgba
+    x = np.concatenate([np.asarray(xs, dtype=float) for (xs, _, _) in series])
+    y = np.concatenate([np.asarray(ys, dtype=float) for (_, ys, _) in series])
+    colours = np.concatenate([np.tile(to_rgba(colour), (len(xs), 1))
+                              for (xs, _, colour) in series])
+
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    order = valid[np.random.permutation(valid.size)]
+    return ax.scatter(x[order], y[order], c=colours[order], marker=marker,
+                      s=markersize ** 2, edgecolors='none', **kwargs)
@@ -0,0 +1,169 @@
+'''
+Vectorised pixel to sky transformation for the zenithal projections of the
+reduced frames, evaluated for many frames at once.
+
+The WCS of every frame is held as arrays (CRPIX, CRVAL, CD matrix and the
+`PV2_m` polynomial coefficients), so one call evaluates any number of
+pixels on any number of frames, rather than building an astropy `WCS` per
+frame. `TAN` and `ZPN` are supported, following Calabretta & Greisen (2002)
+with the default `LONPOLE` of 180 degrees. The `ZPN` polynomial is inverted
+by Newton's method. Frames with other projections, SIP distortion terms,
+`PV1_m` cards or another `LONPOLE` are marked as unsupported, for the
+caller to evaluate with astropy.
+'''
+
+import re
+import numpy as np
+
+PROJECTIONS = ['TAN', 'ZPN']
+
+# Header cards describing the WCS of a frame
+WCS_CARD = re.compile(r'^(NAXIS\d?|CTYPE\d|CUNIT\d|CRPIX\d|CRVAL\d|CDELT\d|'
+                      r'CD\d_\d|PC\d_\d|PV\d_\d+|PS\d_\d+|LONPOLE|LATPOLE|'
+                      r'RADESYS|EQUINOX|A_ORDER|B_ORDER|AP_ORDER|BP_ORDER|'
+                      r'A_\d+_\d+|B_\d+_\d+|AP_\d+_\d+|BP_\d+_\d+)$')
+
+# Cards the vectorised projection does not apply
+UNSUPPORTED_CARD = re.compile(r'^(A_ORDER|B_ORDER|AP_ORDER|BP_ORDER|PV1_\d+)$')
+
+NEWTON_ITERATIONS = 50
+NEWTON_TOLERANCE = 1e-15
+
+
+def wcs_cards(header):
+    '''
+    Dict of the WCS cards of a header, enough to rebuild its WCS
+    '''
+    return dict((key, header[key]) for key in header.keys()
+                if WCS_CARD.match(key.upper()))
+
+
+def projection_code(ctype):
+    return ctype.strip()[5:8] if len(ctype.strip()) >= 8 else ''
+
+
+def is_supported(cards):
+    '''
+    Whether the WCS cards of a frame are a plain `TAN` or `ZPN` projection,
+    which `Projections` evaluates exactly
+    '''
+    code = projection_code(cards.get('CTYPE1', ''))
+    return (code in PROJECTIONS and
+            cards.get('CTYPE1', '').strip() == 'RA---' + code and
+            cards.get('CTYPE2', '').strip() == 'DEC--' + code and
+            not any(UNSUPPORTED_CARD.match(key) for key in cards) and
+            float(cards.get('LONPOLE', 180.)) == 180.)
+
+
+def cd_matrix(cards):
+    '''
+    CD matrix of a header, from the CDi_j cards or CDELTi and PCi_j
+    '''
+    if 'CD1_1' in cards:
+        return np.array([[cards.get('CD1_1', 0.), cards.get('CD1_2', 0.)],
+                         [cards.get('CD2_1', 0.), cards.get('CD2_2', 0.)]])
+    pc = np.array([[cards.get('PC1_1', 1.), cards.get('PC1_2', 0.)],
+                   [cards.get('PC2_1', 0.), cards.get('PC2_2', 1.)]])
+    return pc * np.array([cards.get('CDELT1', 1.), cards.get('CDELT2', 1.)])[
+        :, np.newaxis]
+
+
+def polynomial(coefficients, x):
+    '''
+    Values and derivatives of the polynomials with `coefficients` (n,
+    order + 1), lowest order first, at `x` (n, k)
+    '''
+    value = np.zeros_like(x)
+    derivative = np.zeros_like(x)
+    for m in range(coefficients.shape[1] - 1, -1, -1):
+        derivative = derivative * x + value
+        value = value * x + coefficients[:, m, np.newaxis]
+    return value, derivative
+
+
+def invert_zpn(coefficients, r):
+    '''
+    Native colatitude in radians for radii `r` in radians, solving
+    sum(P_m gamma^m) = r by Newton's method
+    '''
+    # Start from the linear solution. There are always at least two
+    # coefficients, see `Projections`
+    slope = coefficients[:, 1, np.newaxis]
+    slope = np.where(slope == 0, 1., slope)
+    gamma = (r - coefficients[:, 0, np.newaxis]) / slope
+    for _ in range(NEWTON_ITERATIONS):
+        value, derivative = polynomial(coefficients, gamma)
+        step = (value - r) / derivative
+        gamma = gamma - step
+        if np.all(np.abs(step) < NEWTON_TOLERANCE):
+            break
+    return gamma
+
+
+class Projections(object):
+    '''
+    WCS of `n` frames, from a list of dicts of their WCS cards (see
+    `wcs_cards`)
+    '''
+
+    def __init__(self, cards):
+        self.cards = cards
+        self.n = len(cards)
+        self.projection = np.array([projection_code(c.get('CTYPE1', ''))
+                                    for c in cards])
+        self.supported = np.array([is_supported(c) for c in cards],
+                                  dtype=bool).reshape(-1)
+        self.crpix = np.array([[c.get('CRPIX1', 0.), c.get('CRPIX2', 0.)]
+                               for c in cards], dtype=float).reshape(-1, 2)
+        self.crval = np.array([[c.get('CRVAL1', 0.), c.get('CRVAL2', 0.)]
+                               for c in cards], dtype=float).reshape(-1, 2)
+        self.cd = np.array([cd_matrix(c) for c in cards],
+                           dtype=float).reshape(-1, 2, 2)
+
+        order = max([int(key[4:]) for c in cards for key in c
+                     if key.startswith('PV2_')] + [1])
+        self.pv = np.zeros((self.n, order + 1))
+        for (i, c) in enumerate(cards):
+            for m in range(order + 1):
+                self.pv[i, m] = c.get('PV2_{}'.format(m), 0.)
+
+    def pix2world(self, x, y):
+        '''
+        Sky positions in degrees of the 1-based pixel positions `x`, `y`,
+        of shape (n, k) or broadcastable to it, on every frame. Unsupported
+        frames are nan.
+        '''
+        x, y = np.broadcast_arrays(np.atleast_2d(x), np.atleast_2d(y))
+        shape = np.broadcast(x, np.empty((self.n, 1))).shape
+        x = np.broadcast_to(x, shape).astype(float)
+        y = np.broadcast_to(y, shape).astype(float)
+
+        dx = x - self.crpix[:, 0, np.newaxis]
+        dy = y - self.crpix[:, 1, np.newaxis]
+        cd = self.cd[:, :, :, np.newaxis]
+        xi = cd[:, 0, 0] * dx + cd[:, 0, 1] * dy
+        eta = cd[:, 1, 0] * dx + cd[:, 1, 1] * dy
+
+        phi = np.arctan2(xi, -eta)
+        r = np.radians(np.hypot(xi, eta))
+        gamma = np.arctan(r)
+        zpn = (self.projection == 'ZPN') & self.supported
+        if zpn.any():
+            gamma[zpn] = invert_zpn(self.pv[zpn], r[zpn])
+        theta = np.pi / 2. - gamma
+
+        ra0 = np.radians(self.crval[:, 0, np.newaxis])
+        dec0 = np.radians(self.crval[:, 1, np.newaxis])
+        dphi = phi - np.pi
+        ra = ra0 + np.arctan2(
+            -np.cos(theta) * np.sin(dphi),
+            np.sin(theta) * np.cos(dec0) -
+            np.cos(theta) * np.sin(dec0) * np.cos(dphi))
+        dec = np.arcsin(np.clip(
+            np.sin(theta) * np.sin(dec0) +
+            np.cos(theta) * np.cos(dec0) * np.cos(dphi), -1., 1.))
+
+        ra, dec = np.degrees(ra) % 360., np.degrees(dec)
+        ra[~self.supported] = np.nan
+        dec[~self.supported] = np.nan
+        return ra, dec
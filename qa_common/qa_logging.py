@@ -1,10 +1,29 @@
+'''
+Logging for the QA scripts.
+
+Logging is configured by the first call to `get_logger`, when a script or
+module creates its logger, rather than as a side effect of importing this
+module.
+'''
+
 import logging
 import sys
-import datetime
 
 fmt = '%(asctime)s|%(name)s|%(levelname)7s|%(message)s'
-logging.basicConfig(level=logging.DEBUG, format=fmt, stream=sys.stderr)
+
+_configured = False
+
+
+def configure():
+    global _configured
+    if _configured:
+        return
+    logging.basicConfig(level=logging.DEBUG, format=fmt, stream=sys.stderr)
+    # matplotlib lists every loaded module at debug level
+    logging.getLogger('matplotlib').setLevel(logging.INFO)
+    _configured = True
 
 
 def get_logger(filename):
+    configure()
     return logging.getLogger(filename)
@@ -0,0 +1,195 @@
+'''
+Local store of 2MASS reference sources, so repeat fields are served
+without running `find2mass`.
+
+Sources are partitioned into declination zones `ZONE_HEIGHT` degrees high.
+Each zone is a `.npy` file of records sorted by right ascension, opened
+memory-mapped, so a search reads only the pages covering its right
+ascension range in each zone it touches. `coverage.json` lists the boxes
+which have been added in full; `covers` checks a request against it.
+
+The store is filled from `find2mass` output, either as it is fetched or
+from a local extract of a large region, so it can be used offline.
+'''
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .qa_logging import get_logger
+from .sky import angular_separation
+
+logger = get_logger(__file__)
+
+ZONE_HEIGHT = 1.
+DTYPE = np.dtype([('ra', '<f8'), ('dec', '<f8'), ('jmag', '<f4'),
+                  ('name_2mass', 'S16')])
+COVERAGE_FILE = 'coverage.json'
+
+# Character ranges of the fields of a `find2mass` output line
+FIND2MASS_FIELDS = [('ra', 0, 10), ('dec', 12, 21), ('name_2mass', 36, 52),
+                    ('jmag', 54, 60)]
+
+
+def parse_find2mass(text):
+    '''
+    Sources in the fixed-width output of `find2mass`. Comment lines contain
+    `#`. The lines are converted to a 2D character array, and each field
+    is sliced out of it and converted in one go.
+    '''
+    if not isinstance(text, bytes):
+        text = text.encode('ascii')
+    lines = [line for line in text.split(b'\n')
+             if line.strip() and b'#' not in line]
+    sources = np.zeros(len(lines), dtype=DTYPE)
+    if not lines:
+        return sources
+
+    width = max(max(len(line) for line in lines),
+                max(end for (_, _, end) in FIND2MASS_FIELDS))
+    chars = np.array(lines, dtype='S{}'.format(width))
+    chars = chars.view('S1').reshape(len(lines), width)
+    for (name, start, end) in FIND2MASS_FIELDS:
+        field = np.ascontiguousarray(chars[:, start:end]).view(
+            'S{}'.format(end - start))[:, 0]
+        # Names fill their field, so need no stripping
+        sources[name] = field if name == 'name_2mass' else field.astype(float)
+    return sources
+
+
+def box_limits(ra, dec, width):
+    '''
+    Declination range and right ascension intervals of a box `width`
+    degrees on the sky centred on (`ra`, `dec`). The right ascension range
+    is widened by 1 / cos(dec) at the edge nearest the pole, and split in
+    two where it wraps through 0.
+    '''
+    half = width / 2.
+    dec_min, dec_max = max(dec - half, -90.), min(dec + half, 90.)
+    cos_dec = np.cos(np.radians(max(abs(dec_min), abs(dec_max))))
+    if cos_dec <= 0 or half / cos_dec >= 180.:
+        return dec_min, dec_max, [(0., 360.)]
+
+    ra_half = half / cos_dec
+    ra_min, ra_max = (ra - ra_half) % 360., (ra + ra_half) % 360.
+    if ra_min <= ra_max:
+        return dec_min, dec_max, [(ra_min, ra_max)]
+    return dec_min, dec_max, [(0., ra_max), (ra_min, 360.)]
+
+
+class ReferenceStore(object):
+
+    def __init__(self, directory, zone_height=ZONE_HEIGHT):
+        self.directory = directory
+        self.zone_height = zone_height
+        self._zones = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @property
+    def coverage(self):
+        fname = os.path.join(self.directory, COVERAGE_FILE)
+        if not os.path.isfile(fname):
+            return []
+        with open(fname) as infile:
+            return json.load(infile)
+
+    def zone_index(self, dec):
+        return int(np.floor((np.asarray(dec) + 90.) / self.zone_height))
+
+    def zone_filename(self, index):
+        return os.path.join(self.directory, 'zone{:04d}.npy'.format(index))
+
+    def zone(self, index):
+        '''
+        Sources in zone `index`, memory-mapped and sorted by right ascension
+        '''
+        if index not in self._zones:
+            fname = self.zone_filename(index)
+            if os.path.isfile(fname):
+                self._zones[index] = np.load(fname, mmap_mode='r')
+            else:
+                self._zones[index] = np.zeros(0, dtype=DTYPE)
+        return self._zones[index]
+
+    def add(self, sources, box=None):
+        '''
+        Merge `sources` into the store, replacing sources with the same
+        2MASS name. If `box` (ra, dec, width) is given, the sources are the
+        complete contents of that box and later requests within it are
+        covered.
+        '''
+        sources = np.asarray(sources, dtype=DTYPE)
+        zones = ((sources['dec'] + 90.) // self.zone_height).astype(int)
+        for index in np.unique(zones):
+            merged = np.concatenate([sources[zones == index],
+                                     np.array(self.zone(index))])
+            # np.unique keeps the first occurrence, i.e. the new source
+            _, first = np.unique(merged['name_2mass'], return_index=True)
+            merged = merged[first]
+            merged = merged[np.argsort(merged['ra'], kind='mergesort')]
+            self._write(self.zone_filename(index), merged)
+            self._zones.pop(index, None)
+
+        if box is not None:
+            self._write_coverage(self.coverage + [list(map(float, box))])
+        logger.info('Added %s sources to %s', len(sources), self.directory)
+
+    def _write(self, fname, array):
+        # Replace atomically, as other processes may have the file mapped
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as outfile:
+            np.save(outfile, array)
+        os.rename(tmp_name, fname)
+
+    def _write_coverage(self, coverage):
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as outfile:
+            json.dump(coverage, outfile)
+        os.rename(tmp_name, os.path.join(self.directory, COVERAGE_FILE))
+
+    def covers(self, ra, dec, width):
+        '''
+        Whether the box `width` degrees wide centred on (`ra`, `dec`) lies
+        within a box which has been added in full
+        '''
+        dec_min, dec_max, intervals = box_limits(ra, dec, width)
+        for covered in self.coverage:
+            covered_min, covered_max, covered_intervals = box_limits(*covered)
+            if dec_min < covered_min or dec_max > covered_max:
+                continue
+            if all(any(low >= covered_low and high <= covered_high
+                       for (covered_low, covered_high) in covered_intervals)
+                   for (low, high) in intervals):
+                return True
+        return False
+
+    def box_search(self, ra, dec, width):
+        '''
+        Sources in the box `width` degrees wide centred on (`ra`, `dec`)
+        '''
+        dec_min, dec_max, intervals = box_limits(ra, dec, width)
+        found = []
+        for index in range(self.zone_index(dec_min),
+                           self.zone_index(dec_max) + 1):
+            zone = self.zone(index)
+            for (low, high) in intervals:
+                start = np.searchsorted(zone['ra'], low, side='left')
+                end = np.searchsorted(zone['ra'], high, side='right')
+                rows = np.array(zone[start:end])
+                found.append(rows[(rows['dec'] >= dec_min) &
+                                  (rows['dec'] <= dec_max)])
+        if not found:
+            return np.zeros(0, dtype=DTYPE)
+        return np.concatenate(found)
+
+    def cone_search(self, ra, dec, radius):
+        '''
+        Sources within `radius` degrees of (`ra`, `dec`)
+        '''
+        candidates = self.box_search(ra, dec, 2 * radius)
+        separation = angular_separation(ra, dec, candidates['ra'],
+                                        candidates['dec'])
+        return candidates[separation <= radius]
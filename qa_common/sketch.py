@@ -0,0 +1,159 @@
+'''
+Streaming statistics of many streams at once, e.g. one stream per frame
+while reading a flux matrix in blocks of apertures.
+
+`QuantileSketch` is a multi-level compactor sketch (in the style of KLL and
+Manku-Rajagopalan-Lindsay). Level `h` holds items of weight `2**h`. When a
+level reaches `k` items it is sorted and every other item, starting from an
+alternating offset, moves to the level above. Each compaction at level `h`
+shifts the rank of any value by at most `2**h`, and at most
+`n / (k * 2**h)` such compactions happen, so after `n` values the rank error
+of any quantile is at most
+
+    n * (log2(n / k) + 1) / k
+
+e.g. 1.7% of the rank range for 100,000 apertures with the default
+`k = 512`. Memory per stream is below `k * (log2(n / k) + 1)` values. All
+streams receive the same number of values, so the levels are stored as 2D
+arrays and every operation is vectorised across streams.
+
+`StreamingMoments` accumulates exact means and standard deviations with the
+pairwise update of Chan et al.
+'''
+
+import numpy as np
+
+DEFAULT_SKETCH_SIZE = 512
+
+
+class QuantileSketch(object):
+
+    def __init__(self, nstreams, k=DEFAULT_SKETCH_SIZE):
+        if k < 2 or k % 2:
+            raise ValueError('Sketch size must be an even number >= 2')
+        self.nstreams = nstreams
+        self.k = k
+        self.count = 0
+        self.levels = []
+        self.offsets = []
+        self.has_nan = np.zeros(nstreams, dtype=bool)
+
+    @staticmethod
+    def error_bound(n, k=DEFAULT_SKETCH_SIZE):
+        '''
+        Maximum rank error, as a fraction of `n`, after `n` values
+        '''
+        if n <= k:
+            return 0.
+        return (np.log2(n / float(k)) + 1) / k
+
+    def update(self, values):
+        '''
+        Add a block of values with shape (nvalues, nstreams). Streams
+        containing nan report nan quantiles.
+        '''
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 2 or values.shape[1] != self.nstreams:
+            raise ValueError('Expected values of shape (n, {}), got {}'.format(
+                self.nstreams, values.shape))
+        nan = np.isnan(values)
+        if nan.any():
+            self.has_nan |= nan.any(axis=0)
+            values = np.where(nan, 0., values)
+
+        self.count += values.shape[0]
+        self._add(0, values.T)
+
+    def merge(self, other):
+        '''
+        Add the contents of another sketch of the same streams
+        '''
+        if other.nstreams != self.nstreams:
+            raise ValueError('Cannot merge sketches of different streams')
+        self.count += other.count
+        self.has_nan |= other.has_nan
+        for (level, items) in enumerate(other.levels):
+            self._add(level, items)
+
+    def _add(self, level, items):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty((self.nstreams, 0)))
+            self.offsets.append(0)
+
+        self.levels[level] = np.concatenate([self.levels[level], items],
+                                            axis=1)
+        if self.levels[level].shape[1] < self.k:
+            return
+
+        items = np.sort(self.levels[level], axis=1)
+        npaired = 2 * (items.shape[1] // 2)
+        offset = self.offsets[level]
+        self.offsets[level] = 1 - offset
+
+        # An unpaired largest item stays at this level
+        self.levels[level] = items[:, npaired:]
+        self._add(level + 1, items[:, offset:npaired:2])
+
+    def quantiles(self, qs):
+        '''
+        Estimate quantiles `qs` (between 0 and 1) of every stream, returning
+        an array of shape (len(qs), nstreams)
+        '''
+        qs = np.atleast_1d(qs)
+        if not self.count:
+            return np.full((qs.size, self.nstreams), np.nan)
+
+        items = np.concatenate(self.levels, axis=1)
+        weights = np.concatenate([np.full(level.shape[1], 2. ** h)
+                                  for (h, level) in enumerate(self.levels)])
+        order = np.argsort(items, axis=1)
+        rows = np.arange(self.nstreams)[:, np.newaxis]
+        items = items[rows, order]
+        cumulative = np.cumsum(weights[order], axis=1)
+        total = cumulative[:, -1:]
+
+        result = np.empty((qs.size, self.nstreams))
+        for (i, q) in enumerate(qs):
+            index = np.sum(cumulative < q * total, axis=1)
+            index = np.minimum(index, items.shape[1] - 1)
+            result[i] = items[np.arange(self.nstreams), index]
+        result[:, self.has_nan] = np.nan
+        return result
+
+
+class StreamingMoments(object):
+
+    def __init__(self, nstreams):
+        self.count = 0
+        self.mean = np.zeros(nstreams)
+        self.m2 = np.zeros(nstreams)
+
+    def update(self, values):
+        '''
+        Add a block of values with shape (nvalues, nstreams)
+        '''
+        values = np.asarray(values, dtype=float)
+        n = values.shape[0]
+        if not n:
+            return
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        self._combine(n, mean, m2)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        '''
+        Population standard deviation, as `np.std`
+        '''
+        return np.sqrt(self.m2 / self.count)
@@ -0,0 +1,46 @@
+'''
+Vectorised spherical geometry on arrays of positions in degrees.
+
+Separations use the haversine formula, which stays accurate for the arcsecond
+separations of matched sources where the cosine formula loses precision.
+'''
+
+import numpy as np
+
+# Columns of match_with_2mass.py output, in arcseconds
+SEPARATION_COLUMN = 'Separation'
+OFFSET_COLUMNS = ('dRA_cosDEC', 'dDEC')
+
+
+def angular_separation(ra1, dec1, ra2, dec2):
+    '''
+    Great circle distance in degrees, by the haversine formula
+    '''
+    ra1, dec1, ra2, dec2 = map(np.radians, [ra1, dec1, ra2, dec2])
+    a = (np.sin((dec2 - dec1) / 2.) ** 2 +
+         np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2.) ** 2)
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0., 1.))))
+
+
+def offsets(ra1, dec1, ra2, dec2):
+    '''
+    Offsets in degrees of the first positions from the second, as
+    (delta ra * cos(dec), delta dec). The right ascension difference is
+    wrapped into [-180, 180).
+    '''
+    ra1, dec1, ra2, dec2 = map(np.asarray, [ra1, dec1, ra2, dec2])
+    dra = (ra1 - ra2 + 180.) % 360. - 180.
+    return dra * np.cos(np.radians(dec1)), dec1 - dec2
+
+
+def match_separations(hdu):
+    '''
+    Separations in arcseconds of the matched rows of a match_with_2mass.py
+    output hdu, from its `Separation` column, or computed from the
+    positions for files written without it
+    '''
+    if SEPARATION_COLUMN in hdu.get_colnames():
+        return hdu[SEPARATION_COLUMN][:]
+    return angular_separation(np.degrees(hdu['RA_1'][:]),
+                              np.degrees(hdu['DEC_1'][:]),
+                              hdu['ra_2'][:], hdu['dec_2'][:]) * 3600.
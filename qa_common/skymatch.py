@@ -0,0 +1,150 @@
+'''
+Cross-match two lists of sky positions with a KD-tree.
+
+Positions are converted to unit vectors, so the tree works in 3D and has
+no trouble at the poles or where right ascension wraps. Two positions
+separated by an angle `theta` are a straight-line (chord) distance
+`2 sin(theta / 2)` apart, so a search radius on the sky becomes a chord
+radius for the tree.
+
+`match` returns the matched index pairs and their separations:
+
+* `best`: each row of either list appears at most once. Pairs are taken in
+  order of separation, skipping any whose rows are already matched, as
+  `tskymatch2 find=best` in stilts
+* `best1`: each row of the first list is paired with its nearest row of the
+  second, which may be matched more than once
+* `all`: every pair within the radius
+'''
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .csv_container import CSVContainer
+
+MODES = ['best', 'best1', 'all']
+
+
+def unit_vectors(ra, dec):
+    '''
+    (n, 3) array of unit vectors of positions in degrees
+    '''
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra),
+                            np.sin(dec)])
+
+
+def chord_to_degrees(chord):
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2., 0., 1.)))
+
+
+def degrees_to_chord(angle):
+    return 2 * np.sin(np.radians(angle) / 2.)
+
+
+def closest_per_row(index, separation):
+    '''
+    Mask of the pair with the smallest separation for each value of `index`
+    '''
+    order = np.lexsort([separation, index])
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = index[order][1:] != index[order][:-1]
+    mask = np.zeros(order.size, dtype=bool)
+    mask[order[first]] = True
+    return mask
+
+
+def unique_pairs(index1, index2, separation):
+    '''
+    Mask of the pairs chosen by taking them in order of separation and
+    skipping any sharing a row with a pair already taken.
+
+    A pair which is the closest remaining pair of both its rows would be
+    taken, as every pair it conflicts with is further apart. So rather than
+    walking the pairs one at a time, each round takes all such pairs and
+    drops the pairs sharing their rows.
+    '''
+    chosen = np.zeros(index1.size, dtype=bool)
+    remaining = np.arange(index1.size)
+    while remaining.size:
+        i1, i2, sep = (index1[remaining], index2[remaining],
+                       separation[remaining])
+        mutual = closest_per_row(i1, sep) & closest_per_row(i2, sep)
+        chosen[remaining[mutual]] = True
+        free = ~(np.in1d(i1, i1[mutual]) | np.in1d(i2, i2[mutual]))
+        remaining = remaining[free]
+    return chosen
+
+
+def read_reference(fname):
+    '''
+    Structured array of a reference catalogue written by fetch_2mass.py
+    '''
+    reference = CSVContainer.from_filename(fname, sort_key=None)
+    table = np.empty(len(reference.ra), dtype=[
+        (str(key), reference[key].dtype) for key in reference.keys])
+    for key in reference.keys:
+        table[str(key)] = reference[key]
+    return table
+
+
+class SkyMatcher(object):
+    '''
+    KD-tree of the reference positions (`ra`, `dec`), in degrees
+    '''
+
+    def __init__(self, ra, dec):
+        self.size = np.size(ra)
+        self.tree = cKDTree(unit_vectors(ra, dec))
+
+    def nearest(self, ra, dec, radius):
+        '''
+        Index of the nearest reference to each position within `radius`
+        degrees, and its separation in degrees; the index is `self.size`
+        and the separation infinite where there is none
+        '''
+        chord, index = self.tree.query(unit_vectors(ra, dec), k=1,
+                                       distance_upper_bound=degrees_to_chord(
+                                           radius))
+        return index, np.where(np.isfinite(chord), chord_to_degrees(chord),
+                               np.inf)
+
+    def within(self, ra, dec, radius):
+        '''
+        Every (position index, reference index) pair within `radius`
+        degrees, and their separations in degrees
+        '''
+        vectors = unit_vectors(ra, dec)
+        neighbours = self.tree.query_ball_point(vectors,
+                                                degrees_to_chord(radius))
+        counts = np.array([len(found) for found in neighbours], dtype=int)
+        index1 = np.repeat(np.arange(len(neighbours)), counts)
+        index2 = np.array([i for found in neighbours for i in found],
+                          dtype=int)
+        chord = np.linalg.norm(vectors[index1] - self.tree.data[index2],
+                               axis=1)
+        order = np.lexsort([index2, index1])
+        return index1[order], index2[order], chord_to_degrees(chord[order])
+
+    def match(self, ra, dec, radius, mode='best'):
+        '''
+        Matched (position index, reference index, separation in degrees)
+        arrays, for positions `ra`, `dec` in degrees. See the module
+        documentation for the `mode`s.
+        '''
+        if mode not in MODES:
+            raise ValueError('Unknown match mode {}, choose from {}'.format(
+                mode, ', '.join(MODES)))
+
+        if mode == 'best1':
+            index2, separation = self.nearest(ra, dec, radius)
+            index1 = np.flatnonzero(index2 < self.size)
+            return index1, index2[index1], separation[index1]
+
+        index1, index2, separation = self.within(ra, dec, radius)
+        if mode == 'best':
+            chosen = unique_pairs(index1, index2, separation)
+            index1, index2, separation = (index1[chosen], index2[chosen],
+                                          separation[chosen])
+        return index1, index2, separation
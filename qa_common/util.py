@@ -1,6 +1,21 @@
+def default_chunksize(ntasks, nworkers):
+    '''
+    Tasks to send a worker at a time: large enough to amortise the
+    messaging, small enough that results start arriving early and the work
+    is evenly spread
+    '''
+    return max(1, min(64, ntasks // (4 * max(nworkers, 1))))
+
+
 class NullPool(object):
     def __init__(self, *args, **kwargs):
         pass
 
     def map(self, fn, args):
         return map(fn, args)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
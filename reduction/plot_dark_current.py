@@ -12,6 +12,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 import qa_common
+from qa_common.instrument import instrumented
 from qa_common import plot_night_breaks, get_logger
 from qa_common.plotting import plt
 from qa_common.util import NullPool
@@ -20,8 +21,14 @@ from plot_overscan_levels import sigma_clipped_mean
 
 logger = get_logger(__file__)
 
+@instrumented
 def main(args):
-    data = qa_common.CSVContainer(args.extracted)
+    data = qa_common.CSVContainer(args.extracted,
+            key_type_map={'roof_open': qa_common.CSVContainer.bool_converter})
+    data.select(np.isfinite(data.dark))
+    if not data.dark.size:
+        logger.error('No dark frames found in %s', args.extracted.name)
+        sys.exit(1)
 
     mjd0 = int(data.mjd.min())
     data['mjd'] = data.mjd - mjd0
@@ -68,6 +75,6 @@ if __name__ == '__main__':
     parser.add_argument('-o', '--output', help='Output image',
             required=False, type=argparse.FileType(mode='w'))
     parser.add_argument('extracted', type=argparse.FileType(mode='r'),
-            help='List of files')
+            help='Raw frame table from scan_raw_frames.py')
     main(parser.parse_args())
 
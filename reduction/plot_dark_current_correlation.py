@@ -7,14 +7,21 @@ import sys
 import os
 
 from qa_common import get_logger
+from qa_common.instrument import instrumented
 from qa_common.plotting import plt
 import qa_common
 
 logger = get_logger(__file__)
 
+@instrumented
 def main(args):
-    data = qa_common.CSVContainer(args.extracted)
+    data = qa_common.CSVContainer(args.extracted,
+            key_type_map={'roof_open': qa_common.CSVContainer.bool_converter})
     logger.info('Data read from %s', args.extracted)
+    data.select(np.isfinite(data.dark))
+    if not data.dark.size:
+        logger.error('No dark frames found in %s', args.extracted.name)
+        sys.exit(1)
 
     offset_value = 0.1
     offset = np.random.uniform(-offset_value, offset_value, data.chstemp.size)
@@ -39,6 +46,6 @@ if __name__ == '__main__':
     parser.add_argument('-o', '--output', help='Output image',
             required=False, type=argparse.FileType(mode='w'))
     parser.add_argument('extracted', type=argparse.FileType(mode='r'),
-            help='List of files')
+            help='Raw frame table from scan_raw_frames.py')
     main(parser.parse_args())
 
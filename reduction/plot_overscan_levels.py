@@ -11,6 +11,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 import qa_common
+from qa_common.instrument import instrumented
 from qa_common import plot_night_breaks, get_logger
 from qa_common.plotting import plt
 from qa_common.util import NullPool
@@ -57,6 +58,7 @@ def extract_from_file(fname):
             }
 
 
+@instrumented
 def main(args):
     logger.info('Reading data from %s', args.extracted)
     data = qa_common.CSVContainer(args.extracted,
@@ -5,10 +5,12 @@ import argparse
 import numpy as np
 import fitsio
 from qa_common.plotting import plt
+from qa_common.instrument import instrumented
 from qa_common import get_logger
 
 logger = get_logger(__file__)
 
+@instrumented
 def main(args):
     if not args.width % 2 == 0:
         raise RuntimeError("Width must be a multiple of 2")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Read each raw frame once, extracting the overscan levels, header metadata
+and, for dark frames, the dark current into one table. Non-dark frames have
+a dark current of nan.
+
+Only the overscan strips are read from non-dark frames. For fpacked frames
+cfitsio decompresses just the tiles covering the strips; with the default
+one-row tiles that is still every tile, but the full image is never
+converted or held in memory.
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+from functools import partial
+import numpy as np
+from multiprocessing.pool import ThreadPool as Pool
+import fitsio
+import re
+
+from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.binary_table import write_table, add_format_argument
+from qa_common.cache import open_memo, add_cache_arguments
+from qa_common.util import NullPool
+
+
+logger = get_logger(__file__)
+
+FIELDS = ['mjd', 'exposure', 'image_id', 'roof_open', 'left', 'right',
+          'airmass', 'ccdtemp', 'chstemp', 'dark']
+
+overscan_regex = re.compile(r'\[(\d+):(\d+),(\d+):(\d+)\]')
+
+# Default overscan strips: (rows, columns)
+LEFT_OVERSCAN = (slice(4, None), slice(1, 20))
+RIGHT_OVERSCAN = (slice(4, None), slice(-15, None))
+
+def parse_overscan_region(region_txt):
+    limits = map(int, overscan_regex.search(region_txt).groups())
+    xmin, xmax, ymin, ymax = limits
+    return (
+        slice(xmin, xmax),
+        slice(ymin, ymax)
+    )
+
+def sigma_clipped_mean(values, nsigma=3):
+    median_value = np.median(values)
+    limit = nsigma * np.std(values)
+
+    ind = (values >= median_value - limit) & (values <= median_value + limit)
+    return np.average(values[ind])
+
+
+def compute_bias_signal(image, left, right):
+    x = np.arange(2048)
+    gradient = (right - left) / 2048.
+
+    y = gradient * x + left
+    return y
+
+
+def dark_current(image):
+    '''
+    Sigma clipped mean of the science region, after removing a bias
+    interpolated between the left and right overscan levels
+    '''
+    left_overscan = sigma_clipped_mean(image[:, 1:20])
+    right_overscan = sigma_clipped_mean(image[:, -20:])
+
+    central = image[:, 20:-20]
+    bias_signal = compute_bias_signal(central, left_overscan, right_overscan)
+    return sigma_clipped_mean(central - bias_signal).astype(float)
+
+
+def image_hdu(infile):
+    '''
+    The first HDU containing image data; extension 1 for fpacked files
+    '''
+    for hdu in infile:
+        if hdu.get_exttype() == 'IMAGE_HDU' and len(hdu.get_dims()):
+            return hdu
+    raise ValueError('No image data found')
+
+
+def biassec_region(header):
+    '''
+    Convert the 1-indexed inclusive BIASSEC header value into 0-indexed
+    (rows, columns) slices
+    '''
+    sx, sy = parse_overscan_region(header['biassec'])
+    return (slice(sy.start - 1, sy.stop), slice(sx.start - 1, sx.stop))
+
+
+def extract_from_file(fname, use_biassec=False):
+    logger.info('Analysing file %s', fname)
+    with fitsio.FITS(fname) as infile:
+        hdu = image_hdu(infile)
+        header = hdu.read_header()
+        is_dark = header['imgtype'].strip() == 'DARK'
+        left_region = biassec_region(header) if use_biassec else LEFT_OVERSCAN
+
+        if is_dark:
+            image = hdu.read()
+            left, right = image[left_region], image[RIGHT_OVERSCAN]
+        else:
+            left, right = hdu[left_region], hdu[RIGHT_OVERSCAN]
+
+    mjd = header['mjd']
+    exposure = header['exposure']
+
+    airmass = header.get('airmass', 0)
+    chstemp = header.get('chstemp', 0)
+    ccdtemp = header.get('ccdtemp', 0)
+    image_id = header['image_id']
+    roof_status_value = header['roofstat']
+    roof_open = True if roof_status_value.lower() == 'full open' else False
+
+    if is_dark:
+        logger.debug('Dark frame %s, exptime: %s, ccdtemp: %s',
+                     fname, exposure, ccdtemp)
+
+    return {
+            'mjd': mjd,
+            'exposure': float(exposure),
+            'image_id': image_id,
+            'roof_open': roof_open,
+            'left': sigma_clipped_mean(left).astype(float),
+            'right': sigma_clipped_mean(right).astype(float),
+            'airmass': airmass,
+            'ccdtemp': ccdtemp,
+            'chstemp': chstemp,
+            'dark': dark_current(image) if is_dark else np.nan,
+            }
+
+
+@instrumented
+def main(args):
+    files = [line.strip('\n') for line in args.filelist.readlines()]
+    logger.info('Number of files: %s', len(files))
+
+    pool = Pool()
+    extract = partial(extract_from_file, use_biassec=args.biassec)
+    namespace = 'scan_raw_frames' + (':biassec' if args.biassec else '')
+    memo = open_memo(namespace, args.cache, hash_contents=args.cache_hash)
+    with stage('extract'):
+        try:
+            data = memo.map(extract, files, mapper=pool.map)
+        finally:
+            memo.close()
+            pool.close()
+            pool.join()
+
+    logger.info('Rendering output file to %s', args.output)
+    with stage('write'):
+        write_table(args.output, data, FIELDS, format=args.format)
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', help='Output image',
+            required=True, type=argparse.FileType(mode='w'))
+    parser.add_argument('filelist', type=argparse.FileType(mode='r'),
+            help='List of files')
+    parser.add_argument('--biassec', action='store_true', default=False,
+            help='Take the left overscan region from the BIASSEC header key')
+    add_cache_arguments(parser)
+    add_format_argument(parser)
+    main(parser.parse_args())
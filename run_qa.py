@@ -0,0 +1,518 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Build every QA plot for a pipeline run, running independent jobs in parallel.
+
+Each plot has a fixed number, taken from its position in `PLOTS`, so the
+output file names do not depend on the order the jobs finish in.
+
+Jobs are skipped when their inputs, script and command line are unchanged
+since their last successful run. Plots read the extracted files by content,
+so re-extracting identical data does not re-render them.
+
+Every script records the time, memory and I/O of its stages in
+`<outputdir>/work/timing/<run>.jsonl`, which is summarised on the html page.
+
+The headers of the raw and reduced frames are indexed first, in
+`<outputdir>/work/headers.sqlite`, and the extraction scripts read header
+cards from the index rather than opening the files.
+'''
+
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import fnmatch
+import multiprocessing as mp
+import os
+import shutil
+import subprocess as sp
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from qa_common import get_logger
+from qa_common.cache import CACHE_ENV, CACHE_SIZE_ENV
+from qa_common.header_index import INDEX_ENV, find_indexed_files
+from qa_common.instrument import TIMING_ENV, PROFILE_ENV, RUN_ENV
+from qa_common.jobs import Job, JobGraph, JobResult
+
+logger = get_logger(__file__)
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+HDUS = ['flux', 'tamflux', 'casudet']
+
+# Plot order, which sets the plot numbers. Photometry plots which are made
+# for each hdu are named `<stub>:<hdu>`
+PLOTS = (['overscan-levels', 'dark-levels', 'dark-correlation',
+          'mbias', 'mdark', 'mflat', 'flat-total-adu'] +
+         ['flux-vs-rms:{}'.format(hdu) for hdu in HDUS] +
+         ['casu-flux-vs-rms'] +
+         ['rms-vs-time:{}'.format(hdu) for hdu in HDUS] +
+         ['casu-rms-vs-time'] +
+         ['rms-with-binning:{}'.format(hdu) for hdu in HDUS] +
+         ['photometry-time-series', 'psf-measurements', 'psf-ratios'] +
+         ['binned-lightcurves-by-brightness:{}'.format(hdu) for hdu in HDUS] +
+         ['autoguider-results', 'extracted-astrometric-parameters',
+          'field-rotation', 'pixel-centre-of-mass',
+          'astrometric-residuals'])
+
+# Plots rendered by photometry/render_photometry_plots.py
+PHOTOMETRY_PLOTS = set(['flux-vs-rms', 'casu-flux-vs-rms', 'rms-vs-time',
+                        'casu-rms-vs-time', 'rms-with-binning',
+                        'photometry-time-series',
+                        'binned-lightcurves-by-brightness',
+                        'autoguider-results', 'pixel-centre-of-mass'])
+
+# Summary images copied from the reduction, with their plot index offsets
+SUMMARIES = [
+    ('vector-astrometry', 70,
+     lambda fname: not any(word in fname
+                           for word in ['psf', 'model', 'residuals'])),
+    ('psf', 80, lambda fname: 'psf' in fname),
+    ('psf-residuals', 90, lambda fname: 'residuals' in fname),
+]
+
+
+def script(*path):
+    return os.path.join(ROOT, *path)
+
+
+def find_files(rootdir, pattern, path_filter=None):
+    '''
+    Equivalent of `find -L <rootdir> -name <pattern>`, sorted
+    '''
+    found = []
+    for (dirpath, _, filenames) in os.walk(rootdir, followlinks=True):
+        for filename in fnmatch.filter(filenames, pattern):
+            path = os.path.join(dirpath, filename)
+            if path_filter is None or path_filter(path):
+                found.append(path)
+    return sorted(found)
+
+
+def is_reduced_image(path):
+    return 'skybkg' not in path and 'image' in path
+
+
+class QAJobBuilder(object):
+    '''
+    Declares the jobs for a pipeline run in `rootdir`, writing plots to
+    `<outputdir>/plots` and intermediate files to `<outputdir>/work`.
+    '''
+
+    def __init__(self, rootdir, outputdir, extension='png', timeout=None,
+                 launcher=(), reference=None, header_index=None):
+        self.rootdir = rootdir
+        self.outputdir = outputdir
+        self.plotsdir = os.path.join(outputdir, 'plots')
+        self.workdir = os.path.join(outputdir, 'work')
+        self.stampdir = os.path.join(self.workdir, 'stamps')
+        self.extension = extension
+        self.timeout = timeout
+        self.launcher = launcher
+        self.reference = reference
+        self.header_index = header_index
+        self.graph = JobGraph()
+
+        self.images_dir = os.path.join(rootdir, 'OriginalData', 'images')
+        self.reduction_dir = os.path.join(rootdir, 'Reduction', 'output')
+        self.photometry_dir = os.path.join(rootdir, 'AperturePhot', 'output')
+
+    @staticmethod
+    def plot_number(plot):
+        return PLOTS.index(plot) + 1
+
+    def plot_stub(self, plot):
+        return os.path.join(self.plotsdir, '{:02d}-{}'.format(
+            self.plot_number(plot), plot.split(':')[0]))
+
+    def plot_filename(self, plot):
+        return '{}.{}'.format(self.plot_stub(plot), self.extension)
+
+    def work_filename(self, name):
+        return os.path.join(self.workdir, name)
+
+    def filelist(self, name, filenames):
+        '''
+        Write a list of files for an extraction script to read. The file is
+        only rewritten if its contents change, so its modification time
+        can be used to check whether the extraction is up to date.
+        '''
+        fname = self.work_filename('{}.list'.format(name))
+        contents = ''.join('{}\n'.format(filename) for filename in filenames)
+        if os.path.isfile(fname):
+            with open(fname) as infile:
+                if infile.read() == contents:
+                    return fname
+
+        with open(fname, 'w') as outfile:
+            outfile.write(contents)
+        return fname
+
+    def add(self, name, command, inputs=(), **kwargs):
+        '''
+        Add a python script job. The script itself counts as an input, so
+        changing it reruns the job.
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('launcher', self.launcher)
+        kwargs.setdefault('stamp', os.path.join(
+            self.stampdir, '{}.stamp'.format(name.replace(':', '_'))))
+        return self.graph.add(Job(name, [sys.executable] + command,
+                                  inputs=[command[0]] + list(inputs),
+                                  **kwargs))
+
+    def build(self):
+        for directory in [self.plotsdir, self.workdir]:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        self.add_header_index_job()
+        self.add_reduction_jobs()
+        self.add_master_jobs()
+        self.add_photometry_jobs()
+        self.add_psf_jobs()
+        self.add_astrometry_jobs()
+        self.add_summary_jobs()
+        self.add_html_job()
+        return self.graph
+
+    def add_header_index_job(self):
+        if self.header_index is None:
+            return
+        self.add('header-index', [script('scripts', 'build_header_index.py'),
+                                  self.rootdir, '-o', self.header_index],
+                 inputs=find_indexed_files(self.rootdir),
+                 outputs=[self.header_index])
+
+    def reads_headers(self):
+        '''
+        Job arguments for a job reading headers, to run after the header
+        index is built, but whether or not it succeeds
+        '''
+        if self.header_index is None:
+            return {}
+        return {'depends_on': ['header-index'], 'require_success': False}
+
+    def add_extract_and_plot(self, extract_name, extract_script, files,
+                             extracted_name, plots, extra_inputs=(),
+                             extra_args=(), reads_headers=False):
+        '''
+        Add an extraction job reading `files`, writing a binary table in the
+        working directory, and the plot jobs reading it. `plots` is a list
+        of (plot, script).
+        '''
+        filelist = self.filelist(extracted_name.split('.')[0], files)
+        extracted = self.work_filename(extracted_name)
+        kwargs = self.reads_headers() if reads_headers else {}
+        self.add(extract_name, [extract_script, filelist, '-o', extracted,
+                                '--format', 'binary'] + list(extra_args),
+                 inputs=[filelist] + list(files) + list(extra_inputs),
+                 outputs=[extracted], **kwargs)
+        for (plot, plot_script) in plots:
+            output = self.plot_filename(plot)
+            self.add(plot, [plot_script, extracted, '-o', output],
+                     inputs=[extracted], outputs=[output],
+                     depends_on=[extract_name], hash_inputs=True)
+
+    def add_reduction_jobs(self):
+        '''
+        Each raw frame is read once, for the overscan and dark current plots
+        '''
+        self.add_extract_and_plot(
+            'scan-raw-frames',
+            script('reduction', 'scan_raw_frames.py'),
+            find_files(self.images_dir, 'IMAGE*.fits*'),
+            'raw_frames.table',
+            [('overscan-levels', script('reduction',
+                                        'plot_overscan_levels.py')),
+             ('dark-levels', script('reduction', 'plot_dark_current.py')),
+             ('dark-correlation', script('reduction',
+                                         'plot_dark_current_correlation.py'))])
+
+        flat_total = find_files(self.reduction_dir, 'flat_total.fits')
+        if flat_total:
+            output = self.plot_filename('flat-total-adu')
+            self.add('flat-total-adu',
+                     [script('reduction', 'plot_total_flat_adu.py'),
+                      flat_total[0], '-o', output],
+                     inputs=flat_total[:1], outputs=[output])
+        else:
+            logger.warning('Cannot find flat totals file flat_total.fits')
+
+    def add_master_jobs(self):
+        for frame_type in ['bias', 'dark', 'flat']:
+            plot = 'm{}'.format(frame_type)
+            masters = find_files(
+                self.reduction_dir, '*.fits',
+                lambda path: 'master{}'.format(frame_type) in
+                os.path.basename(path).lower())
+            if not masters:
+                logger.warning('Cannot find master %s file', frame_type)
+                continue
+
+            stub = self.plot_stub(plot)
+            self.add(plot, [script('scripts', 'plot_hist_equalised.py'),
+                            masters[0], '--stub', stub,
+                            '--ext', self.extension],
+                     inputs=masters[:1],
+                     outputs=['{}.{}'.format(stub, self.extension)])
+
+    def add_photometry_jobs(self):
+        '''
+        Photometry plots are rendered in one job per hdu, so each flux hdu
+        is read once
+        '''
+        fluxfiles = find_files(self.photometry_dir, 'output.fits')
+        if not fluxfiles:
+            logger.warning('No flux file found')
+            return
+        fluxfile = fluxfiles[0]
+
+        groups = {}
+        for plot in PLOTS:
+            name, _, hdu = plot.partition(':')
+            if name in PHOTOMETRY_PLOTS:
+                groups.setdefault(hdu, []).append(plot)
+
+        if os.environ.get('TESTQA'):
+            logger.info('RMS with binning test disabled; it does not work '
+                        'with this data set')
+
+        # The frame metadata of the brightness binning plot is the same for
+        # every hdu, so it is extracted once before the hdu jobs
+        metadata = None
+        if any(plot.startswith('binned-lightcurves') for plots in
+               groups.values() for plot in plots):
+            reduced_files = [fname[:-len('.phot')] for fname in
+                             find_files(self.reduction_dir, 'proc*.phot')]
+            filelist = self.filelist('frame_metadata', reduced_files)
+            metadata = self.work_filename('frame_metadata.table')
+            self.add('extract-frame-metadata',
+                     [script('photometry', 'extract_frame_metadata.py'),
+                      filelist, '-o', metadata, '--format', 'binary'],
+                     inputs=[filelist] + reduced_files, outputs=[metadata],
+                     **self.reads_headers())
+
+        for hdu, plots in sorted(groups.items()):
+            if os.environ.get('TESTQA'):
+                plots = [plot for plot in plots
+                         if not plot.startswith('rms-with-binning')]
+            command = [script('photometry', 'render_photometry_plots.py'),
+                       fluxfile]
+            outputs = []
+            for plot in plots:
+                output = self.plot_filename(plot)
+                command.extend(['--plot', '{}={}'.format(plot, output)])
+                outputs.append(output)
+
+            inputs = [fluxfile]
+            kwargs = {}
+            if any(plot.startswith('binned-lightcurves') for plot in plots):
+                # The other plots still render if the extraction fails
+                command.extend(['-m', metadata])
+                inputs.append(metadata)
+                kwargs = {'depends_on': ['extract-frame-metadata'],
+                          'require_success': False}
+
+            self.add('photometry:{}'.format(hdu) if hdu else 'photometry',
+                     command, inputs=inputs, outputs=outputs, **kwargs)
+
+    def add_psf_jobs(self):
+        self.add_extract_and_plot(
+            'extract-psf-measurements',
+            script('photometry', 'extract_psf_measurements.py'),
+            find_files(self.reduction_dir, 'proc*.phot'),
+            'psf_measurements.table',
+            [('psf-measurements', script('photometry',
+                                         'plot_psf_measurements.py')),
+             ('psf-ratios', script('photometry', 'plot_psf_ratios.py'))],
+            reads_headers=True)
+
+    def add_astrometry_jobs(self):
+        reduced_images = find_files(self.reduction_dir, 'proc*.fits',
+                                    is_reduced_image)
+        self.add_extract_and_plot(
+            'extract-wcs-parameters',
+            script('astrometry', 'extract_wcs_parameters.py'),
+            reduced_images,
+            'wcs_parameters.table',
+            [('extracted-astrometric-parameters',
+              script('astrometry', 'plot_astrometric_parameters.py'))],
+            reads_headers=True)
+
+        if reduced_images:
+            output = self.plot_filename('field-rotation')
+            self.add('field-rotation',
+                     [script('external', 'field-rotation', 'run_on_files.py'),
+                      '-o', os.devnull, os.path.dirname(reduced_images[0]),
+                      '-p', output],
+                     inputs=reduced_images, outputs=[output])
+
+        if self.reference is not None:
+            self.add_extract_and_plot(
+                'match-frames',
+                script('astrometry', 'match_frames.py'),
+                find_files(self.reduction_dir, 'proc*.phot'),
+                'astrometric_residuals.table',
+                [('astrometric-residuals',
+                  script('astrometry', 'plot_astrometric_residuals.py'))],
+                extra_inputs=[self.reference],
+                extra_args=['--2mass', self.reference])
+
+    def add_summary_jobs(self):
+        pngs = find_files(self.reduction_dir, '*.png')
+        for (stub, offset, png_filter) in SUMMARIES:
+            filelist = self.filelist('summary-{}'.format(stub),
+                                     [fname for fname in pngs
+                                      if png_filter(fname)])
+            self.add('summary:{}'.format(stub),
+                     [script('scripts', 'copy_pngs.py'), filelist,
+                      '-o', self.plotsdir, '--stub', stub,
+                      '--plot-index-offset', offset])
+
+    def add_html_job(self):
+        self.add('html', [script('view', 'build_html.py'), self.outputdir,
+                          '-o', os.path.join(self.outputdir, 'index.html'),
+                          '--extension', self.extension],
+                 depends_on=[job.name for job in self.graph.jobs],
+                 require_success=False)
+
+
+def summarise(results):
+    for status in [JobResult.SUCCESS, JobResult.UP_TO_DATE, JobResult.FAILED,
+                   JobResult.SKIPPED]:
+        names = sorted(name for name, result in results.items()
+                       if result.status == status)
+        if names:
+            logger.info('%s: %s', status.capitalize(), ', '.join(names))
+
+
+@contextmanager
+def qa_worker(enabled, startup_timeout=120):
+    '''
+    Start a persistent worker for the QA scripts, yielding the launcher to
+    run jobs through it, or no launcher if `enabled` is false or the worker
+    does not start
+    '''
+    if not enabled:
+        yield ()
+        return
+
+    # Unix socket paths are limited to ~100 characters, so not in outputdir
+    socket_dir = tempfile.mkdtemp(prefix='qa-worker-')
+    path = os.path.join(socket_dir, 'worker.sock')
+    worker_script = script('scripts', 'qa_worker.py')
+    process = sp.Popen([sys.executable, worker_script, 'serve',
+                        '--socket', path])
+    try:
+        deadline = time.time() + startup_timeout
+        while (not os.path.exists(path) and process.poll() is None and
+               time.time() < deadline):
+            time.sleep(0.1)
+
+        if os.path.exists(path):
+            logger.info('Running scripts in worker %s', path)
+            yield (sys.executable, worker_script, 'run', '--socket', path)
+        else:
+            logger.warning('Worker did not start, running scripts directly')
+            yield ()
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def main(args):
+    rootdir = os.path.realpath(args.rootdir)
+    outputdir = os.path.realpath(args.outputdir)
+    if not os.path.isdir(rootdir):
+        logger.error('Cannot find directory %s', rootdir)
+        sys.exit(1)
+
+    # Scripts read templates etc. relative to this directory
+    os.chdir(ROOT)
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [path for path in [os.environ.get('PYTHONPATH')] if path])
+
+    # Extraction scripts cache their per-file results here
+    if not args.no_cache:
+        os.environ[CACHE_ENV] = os.path.realpath(
+            args.cache or os.path.join(outputdir, 'work', 'cache.sqlite'))
+        os.environ[CACHE_SIZE_ENV] = str(int(args.cache_size * 1024 ** 2))
+
+    # Extraction scripts read header cards from this index
+    header_index = None
+    if not args.no_header_index:
+        header_index = os.path.join(outputdir, 'work', 'headers.sqlite')
+        os.environ[INDEX_ENV] = header_index
+
+    # Scripts append their timings to a file per run
+    run_id = '{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), os.getpid())
+    os.environ[RUN_ENV] = run_id
+    os.environ[TIMING_ENV] = os.path.join(outputdir, 'work', 'timing',
+                                          '{}.jsonl'.format(run_id))
+    if args.profile:
+        os.environ[PROFILE_ENV] = os.path.realpath(args.profile)
+
+    reference = os.path.realpath(args.reference) if args.reference else None
+    if args.list:
+        graph = QAJobBuilder(rootdir, outputdir, extension=args.extension,
+                             timeout=args.timeout, reference=reference,
+                             header_index=header_index).build()
+        for job in graph.topological_order():
+            print(job.name, ' '.join(job.command))
+        return
+
+    with qa_worker(args.worker) as launcher:
+        graph = QAJobBuilder(rootdir, outputdir, extension=args.extension,
+                             timeout=args.timeout, launcher=launcher,
+                             reference=reference,
+                             header_index=header_index).build()
+        logger.info('Running %s jobs with %s workers', len(graph.jobs),
+                    args.jobs)
+        results = graph.run(nworkers=args.jobs, force=args.force)
+    summarise(results)
+    if os.path.isfile(os.environ[TIMING_ENV]):
+        logger.info('Timings written to %s', os.environ[TIMING_ENV])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('rootdir', help='Pipeline run directory')
+    parser.add_argument('outputdir', help='QA output directory')
+    parser.add_argument('-j', '--jobs', type=int, default=mp.cpu_count(),
+                        help='Number of jobs to run at once '
+                        '[default: number of cpus]')
+    parser.add_argument('-t', '--timeout', type=float, default=None,
+                        help='Kill any job running longer than this many '
+                        'seconds [default: no limit]')
+    parser.add_argument('-e', '--extension', default='png',
+                        help='Plot file extension [default: png]')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Rerun jobs which are up to date')
+    parser.add_argument('--cache', required=False,
+                        help='Per-file extraction cache '
+                        '[default: <outputdir>/work/cache.sqlite]')
+    parser.add_argument('--cache-size', type=float, default=1024,
+                        help='Maximum cache size in MB [default: 1024]')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not cache per-file extraction results')
+    parser.add_argument('--no-header-index', action='store_true',
+                        help='Do not index the frame headers; the extraction '
+                        'scripts read every file')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run the scripts in a persistent worker process, '
+                        'so modules are imported once per run')
+    parser.add_argument('--profile', required=False, metavar='DIR',
+                        help='Write a cProfile dump of every script to DIR')
+    parser.add_argument('--2mass', dest='reference', required=False,
+                        help='2MASS catalogue from fetch_2mass.py; match '
+                        'every frame with it and plot the astrometric '
+                        'residuals')
+    parser.add_argument('--list', action='store_true',
+                        help='Print the jobs in dependency order and exit')
+    main(parser.parse_args())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Index the FITS headers of the raw and reduced frames of a pipeline run, for
+the extraction scripts to read instead of the files. Only files which are
+new or have changed since the last run are read.
+'''
+
+import argparse
+import os
+from multiprocessing.pool import ThreadPool
+from qa_common import get_logger
+from qa_common.instrument import instrumented, stage
+from qa_common.header_index import (HeaderIndex, INDEX_ENV,
+                                    find_indexed_files)
+
+logger = get_logger(__file__)
+
+
+@instrumented
+def main(args):
+    files = find_indexed_files(args.rootdir)
+    logger.info('Indexing %s files into %s', len(files), args.index)
+
+    index = HeaderIndex(args.index)
+    pool = ThreadPool(args.threads)
+    with stage('index'):
+        try:
+            nread = index.update(files, mapper=pool.imap)
+        finally:
+            index.close()
+            pool.close()
+            pool.join()
+    logger.info('Read %s files', nread)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('rootdir', help='Pipeline run directory')
+    parser.add_argument('-o', '--index', default=os.environ.get(INDEX_ENV),
+                        help='Index database [default: ${}]'.format(INDEX_ENV))
+    parser.add_argument('-t', '--threads', type=int, default=8,
+                        help='Number of threads reading headers [default: 8]')
+    args = parser.parse_args()
+    if not args.index:
+        parser.error('No index given, and ${} is not set'.format(INDEX_ENV))
+    main(args)
@@ -5,6 +5,7 @@ import argparse
 import os
 import shutil
 from qa_common import get_logger
+from qa_common.instrument import instrumented
 
 logger = get_logger(__file__)
 
@@ -16,6 +17,7 @@ def copy_file(i, fname, outputdir, stub):
     else:
         logger.debug('File %s exists, skipping', output_filename)
 
+@instrumented
 def main(args):
     with open(args.filelist) as infile:
         files = [line.strip() for line in infile]
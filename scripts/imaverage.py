@@ -6,7 +6,9 @@ import numpy as np
 import argparse
 import sys
 from qa_common import get_logger
+from qa_common.instrument import instrumented
 
+@instrumented
 def main(logger, args):
     logger.debug(args=args)
     nfiles = len(args.file)
@@ -7,6 +7,7 @@ import argparse
 import os
 
 from qa_common import get_logger
+from qa_common.instrument import instrumented
 from qa_common.plotting import plt
 
 logger = get_logger(__file__)
@@ -22,6 +23,7 @@ def histogram_equalise(image, nbins=256):
     return im2
 
 
+@instrumented
 def main(args):
     nbins = 256
     logger.debug('Reading data from %s, nbins: %s', args.filename, nbins)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Run QA scripts in a persistent worker, so numpy, matplotlib, fitsio etc.
+are imported once per QA run rather than once per script.
+
+`qa_worker.py serve --socket <path>` imports the heavy modules and listens on
+a unix socket. Each request is handled in a forked child, which forks again
+to run the script with `runpy` in the requested directory and environment,
+and streams its output back.
+
+`qa_worker.py run --socket <path> python script.py [args...]` sends a script
+invocation to the worker, copies its output to stdout and stderr and exits
+with its exit code. It only imports the standard library, so it starts
+quickly. If the worker cannot be reached the script is run directly. Killing
+the client kills the script, and any processes it started, such as a
+`multiprocessing.Pool`: each script runs in its own process group.
+'''
+
+from __future__ import division, print_function, absolute_import
+import argparse
+import errno
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+
+# Modules imported by the worker before it accepts any requests
+PRELOAD = ['numpy', 'scipy.stats', 'scipy.optimize', 'fitsio',
+           'astropy.io.fits', 'astropy.wcs', 'astropy.coordinates',
+           'qa_common', 'qa_common.photometry_file', 'qa_common.plotting']
+
+STDOUT, STDERR, EXIT = b'o', b'e', b'x'
+FRAME_HEADER = struct.Struct('>cI')
+CHUNK_SIZE = 64 * 1024
+
+
+def send_frame(conn, channel, payload):
+    conn.sendall(FRAME_HEADER.pack(channel, len(payload)) + payload)
+
+
+def recv_exactly(conn, nbytes):
+    data = b''
+    while len(data) < nbytes:
+        chunk = conn.recv(nbytes - len(data))
+        if not chunk:
+            raise EOFError('Worker closed the connection')
+        data += chunk
+    return data
+
+
+def binary_stream(stream):
+    return getattr(stream, 'buffer', stream)
+
+
+def run_remote(path, command):
+    '''
+    Run `command` (a python script and its arguments) in the worker at
+    `path`, returning its exit code
+    '''
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(path)
+    request = {'argv': command, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+    # The request is one line; the connection stays open so the worker can
+    # tell if this process is killed
+    conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+
+    outputs = {STDOUT: binary_stream(sys.stdout),
+               STDERR: binary_stream(sys.stderr)}
+    while True:
+        channel, length = FRAME_HEADER.unpack(
+            recv_exactly(conn, FRAME_HEADER.size))
+        payload = recv_exactly(conn, length)
+        if channel == EXIT:
+            return int(payload.decode('ascii'))
+        outputs[channel].write(payload)
+        outputs[channel].flush()
+
+
+def client_main(args):
+    command = list(args.command)
+    interpreter = sys.executable
+    if command and not command[0].endswith('.py'):
+        interpreter = command.pop(0)
+    if not command:
+        raise SystemExit('No script given')
+
+    try:
+        returncode = run_remote(args.socket, command)
+    except (socket.error, EOFError) as err:
+        sys.stderr.write('Cannot use worker {}: {}, running {} directly\n'.format(
+            args.socket, err, command[0]))
+        sys.stderr.flush()
+        os.execvp(interpreter, [interpreter] + command)
+    sys.exit(returncode)
+
+
+def exit_code(value):
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    sys.stderr.write('{}\n'.format(value))
+    return 1
+
+
+def native(value):
+    '''
+    json strings are unicode; python 2 wants byte strings for paths, the
+    environment and argv
+    '''
+    if isinstance(value, str):
+        return value
+    return value.encode('utf-8')
+
+
+def run_script(request):
+    '''
+    Run the requested script as `__main__` in this process, returning its
+    exit code
+    '''
+    argv = [native(arg) for arg in request['argv']]
+    os.chdir(native(request['cwd']))
+    os.environ.clear()
+    os.environ.update((native(key), native(value))
+                      for (key, value) in request['env'].items())
+
+    script_path = os.path.realpath(argv[0])
+    extra_paths = [entry for entry in
+                   os.environ.get('PYTHONPATH', '').split(os.pathsep) if entry]
+    sys.path[:] = ([os.path.dirname(script_path)] + extra_paths +
+                   [entry for entry in sys.path[1:]
+                    if entry not in extra_paths])
+    sys.argv = list(argv)
+
+    # Forked scripts would otherwise share the worker's random state
+    import random
+    random.seed()
+    if 'numpy' in sys.modules:
+        sys.modules['numpy'].random.seed()
+
+    import runpy
+    import traceback
+    try:
+        runpy.run_path(argv[0], run_name='__main__')
+        return 0
+    except SystemExit as err:
+        return exit_code(err.code)
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def decode_status(status):
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def handle(conn):
+    '''
+    Read a request from `conn`, run it in a child process and stream its
+    output back
+    '''
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+    request = json.loads(data.decode('utf-8'))
+
+    out_read, out_write = os.pipe()
+    err_read, err_write = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        # A process group of its own, so pool workers the script starts are
+        # killed with it
+        os.setsid()
+        conn.close()
+        os.dup2(out_write, 1)
+        os.dup2(err_write, 2)
+        for fd in [out_read, out_write, err_read, err_write]:
+            os.close(fd)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        returncode = run_script(request)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(returncode)
+
+    os.close(out_write)
+    os.close(err_write)
+    channels = {out_read: STDOUT, err_read: STDERR}
+    try:
+        while channels:
+            readable = select.select(list(channels) + [conn], [], [])[0]
+            if conn in readable and not conn.recv(1):
+                raise EOFError('Client disconnected')
+            for fd in readable:
+                if fd not in channels:
+                    continue
+                payload = os.read(fd, CHUNK_SIZE)
+                if payload:
+                    send_frame(conn, channels[fd], payload)
+                else:
+                    os.close(fd)
+                    del channels[fd]
+        _, status = os.waitpid(pid, 0)
+        send_frame(conn, EXIT, str(decode_status(status)).encode('ascii'))
+    except (socket.error, EOFError):
+        # The client was killed, e.g. by a timeout, so stop the script and
+        # its children
+        os.killpg(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def preload(modules, logger):
+    import importlib
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as err:
+            logger.warning('Cannot preload %s: %s', name, err)
+    if 'qa_common.plotting' in modules:
+        # Import pyplot and apply the QA style now rather than in every script
+        from qa_common.plotting import plt
+        plt.figure
+    logger.info('Preloaded %s modules', len(sys.modules))
+
+
+def reap_children():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except OSError as err:
+            if err.errno == errno.ECHILD:
+                return
+            raise
+        if pid == 0:
+            return
+
+
+def serve(path, modules=PRELOAD):
+    from qa_common import get_logger
+    logger = get_logger(__file__)
+    preload(modules, logger)
+
+    if os.path.exists(path):
+        os.remove(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(64)
+    listener.settimeout(1.)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    logger.info('Listening on %s', path)
+    try:
+        while True:
+            reap_children()
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except socket.error as err:
+                if err.errno == errno.EINTR:
+                    continue
+                raise
+
+            conn.settimeout(None)
+            pid = os.fork()
+            if pid == 0:
+                listener.close()
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                try:
+                    handle(conn)
+                except Exception:
+                    logger.exception('Cannot handle request')
+                finally:
+                    os._exit(0)
+            conn.close()
+    except KeyboardInterrupt:
+        logger.info('Stopping worker')
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main(args):
+    if args.action == 'serve':
+        serve(args.socket)
+    else:
+        client_main(args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    subparsers = parser.add_subparsers(dest='action')
+    serve_parser = subparsers.add_parser('serve', help='Start a worker')
+    serve_parser.add_argument('-s', '--socket', required=True,
+                              help='Unix socket to listen on')
+    run_parser = subparsers.add_parser('run', help='Run a script in a worker')
+    run_parser.add_argument('-s', '--socket', required=True,
+                            help='Unix socket of the worker')
+    run_parser.add_argument('command', nargs=argparse.REMAINDER,
+                            help='python script.py [args...]')
+    main(parser.parse_args())
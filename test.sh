@@ -9,12 +9,18 @@ cleanup_temp_files() {
 }
 
 main() {
-    local readonly rootdir=../zlp-script/testdata
+    local rootdir=${QA_TESTDATA:-../zlp-script/testdata}
     local readonly plotdir=plots
 
     test -d ${plotdir} && rm -rf ${plotdir}
     cleanup_temp_files
 
+    if [ ! -d "${rootdir}" ]; then
+        echo "Cannot find ${rootdir}, using synthetic data" >&2
+        rootdir=${TMPDIR}/synthetic-run
+        python benchmarks/synthetic.py ${rootdir}
+    fi
+
     DISABLE_ANACONDA=true TESTQA=true bash ./run.sh ${rootdir} ${plotdir} 2>&1 | tee test.log
 }
 
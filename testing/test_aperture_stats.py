@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+fitsio = pytest.importorskip('fitsio')
+
+
+@pytest.fixture
+def filename(tmpdir):
+    fname = str(tmpdir.join('output.fits'))
+    flux = np.random.RandomState(1).uniform(10, 1000, size=(37, 25))
+    with fitsio.FITS(fname, 'rw', clobber=True) as outfile:
+        outfile.write(flux, extname='FLUX')
+    return fname
+
+
+@pytest.mark.parametrize('max_bytes', [1, 2000, None])
+def test_chunked_statistics_match_full_matrix(filename, max_bytes):
+    from qa_common.photometry_file import PhotometryFile
+    from qa_common.aperture_stats import aperture_statistics
+    scale = np.linspace(1, 2, 25)
+    with PhotometryFile.open(filename) as infile:
+        stats = aperture_statistics(infile, 'flux', percentiles=[25, 75],
+                                    scale=scale, max_bytes=max_bytes)
+        flux = infile.read('flux') / scale
+
+    assert np.allclose(stats['mean'], flux.mean(axis=1))
+    assert np.allclose(stats['median'], np.median(flux, axis=1))
+    assert np.allclose(stats['std'], flux.std(axis=1))
+    assert np.allclose(stats['p75'], np.percentile(flux, 75, axis=1))
+
+
+def test_iter_rows_does_not_cache(filename):
+    from qa_common.photometry_file import PhotometryFile
+    with PhotometryFile.open(filename) as infile:
+        blocks = list(infile.iter_rows('flux', 10))
+        assert [rows.stop for (rows, _) in blocks] == [10, 20, 30, 37]
+        assert infile._cache == {}
+
+
+def test_shared_iter_rows_fills_the_cache(filename):
+    from qa_common.photometry_file import PhotometryFile
+    shared = PhotometryFile.shared(filename)
+    try:
+        blocks = list(shared.iter_rows('flux', 10))
+        flux = shared.read('flux')
+        assert ('flux', None) in shared._cache
+        assert np.all(np.concatenate([block for (_, block) in blocks]) == flux)
+    finally:
+        shared.close()
+
+
+def test_shared_iter_rows_streams_large_hdus(filename, monkeypatch):
+    from qa_common.photometry_file import PhotometryFile
+    # 37 x 25 doubles do not fit in 1 kB
+    monkeypatch.setenv('QA_CHUNK_MEMORY', '0.001')
+    shared = PhotometryFile.shared(filename)
+    try:
+        blocks = list(shared.iter_rows('flux', 10))
+        assert [rows.stop for (rows, _) in blocks] == [10, 20, 30, 37]
+        assert shared._cache == {}
+    finally:
+        shared.close()
@@ -0,0 +1,104 @@
+import pytest
+import io
+import numpy as np
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.binary_table import (write_table, parse_binary,
+                                    records_from_rows, MAGIC)
+from qa_common.csv_container import CSVContainer
+
+
+@pytest.fixture
+def rows():
+    return [
+        {'mjd': 2.5, 'image_id': 2, 'fname': 'b.fits', 'roof_open': False},
+        {'mjd': 1.5, 'image_id': 1, 'fname': 'aa.fits', 'roof_open': True},
+    ]
+
+
+KEYS = ['mjd', 'image_id', 'fname', 'roof_open']
+
+
+def test_binary_round_trip(rows):
+    outfile = io.BytesIO()
+    write_table(outfile, rows, KEYS, format='binary')
+    content = bytearray(outfile.getvalue())
+    assert content.startswith(MAGIC)
+
+    records = parse_binary(content)
+    assert list(records.dtype.names) == KEYS
+    assert np.all(records['mjd'] == [2.5, 1.5])
+    assert records['image_id'].dtype.kind == 'i'
+    assert list(records['fname']) == [b'b.fits', b'aa.fits']
+    assert list(records['roof_open']) == [False, True]
+
+
+def test_rows_as_sequences(rows):
+    sequences = [[row[key] for key in KEYS] for row in rows]
+    assert np.all(records_from_rows(sequences, KEYS) ==
+                  records_from_rows(rows, KEYS))
+
+
+def test_mixed_values_stored_as_strings():
+    records = records_from_rows([{'value': 1.}, {'value': None}], ['value'])
+    assert list(records['value']) == [b'1.0', b'None']
+
+
+def test_empty_table():
+    outfile = io.BytesIO()
+    write_table(outfile, [], ['mjd'], format='binary')
+    records = parse_binary(bytearray(outfile.getvalue()))
+    assert records.size == 0 and records.dtype.names == ('mjd', )
+
+
+def test_unknown_format(rows):
+    with pytest.raises(ValueError):
+        write_table(io.BytesIO(), rows, KEYS, format='fits')
+
+
+@pytest.mark.parametrize('format', ['csv', 'binary'])
+def test_container_reads_either_format(tmpdir, rows, format):
+    filename = str(tmpdir.join('data.table'))
+    with open(filename, 'wb' if format == 'binary' else 'w') as outfile:
+        write_table(outfile, rows, KEYS, format=format)
+
+    container = CSVContainer.from_filename(
+        filename, key_type_map={'roof_open': CSVContainer.bool_converter})
+    assert container.keys == KEYS
+    assert np.all(container.mjd == [1.5, 2.5])
+    assert np.all(container.image_id == [1, 2])
+    assert list(container.roof_open) == [True, False]
+
+    # Columns can be modified in place, as the plot scripts do
+    container.mjd -= 1
+    assert np.all(container.mjd == [0.5, 1.5])
+
+
+def test_binary_chunks(rows):
+    many = [dict(row, image_id=i) for i in range(5) for row in rows]
+    outfile = io.BytesIO()
+    write_table(outfile, iter(many), KEYS, format='binary', chunk_size=3)
+
+    records = parse_binary(bytearray(outfile.getvalue()))
+    assert records.size == 10
+    assert records.dtype['image_id'] == np.dtype('<i8')
+    assert records.dtype['roof_open'] == np.dtype('?')
+    assert records.dtype['mjd'] == np.dtype('<f8')
+    assert list(records['image_id']) == [i for i in range(5) for _ in rows]
+    assert list(records['fname'][:2]) == [b'b.fits', b'aa.fits']
+
+
+def test_binary_chunks_reject_longer_strings(rows):
+    many = rows * 2 + [dict(rows[0], fname='a_longer_name.fits')]
+    outfile = io.BytesIO()
+    with pytest.raises(ValueError):
+        write_table(outfile, many, KEYS, format='binary', chunk_size=2)
+    # Nothing is written, rather than a truncated table
+    assert outfile.getvalue() == b''
+
+
+def test_binary_chunks_reject_floats_in_integer_columns(rows):
+    many = rows * 2 + [dict(rows[0], image_id=1.5)]
+    with pytest.raises(ValueError):
+        write_table(io.BytesIO(), many, KEYS, format='binary', chunk_size=2)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.binning import block_reduce, CumulativeMeanBinner
+
+
+@pytest.fixture
+def flux():
+    return np.random.RandomState(42).uniform(100, 200, size=(5, 103))
+
+
+@pytest.mark.parametrize('size', [1, 3, 10, 50])
+def test_block_statistics_match_per_star_loop(flux, size):
+    nblocks = flux.shape[1] // size
+    for (statistic, fn) in [('median', np.median), ('mean', np.mean)]:
+        expected = np.array([[fn(lc[i * size:(i + 1) * size])
+                              for i in range(nblocks)] for lc in flux])
+        assert np.allclose(block_reduce(flux, size, statistic), expected)
+
+
+def test_cumulative_mean_matches_block_mean(flux):
+    binner = CumulativeMeanBinner(flux)
+    for size in [1, 2, 7, 34, 103]:
+        assert np.allclose(binner(size), block_reduce(flux, size, 'mean'))
+
+
+def test_unknown_statistic(flux):
+    with pytest.raises(ValueError):
+        block_reduce(flux, 2, 'mode')
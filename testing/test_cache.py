@@ -0,0 +1,140 @@
+import os
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.cache import FileMemo, NullMemo, inputs_digest, open_memo
+
+
+def test_only_uncached_files_are_computed(tmpdir):
+    fnames = []
+    for i in range(3):
+        path = tmpdir.join('{}.txt'.format(i))
+        path.write(str(i))
+        fnames.append(str(path))
+
+    calls = []
+
+    def extract(fname):
+        calls.append(fname)
+        return int(open(fname).read()) or None
+
+    memo = FileMemo(str(tmpdir.join('cache.sqlite')), 'test')
+    assert memo.map(extract, fnames) == [None, 1, 2]
+    assert memo.map(extract, fnames) == [None, 1, 2]
+    assert calls == fnames
+
+    # Changing the size or modification time invalidates the result
+    tmpdir.join('1.txt').write('10')
+    assert memo.map(extract, fnames) == [None, 10, 2]
+    assert calls == fnames + [fnames[1]]
+    memo.close()
+
+
+def test_namespaces_are_separate(tmpdir):
+    fname = tmpdir.join('a.txt')
+    fname.write('a')
+    path = str(tmpdir.join('cache.sqlite'))
+    FileMemo(path, 'one').map(lambda fname: 1, [str(fname)])
+    assert FileMemo(path, 'two').map(lambda fname: 2, [str(fname)]) == [2]
+
+
+def test_eviction(tmpdir):
+    fnames = []
+    for i in range(10):
+        path = tmpdir.join('{}.txt'.format(i))
+        path.write(str(i))
+        fnames.append(str(path))
+
+    memo = FileMemo(str(tmpdir.join('cache.sqlite')), 'test', max_bytes=2000)
+    memo.map(lambda fname: 'x' * 500, fnames)
+    assert memo.total_bytes() <= 2000
+
+
+def test_inputs_digest_content_hash(tmpdir):
+    fname = tmpdir.join('a.txt')
+    fname.write('a')
+    digest = inputs_digest([str(fname)], hash_contents=True)
+    os.utime(str(fname), (0, 0))
+    assert inputs_digest([str(fname)], hash_contents=True) == digest
+    assert inputs_digest([str(fname)]) != inputs_digest([str(fname)],
+                                                        hash_contents=True)
+
+    fname.write('b')
+    assert inputs_digest([str(fname)], extra=['x']) != inputs_digest(
+        [str(fname)], extra=['y'])
+
+
+def test_no_cache_configured(monkeypatch):
+    monkeypatch.delenv('QA_CACHE', raising=False)
+    memo = open_memo('test')
+    assert isinstance(memo, NullMemo)
+    assert memo.map(len, ['ab', 'c']) == [2, 1]
+
+
+def test_imap_yields_cached_results_first(tmpdir):
+    fnames = []
+    for i in range(4):
+        path = tmpdir.join('{}.txt'.format(i))
+        path.write(str(i))
+        fnames.append(str(path))
+
+    def extract(fname):
+        return int(open(fname).read())
+
+    memo = FileMemo(str(tmpdir.join('cache.sqlite')), 'test')
+    memo.map(extract, fnames[2:])
+    assert list(memo.imap(extract, fnames)) == [2, 3, 0, 1]
+    assert list(memo.imap(lambda fname: None, fnames)) == [0, 1, 2, 3]
+    memo.close()
+
+
+def test_cache_is_not_locked_while_computing(tmpdir):
+    fnames = []
+    for i in range(3):
+        path = tmpdir.join('{}.txt'.format(i))
+        path.write(str(i))
+        fnames.append(str(path))
+    path = str(tmpdir.join('cache.sqlite'))
+    memo = FileMemo(path, 'test')
+    memo.map(len, fnames[:1])
+
+    def extract(fname):
+        # Another job writing to the cache must not wait for this one
+        other = FileMemo(path, 'other')
+        other.connection.execute('pragma busy_timeout = 100')
+        other.map(len, [fname])
+        other.close()
+        return 1
+
+    assert memo.map(extract, fnames) == [len(fnames[0]), 1, 1]
+    assert sorted(memo.imap(extract, fnames)) == [1, 1, len(fnames[0])]
+    memo.close()
+
+
+def test_changing_the_extractor_source_invalidates(tmpdir):
+    fname = tmpdir.join('a.txt')
+    fname.write('a')
+    path = str(tmpdir.join('cache.sqlite'))
+    source = tmpdir.join('extractor.py')
+    source.write('version = 1\n')
+
+    def cached(value):
+        memo = open_memo('test', path, source=str(source))
+        try:
+            return memo.map(lambda fname: value, [str(fname)])[0]
+        finally:
+            memo.close()
+
+    assert cached(1) == 1
+    assert cached(2) == 1
+    source.write('version = 2\n')
+    assert cached(2) == 2
+
+
+def test_namespace_defaults_to_the_calling_module(tmpdir):
+    memo = open_memo('test', str(tmpdir.join('cache.sqlite')))
+    try:
+        assert memo.namespace.startswith('test.')
+        assert memo.namespace != 'test.unknown'
+    finally:
+        memo.close()
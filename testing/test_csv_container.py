@@ -1,5 +1,6 @@
 import pytest
 import csv
+import os
 import numpy as np
 import sys
 sys.path.insert(0, '.')
@@ -61,3 +62,79 @@ def test_booleans_survive(tmpdir):
     container = CSVContainer.from_filename(str(outfile_name),
             key_type_map={'roof_open': CSVContainer.bool_converter})
     assert np.all(container.roof_open == np.array([True, True, False])).all()
+
+
+def test_select_rows(tmpdir):
+    from qa_common.csv_container import CSVContainer
+    outfile_name = tmpdir.join('data.csv')
+    with open(str(outfile_name), 'w') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['mjd', 'dark'])
+        writer.writeheader()
+
+        mjd = [1, 2, 3]
+        dark = [1.5, np.nan, 2.5]
+
+        for (a, b) in zip(mjd, dark):
+            writer.writerow({'mjd': a, 'dark': b})
+
+    container = CSVContainer.from_filename(str(outfile_name))
+    container.select(np.isfinite(container.dark))
+    assert (np.all(container.mjd == [1, 3]) and
+            np.all(container.dark == [1.5, 2.5]))
+
+
+def test_numeric_sort(tmpdir):
+    from qa_common.csv_container import CSVContainer
+    outfile_name = tmpdir.join('data.csv')
+    with open(str(outfile_name), 'w') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['mjd', 'value'])
+        writer.writeheader()
+
+        for (a, b) in zip([10, 9, 100], [1, 2, 3]):
+            writer.writerow({'mjd': a, 'value': b})
+
+    container = CSVContainer.from_filename(str(outfile_name))
+    assert (np.all(container.mjd == [9, 10, 100]) and
+            np.all(container.value == [2, 1, 3]))
+
+
+def test_string_columns(tmpdir):
+    from qa_common.csv_container import CSVContainer
+    outfile_name = tmpdir.join('data.csv')
+    with open(str(outfile_name), 'w') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['mjd', 'fname'])
+        writer.writeheader()
+
+        for (a, b) in zip([2, 1], ['b.fits', 'a.fits']):
+            writer.writerow({'mjd': a, 'fname': b})
+
+    container = CSVContainer.from_filename(str(outfile_name))
+    assert container.mjd.dtype == float
+    assert list(container['fname']) == ['a.fits', 'b.fits']
+
+
+def test_sidecar_used_until_csv_changes(tmpdir):
+    from qa_common.csv_container import CSVContainer
+    outfile_name = str(tmpdir.join('data.csv'))
+    with open(outfile_name, 'w') as outfile:
+        outfile.write('mjd,roof_open\n2,False\n1,True\n')
+
+    kwargs = {'key_type_map': {'roof_open': CSVContainer.bool_converter}}
+    first = CSVContainer.from_filename(outfile_name, **kwargs)
+    sidecar = CSVContainer.sidecar_filename(outfile_name)
+    assert tmpdir.join('data.csv.columns.npz').check()
+
+    # Read from the sidecar, not the csv
+    with open(outfile_name) as infile:
+        infile.read()
+        second = CSVContainer(infile, **kwargs)
+    assert second.keys == first.keys == ['mjd', 'roof_open']
+    assert np.all(second.mjd == [1, 2])
+    assert np.all(second.roof_open == [True, False])
+
+    # A newer csv file replaces the sidecar
+    with open(outfile_name, 'w') as outfile:
+        outfile.write('mjd,roof_open\n3,True\n')
+    os.utime(sidecar, (0, 0))
+    third = CSVContainer.from_filename(outfile_name, **kwargs)
+    assert np.all(third.mjd == [3]) and np.all(third.roof_open == [True])
@@ -0,0 +1,19 @@
+import sys
+import numpy as np
+sys.path.insert(0, '.')
+
+from qa_common.external_sort import sorted_rows
+
+
+def test_sorted_rows_spill_runs():
+    state = np.random.RandomState(2)
+    rows = [(float(mjd), i) for (i, mjd) in
+            enumerate(state.randint(0, 50, 1000))]
+    result = list(sorted_rows(iter(rows), key=lambda row: row[0],
+                              run_size=64))
+    # Rows with equal keys keep their order
+    assert result == sorted(rows)
+
+
+def test_sorted_rows_of_nothing():
+    assert list(sorted_rows([], key=lambda row: row)) == []
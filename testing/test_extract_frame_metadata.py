@@ -0,0 +1,74 @@
+import sys
+import imp
+import fitsio
+import numpy as np
+sys.path.insert(0, '.')
+sys.path.insert(0, 'benchmarks')
+
+import synthetic
+from qa_common import CSVContainer
+
+extract_frame_metadata = imp.load_source(
+    'extract_frame_metadata', 'photometry/extract_frame_metadata.py')
+
+
+def make_sky(fname, shape=(512, 256), seed=0):
+    state = np.random.RandomState(seed)
+    image = state.normal(100., 10., shape) + np.linspace(
+        -5., 5., shape[0])[:, np.newaxis]
+    fitsio.write(fname, image.astype(np.float32), clobber=True)
+    return image
+
+
+def test_sampled_median_within_its_precision(tmpdir):
+    fname = str(tmpdir.join('sky.fits'))
+    image = make_sky(fname)
+    nrows = 64
+    error = np.sqrt(np.pi / 2.) * 10. / np.sqrt(nrows * image.shape[1])
+    estimate = extract_frame_metadata.sampled_median(fname, nrows)
+    assert abs(estimate - np.median(image)) < 5 * error
+
+
+def test_sampled_median_of_all_rows(tmpdir):
+    fname = str(tmpdir.join('sky.fits'))
+    image = make_sky(fname).astype(np.float32)
+    for nrows in [0, 512, 1000]:
+        assert extract_frame_metadata.sampled_median(fname, nrows) == \
+            np.median(image)
+
+
+def test_extract_metadata_is_cached_and_sorted(tmpdir, monkeypatch):
+    fnames = [fname for (fname, _) in synthetic.make_reduced_frames(
+        str(tmpdir.join('frames')), nframes=4)]
+    cache = str(tmpdir.join('cache.sqlite'))
+
+    metadata = extract_frame_metadata.extract_metadata(
+        fnames[::-1], processes=2, cache=cache)
+    mjds = [row['mjd'] for row in metadata]
+    assert mjds == sorted(mjds)
+    assert set(metadata[0]) == set(extract_frame_metadata.KEYS)
+
+    # Cached results are returned without reading the images
+    def unreadable(*args):
+        raise AssertionError('Image read')
+    monkeypatch.setattr(extract_frame_metadata, 'sampled_median', unreadable)
+    assert extract_frame_metadata.extract_metadata(
+        fnames, processes=2, cache=cache) == metadata
+
+
+def test_main_writes_a_table(tmpdir):
+    fnames = [fname for (fname, _) in synthetic.make_reduced_frames(
+        str(tmpdir.join('frames')), nframes=3)]
+    filelist = tmpdir.join('files.list')
+    filelist.write(''.join('{}\n'.format(fname) for fname in fnames))
+    output = tmpdir.join('metadata.table')
+
+    with open(str(filelist)) as infile, open(str(output), 'w') as outfile:
+        extract_frame_metadata.main(extract_frame_metadata.argparse.Namespace(
+            filelist=infile, output=outfile, sample_rows=8, jobs=2,
+            cache=None, cache_hash=False, format='binary'))
+
+    table = CSVContainer.from_filename(str(output))
+    assert len(table.mjd) == 3
+    assert np.all(np.diff(table.mjd) > 0)
+    assert np.all(table.median_count_rate == 0.)
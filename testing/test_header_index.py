@@ -0,0 +1,90 @@
+import os
+import sys
+import imp
+import time
+import pytest
+sys.path.insert(0, '.')
+sys.path.insert(0, 'benchmarks')
+
+import synthetic
+from qa_common import header_index
+from qa_common.header_index import HeaderIndex, find_indexed_files
+
+
+@pytest.fixture
+def run(tmpdir):
+    rootdir = str(tmpdir.join('run'))
+    synthetic.make_raw_frames(os.path.join(rootdir, 'OriginalData', 'images'),
+                              nframes=2, shape=(16, 2088))
+    synthetic.make_reduced_frames(
+        os.path.join(rootdir, 'Reduction', 'output', 'synthetic'),
+        nframes=3, nsources=10)
+    return rootdir
+
+
+@pytest.fixture
+def index(tmpdir):
+    index = HeaderIndex(str(tmpdir.join('headers.sqlite')))
+    yield index
+    index.close()
+
+
+def test_find_indexed_files(run):
+    names = [os.path.basename(fname) for fname in find_indexed_files(run)]
+    assert len(names) == 2 + 3 * 2
+    assert 'IMAGE000000.fits' in names
+    assert 'proc000000_image.fits.phot' in names
+
+
+def test_update_only_reads_changed_files(run, index):
+    files = find_indexed_files(run)
+    assert index.update(files) == len(files)
+    assert index.update(files) == 0
+
+    # Rewriting a file with a new mtime makes it stale
+    changed = [fname for fname in files if fname.endswith('.phot')][0]
+    time.sleep(0.01)
+    os.utime(changed, (time.time() + 10, time.time() + 10))
+    assert index.lookup(changed, 1) is None
+    assert index.update(files) == 1
+    assert index.lookup(changed, 1)['psf_t_1'] is not None
+
+
+def test_lookup_ignores_case(run, index):
+    image = [fname for fname in find_indexed_files(run)
+             if fname.endswith('image.fits')][0]
+    index.update([image])
+    header = index.lookup(image)
+    assert header['mjd'] == header['MJD'] and 'mjd' in header
+    assert header.get('missing', 1) == 1
+
+
+def test_deleted_files_are_removed(run, index):
+    files = find_indexed_files(run)
+    index.update(files)
+    os.remove(files[0])
+    index.update(files[1:])
+    assert files[0] not in index.indexed_state()
+
+
+def test_extractors_read_the_index(run, tmpdir, monkeypatch):
+    extract_psf_measurements = imp.load_source(
+        'extract_psf_measurements', 'photometry/extract_psf_measurements.py')
+    extract_npoint_sources = imp.load_source(
+        'extract_npoint_sources', 'photometry/extract_npoint_sources.py')
+    catalogue = [fname for fname in find_indexed_files(run)
+                 if fname.endswith('.phot')][0]
+    expected = extract_psf_measurements.extract(catalogue)
+
+    path = str(tmpdir.join('headers.sqlite'))
+    index = HeaderIndex(path)
+    index.update([catalogue])
+    index.close()
+    monkeypatch.setenv(header_index.INDEX_ENV, path)
+
+    def no_reads(*args, **kwargs):
+        raise AssertionError('Header read from file')
+    monkeypatch.setattr(header_index.fitsio, 'read_header', no_reads)
+
+    assert extract_psf_measurements.extract(catalogue) == expected
+    assert extract_npoint_sources.extract(catalogue).nsources == 10
@@ -0,0 +1,95 @@
+import os
+import sys
+import pytest
+sys.path.insert(0, '.')
+sys.path.insert(0, 'view')
+
+from qa_common import instrument
+import build_html
+
+
+@pytest.fixture
+def timing_file(tmpdir, monkeypatch):
+    fname = str(tmpdir.join('timing.jsonl'))
+    monkeypatch.setenv(instrument.TIMING_ENV, fname)
+    monkeypatch.delenv(instrument.PROFILE_ENV, raising=False)
+    return fname
+
+
+def test_stage_records_usage(timing_file):
+    with instrument.stage('read', script='script.py'):
+        with open(__file__) as infile:
+            infile.read()
+
+    record, = instrument.read_timings(timing_file)
+    assert record['script'] == 'script.py'
+    assert record['stage'] == 'read'
+    assert record['status'] == 'ok'
+    assert record['wall'] >= 0 and record['cpu'] >= 0
+    assert record['peak_rss_mb'] > 0
+    if os.path.exists(instrument.PROC_IO):
+        assert record['bytes_read'] >= os.path.getsize(__file__)
+
+
+def test_instrumented_main_records_nested_stages(timing_file):
+    @instrument.instrumented
+    def main(value):
+        with instrument.stage('inner'):
+            return value * 2
+
+    assert main(21) == 42
+    inner, outer = instrument.read_timings(timing_file)
+    assert (outer['stage'], outer['depth']) == ('main', 0)
+    assert (inner['stage'], inner['depth']) == ('inner', 1)
+    assert outer['script'] == 'test_instrument.py'
+
+
+def test_failed_stage_is_recorded(timing_file):
+    with pytest.raises(ValueError):
+        with instrument.stage('broken'):
+            raise ValueError('bad data')
+    with pytest.raises(SystemExit):
+        with instrument.stage('exit'):
+            sys.exit(0)
+
+    broken, exit = instrument.read_timings(timing_file)
+    assert broken['status'] == 'failed'
+    assert exit['status'] == 'ok'
+
+
+def test_profile_dump(timing_file, tmpdir, monkeypatch):
+    profile_dir = tmpdir.join('profiles')
+    monkeypatch.setenv(instrument.PROFILE_ENV, str(profile_dir))
+
+    @instrument.instrumented
+    def main():
+        return sum(range(1000))
+
+    main()
+    assert len(profile_dir.listdir()) == 1
+
+
+def test_read_timings_skips_partial_lines(tmpdir):
+    fname = tmpdir.join('timing.jsonl')
+    fname.write('{"run": "a", "wall": 1.0}\n{"run": "b", "wall": 2.0}\n{"run"')
+    assert len(instrument.read_timings(str(fname))) == 2
+    assert instrument.read_timings(str(fname), run='b') == [
+        {'run': 'b', 'wall': 2.0}]
+
+
+def test_timing_rows_group_stages_by_process():
+    def record(pid, script, stage, depth, start, wall):
+        return {'pid': pid, 'script': script, 'stage': stage,
+                'depth': depth, 'start': start, 'wall': wall, 'cpu': 0.,
+                'children_cpu': 0., 'peak_rss_mb': 10., 'bytes_read': None,
+                'disk_bytes_read': None, 'status': 'ok',
+                'argv': ['render.py', '/tmp/out/plot.png']}
+
+    rows = build_html.timing_rows([
+        record(1, 'fast.py', 'main', 0, 0., 1.),
+        record(2, 'plot.py', 'main', 1, 11., 2.),
+        record(2, 'render.py', 'main', 0, 10., 5.),
+    ])
+    assert [row['stage'] for row in rows] == ['main', 'plot.py main', 'main']
+    assert rows[0]['command'] == 'render.py plot.png'
+    assert rows[0]['read'] == '-'
@@ -0,0 +1,109 @@
+import sys
+import pytest
+sys.path.insert(0, '.')
+
+from qa_common.jobs import Job, JobGraph, JobResult
+
+
+def python_job(name, code, **kwargs):
+    return Job(name, [sys.executable, '-c', code], **kwargs)
+
+
+def test_dependencies_run_first(tmpdir):
+    extracted = str(tmpdir.join('extracted.txt'))
+    plotted = str(tmpdir.join('plot.txt'))
+    graph = JobGraph([
+        python_job('plot',
+                   'open({!r}, "w").write(open({!r}).read())'.format(
+                       plotted, extracted),
+                   inputs=[extracted], outputs=[plotted],
+                   depends_on=['extract']),
+        python_job('extract', 'open({!r}, "w").write("1")'.format(extracted),
+                   outputs=[extracted]),
+    ])
+    results = graph.run(nworkers=2)
+    assert all(result.status == JobResult.SUCCESS
+               for result in results.values())
+    assert open(plotted).read() == '1'
+
+
+def test_failure_skips_dependents():
+    graph = JobGraph([
+        python_job('extract', 'raise SystemExit(1)'),
+        python_job('plot', 'pass', depends_on=['extract']),
+        python_job('html', 'pass', depends_on=['plot'],
+                   require_success=False),
+        python_job('other', 'pass'),
+    ])
+    results = graph.run(nworkers=2)
+    assert results['extract'].status == JobResult.FAILED
+    assert results['plot'].status == JobResult.SKIPPED
+    assert results['html'].status == JobResult.SUCCESS
+    assert results['other'].status == JobResult.SUCCESS
+
+
+def test_timeout():
+    graph = JobGraph([python_job('slow', 'import time; time.sleep(30)',
+                                 timeout=0.5)])
+    result = graph.run()['slow']
+    assert result.status == JobResult.FAILED
+    assert 'Timed out' in result.message
+
+
+def test_outputs_without_stamp_are_up_to_date(tmpdir):
+    output = tmpdir.join('plot.txt')
+    job = Job('plot', ['true'], outputs=[str(output)])
+    assert not job.is_up_to_date()
+    output.write('1')
+    assert job.is_up_to_date()
+
+
+def test_stamp_tracks_input_contents(tmpdir):
+    extracted = tmpdir.join('extracted.txt')
+    plotted = tmpdir.join('plot.txt')
+    extracted.write('1')
+
+    def build_graph(contents):
+        return JobGraph([
+            # No outputs, so the extraction always runs
+            python_job('extract',
+                       'open({!r}, "w").write({!r})'.format(str(extracted),
+                                                             contents)),
+            python_job('plot', 'open({!r}, "w").write("")'.format(
+                str(plotted)),
+                inputs=[str(extracted)], outputs=[str(plotted)],
+                depends_on=['extract'], hash_inputs=True,
+                stamp=str(tmpdir.join('stamps', 'plot.stamp'))),
+        ])
+
+    assert build_graph('1').run()['plot'].status == JobResult.SUCCESS
+    # Extraction rewrites the same contents, so the plot is up to date
+    assert build_graph('1').run()['plot'].status == JobResult.UP_TO_DATE
+    assert build_graph('2').run()['plot'].status == JobResult.SUCCESS
+
+
+def test_failure_removes_stamp(tmpdir):
+    output = tmpdir.join('plot.txt')
+    stamp = tmpdir.join('plot.stamp')
+    output.write('1')
+    stamp.write('old')
+    job = python_job('plot', 'raise SystemExit(1)', outputs=[str(output)],
+                     stamp=str(stamp))
+    assert JobGraph([job]).run()['plot'].status == JobResult.FAILED
+    assert not stamp.check()
+
+
+def test_cycles_are_rejected():
+    graph = JobGraph([Job('a', ['true'], depends_on=['b']),
+                      Job('b', ['true'], depends_on=['a'])])
+    with pytest.raises(ValueError):
+        graph.validate()
+
+
+def test_launcher_is_not_part_of_digest(tmpdir):
+    output = tmpdir.join('out.txt')
+    code = 'open({!r}, "w").write("1")'.format(str(output))
+    job = Job('launched', ['-c', code], launcher=[sys.executable])
+    assert job.digest() == Job('launched', ['-c', code]).digest()
+    assert JobGraph([job]).run()['launched'].status == JobResult.SUCCESS
+    assert output.read() == '1'
@@ -0,0 +1,68 @@
+import sys
+import imp
+import numpy as np
+sys.path.insert(0, '.')
+sys.path.insert(0, 'benchmarks')
+
+import synthetic
+from qa_common import CSVContainer
+from qa_common.skymatch import SkyMatcher, read_reference
+
+match_frames = imp.load_source('match_frames', 'astrometry/match_frames.py')
+
+
+def test_residual_trends_of_a_plane():
+    x, y = np.meshgrid(np.arange(0., 2048., 256.), np.arange(0., 2048., 256.))
+    x, y = x.ravel(), y.ravel()
+    residual = 0.2 + 1e-3 * x - 5e-4 * y
+    assert np.allclose(match_frames.residual_trends(x, y, residual),
+                       [1., -0.5])
+
+
+def test_frame_residuals(tmpdir):
+    _, catalogue = synthetic.make_reduced_frame(
+        str(tmpdir.join('proc000001_image.fits')), mjd=57000.1, nsources=200)
+    reference = read_reference(synthetic.make_reference_catalogue(
+        str(tmpdir.join('2mass.csv')), nsources=200))
+    matcher = SkyMatcher(reference['ra'], reference['dec'])
+
+    row = match_frames.frame_residuals(catalogue, matcher, reference,
+                                       10. / 3600.)
+    assert row['mjd'] == 57000.1
+    assert row['nsources'] == row['nmatched'] == 200
+    # 0.3 arcsec of noise in each coordinate
+    assert 0.3 < row['rms_separation'] < 0.55
+    assert abs(row['ra_offset']) < 0.1 and abs(row['dec_offset']) < 0.1
+    assert abs(row['ra_x_trend']) < 0.1 and abs(row['dec_y_trend']) < 0.1
+
+
+def test_frame_residuals_without_matches(tmpdir):
+    _, catalogue = synthetic.make_reduced_frame(
+        str(tmpdir.join('proc000001_image.fits')), mjd=57000.1, nsources=20)
+    reference = np.zeros(1, dtype=[('ra', float), ('dec', float)])
+    matcher = SkyMatcher(reference['ra'], reference['dec'])
+
+    row = match_frames.frame_residuals(catalogue, matcher, reference,
+                                       10. / 3600.)
+    assert row['nmatched'] == 0 and np.isnan(row['median_separation'])
+
+
+def test_main_writes_a_row_per_frame(tmpdir):
+    frames = synthetic.make_reduced_frames(str(tmpdir.join('reduced')),
+                                           nframes=5, nsources=100)
+    filelist = tmpdir.join('catalogues.list')
+    filelist.write(''.join('{}\n'.format(catalogue)
+                           for (_, catalogue) in frames))
+    reference = synthetic.make_reference_catalogue(
+        str(tmpdir.join('2mass.csv')), nsources=100)
+    output = tmpdir.join('residuals.table')
+
+    with open(str(output), 'w') as outfile:
+        match_frames.main(match_frames.argparse.Namespace(
+            filelist=str(filelist), reference=reference, output=outfile,
+            error=10., mode='best', jobs=2, chunksize=2, format='binary'))
+
+    with open(str(output)) as infile:
+        table = CSVContainer(infile)
+    assert list(table.nmatched) == [100] * 5
+    assert np.all(np.diff(table.mjd) > 0)
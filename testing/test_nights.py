@@ -0,0 +1,53 @@
+import numpy as np
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.nights import NightIndex
+from qa_common.find_night_breaks import find_night_breaks
+
+
+def example_mjd():
+    return np.concatenate([np.arange(10) * 0.01,
+                           1 + np.arange(5) * 0.01,
+                           3 + np.arange(3) * 0.01])
+
+
+def test_night_slices():
+    index = NightIndex(example_mjd())
+    assert len(index) == 3
+    assert index.slices() == [slice(0, 10), slice(10, 15), slice(15, 18)]
+    assert np.all(index.night_of([0.05, 1.02, 10.]) == [0, 1, 2])
+
+    mask = index.frame_mask([0, 2])
+    assert mask.sum() == 13 and not mask[10:15].any()
+
+
+def test_breaks_match_find_night_breaks():
+    mjd = example_mjd()
+    old_breaks = np.arange(mjd.size - 1)[np.diff(mjd) > 0.3]
+    assert np.all(NightIndex(mjd).breaks == old_breaks)
+    assert np.all(find_night_breaks(mjd, 0.3) == old_breaks)
+
+
+def test_saved_next_to_data_file(tmpdir):
+    datafile = tmpdir.join('output.fits')
+    datafile.write('')
+    index = NightIndex.for_file(str(datafile), mjd=example_mjd())
+    sidecar = NightIndex.sidecar_filename(str(datafile), 0.3)
+    assert tmpdir.join('output.fits.nights-0.3.npz').check()
+
+    loaded = NightIndex.for_file(str(datafile))
+    assert np.all(loaded.starts == index.starts)
+    assert loaded.nframes == index.nframes
+    assert loaded.slices() == index.slices()
+
+
+def test_sidecar_with_other_frames_is_rebuilt(tmpdir):
+    datafile = tmpdir.join('output.fits')
+    datafile.write('')
+    mjd = example_mjd()
+    NightIndex.for_file(str(datafile), mjd=mjd[:-5])
+
+    index = NightIndex.for_file(str(datafile), mjd=mjd)
+    assert index.nframes == len(mjd)
+    assert NightIndex.for_file(str(datafile)).nframes == len(mjd)
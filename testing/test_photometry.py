@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.photometry import build_bins, assign_bins, binned_lightcurves
+
+
+@pytest.fixture
+def photometry():
+    state = np.random.RandomState(42)
+    brightness = 10 ** state.uniform(1., 4.5, size=(200, 1))
+    flux = brightness * state.normal(1., 0.01, size=(200, 50))
+    fluxerr = np.sqrt(flux) * state.uniform(0.5, 2., size=flux.shape)
+    return flux, 1. / fluxerr ** 2
+
+
+def test_assign_bins():
+    ledges, redges = np.array([1., 2., 5.]), np.array([2., 4., 10.])
+    values = np.array([0.5, 1., 1.99, 2., 4., 4.5, 9.99, 10., np.nan])
+    assert list(assign_bins(values, ledges, redges)) == \
+        [-1, 0, 0, 1, -1, -1, 2, -1, -1]
+
+
+def test_binned_lightcurves_match_average_per_bin(photometry):
+    flux, weights = photometry
+    ledges, redges = build_bins()
+    flux_mean = np.average(flux, axis=1, weights=weights)
+    lightcurves = binned_lightcurves(
+        flux, weights, assign_bins(flux_mean, ledges, redges), len(ledges))
+
+    assert lightcurves.shape == (len(ledges), flux.shape[1])
+    for (ledge, redge, lightcurve) in zip(ledges, redges, lightcurves):
+        ind = (flux_mean >= ledge) & (flux_mean < redge)
+        if ind.any():
+            assert np.allclose(lightcurve, np.average(
+                flux[ind], axis=0, weights=weights[ind]))
+        else:
+            assert np.isnan(lightcurve).all()
+
+
+def test_stars_in_no_bin_are_ignored(photometry):
+    flux, weights = photometry
+    flux, weights = flux.copy(), weights.copy()
+    bins = np.arange(flux.shape[0]) % 3
+    # A bad aperture with zero flux, and so infinite weight, in some frames
+    bins[0] = -1
+    flux[0, ::7] = 0.
+    weights[0, ::7] = np.inf
+
+    lightcurves = binned_lightcurves(flux, weights, bins, 3)
+    assert np.isfinite(lightcurves).all()
+    assert np.allclose(lightcurves, binned_lightcurves(flux[1:], weights[1:],
+                                                       bins[1:], 3))
+
+
+def test_zero_weights_give_the_unweighted_mean(photometry):
+    flux, weights = photometry
+    bins = np.arange(flux.shape[0]) % 3
+    weights = weights.copy()
+    weights[bins == 1, 5] = 0.
+
+    lightcurves = binned_lightcurves(flux, weights, bins, 4)
+    assert np.allclose(lightcurves[1, 5], flux[bins == 1, 5].mean())
+    assert np.allclose(lightcurves[1, 4], np.average(
+        flux[bins == 1, 4], weights=weights[bins == 1, 4]))
+    assert np.isnan(lightcurves[3]).all()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+fitsio = pytest.importorskip('fitsio')
+
+
+@pytest.fixture
+def filename(tmpdir):
+    fname = str(tmpdir.join('output.fits'))
+    imagelist = np.zeros(4, dtype=[('TMID', 'f8'), ('EXPOSURE', 'f8')])
+    imagelist['TMID'] = np.arange(4)
+    with fitsio.FITS(fname, 'rw', clobber=True) as outfile:
+        outfile.write(imagelist, extname='IMAGELIST')
+        outfile.write(np.arange(12.).reshape(3, 4), extname='FLUX')
+        outfile.write(np.arange(12.).reshape(3, 4), extname='CCDX')
+    return fname
+
+
+def test_read_is_cached_and_read_only(filename):
+    from qa_common.photometry_file import PhotometryFile
+    with PhotometryFile.open(filename) as infile:
+        flux = infile.read('flux')
+        assert infile.read('flux') is flux
+        with pytest.raises(ValueError):
+            flux /= 2.
+
+
+def test_columns(filename):
+    from qa_common.photometry_file import PhotometryFile
+    with PhotometryFile.open(filename) as infile:
+        assert np.all(infile.column('imagelist', 'tmid') == np.arange(4))
+        assert np.all(infile.first_column('ccdx') == [0, 4, 8])
+
+
+def test_shared_instance_is_reused(filename):
+    from qa_common.photometry_file import PhotometryFile
+    shared = PhotometryFile.shared(filename, hdus=['flux'])
+    try:
+        with PhotometryFile.open(filename) as infile:
+            assert infile is shared
+        assert shared.read('flux') is not None
+    finally:
+        shared.close()
+
+    assert PhotometryFile.open(filename) is not shared
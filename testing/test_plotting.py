@@ -0,0 +1,85 @@
+import sys
+import numpy as np
+import pytest
+sys.path.insert(0, '.')
+
+from qa_common.plotting import plt, density_scatter, interleaved_scatter
+
+
+@pytest.fixture
+def ax():
+    fig, ax = plt.subplots(figsize=(4, 3))
+    yield ax
+    plt.close(fig)
+
+
+def test_few_points_are_markers(ax):
+    x = np.arange(10.)
+    mesh, line = density_scatter(ax, x, x ** 2, label='data')
+    assert mesh is None
+    assert np.all(line.get_xdata() == x)
+    assert line.get_label() == 'data'
+
+
+def test_many_points_are_binned(ax):
+    state = np.random.RandomState(1)
+    x = np.concatenate([state.normal(size=20000), [30.]])
+    y = np.concatenate([state.normal(size=20000), [-30.]])
+    mesh, line = density_scatter(ax, x, y, max_points=1000)
+    assert mesh is not None
+
+    # Every point is either counted in the image or drawn as a marker
+    counts = 10 ** mesh.get_array().compressed()
+    assert np.isclose(counts.sum() + line.get_xdata().size, x.size)
+    assert line.get_xdata().size < 1000
+    assert (30., -30.) in zip(line.get_xdata(), line.get_ydata())
+
+
+def test_binning_keeps_axis_limits(ax):
+    ax.set_yscale('log')
+    ax.set_xlim(5, 20)
+    ax.set_ylim(1e-3, 1e1)
+    state = np.random.RandomState(3)
+    density_scatter(ax, state.uniform(8, 19, size=5000),
+                    10 ** state.uniform(-3, -1, size=5000), max_points=100)
+    assert ax.get_xlim() == (5, 20)
+    assert np.allclose(ax.get_ylim(), (1e-3, 1e1))
+
+
+def test_binning_fits_limits_to_the_data(ax):
+    x = np.random.RandomState(4).uniform(100, 200, size=5000)
+    density_scatter(ax, x, x, max_points=100)
+    xmin, xmax = ax.get_xlim()
+    assert xmin <= x.min() and xmax >= x.max()
+    assert xmax - xmin < 200
+
+
+def test_no_dense_bins_plots_markers(ax):
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    state = np.random.RandomState(5)
+    x = np.concatenate([state.uniform(0, 1, size=50),
+                        state.uniform(10, 20, size=5000)])
+    mesh, line = density_scatter(ax, x, state.uniform(0, 1, size=x.size),
+                                 max_points=100)
+    assert mesh is None
+    assert line.get_xdata().size == x.size
+
+
+def test_log_axis_drops_negative_values(ax):
+    ax.set_yscale('log')
+    y = 10 ** np.random.RandomState(2).uniform(-3, 1, size=5000)
+    y[0] = -1.
+    mesh, line = density_scatter(ax, np.ones_like(y), y, max_points=100)
+    counts = 10 ** mesh.get_array().compressed()
+    assert np.isclose(counts.sum() + line.get_xdata().size, y.size - 1)
+
+
+def test_interleaved_scatter_draws_every_point_once(ax):
+    series = [(np.arange(5.), np.zeros(5), 'r'),
+              (np.arange(3.), np.array([1., np.nan, 1.]), 'b')]
+    collection = interleaved_scatter(ax, series)
+    offsets = collection.get_offsets()
+    assert len(offsets) == 7
+    colours = collection.get_facecolors()
+    assert sum(np.allclose(colour, [0, 0, 1, 1]) for colour in colours) == 2
@@ -0,0 +1,122 @@
+import sys
+import imp
+import numpy as np
+import pytest
+from astropy import wcs
+from astropy.io import fits
+sys.path.insert(0, '.')
+sys.path.insert(0, 'benchmarks')
+
+import synthetic
+from qa_common import CSVContainer
+from qa_common.projection import Projections, wcs_cards
+
+extract_wcs_parameters = imp.load_source(
+    'extract_wcs_parameters', 'astrometry/extract_wcs_parameters.py')
+
+
+def header_cards(ra, dec, projection='ZPN'):
+    cards = dict((card['name'], card['value'])
+                 for card in synthetic.wcs_header(ra, dec))
+    cards.update(NAXIS=2, NAXIS1=2048, NAXIS2=2048,
+                 CTYPE1='RA---{}'.format(projection),
+                 CTYPE2='DEC--{}'.format(projection))
+    if projection != 'ZPN':
+        for key in ['PV2_1', 'PV2_3', 'PV2_5']:
+            cards.pop(key)
+    return cards
+
+
+def astropy_positions(cards, x, y):
+    header = fits.Header()
+    for (key, value) in sorted(cards.items()):
+        header[key] = value
+    return wcs.WCS(header).all_pix2world(x, y, 1)
+
+
+@pytest.mark.parametrize('projection', ['ZPN', 'TAN'])
+@pytest.mark.parametrize('centre', [(1.5, -28.5), (359.9, 10.), (80., 89.)])
+def test_agrees_with_astropy(projection, centre):
+    cards = header_cards(centre[0], centre[1], projection)
+    x, y = np.meshgrid(np.linspace(1, 2048, 7), np.linspace(1, 2048, 7))
+    x, y = x.ravel(), y.ravel()
+
+    ra, dec = Projections([cards]).pix2world(x, y)
+    expected_ra, expected_dec = astropy_positions(cards, x, y)
+    dra = (ra[0] - expected_ra + 180.) % 360. - 180.
+    assert np.abs(dra * np.cos(np.radians(dec[0]))).max() * 3600. < 1e-6
+    assert np.abs(dec[0] - expected_dec).max() * 3600. < 1e-6
+
+
+def test_frames_are_evaluated_together():
+    cards = [header_cards(1.5, -28.5), header_cards(2.5, -27.5, 'TAN'),
+             header_cards(3.5, -26.5, 'SIN')]
+    projections = Projections(cards)
+    ra, dec = projections.pix2world(1024.5, 1024.5)
+    assert ra.shape == (3, 1)
+    assert np.allclose(ra[:2, 0], [1.5, 2.5])
+    assert np.allclose(dec[:2, 0], [-28.5, -27.5])
+    assert list(projections.supported) == [True, True, False]
+    assert np.isnan(ra[2, 0])
+
+
+def sip_cards(ra, dec):
+    cards = header_cards(ra, dec, 'TAN')
+    cards.update(CTYPE1='RA---TAN-SIP', CTYPE2='DEC--TAN-SIP', A_ORDER=2,
+                 B_ORDER=2, A_2_0=2e-5, A_0_2=-1e-5, A_1_1=5e-6, B_2_0=-3e-6,
+                 B_0_2=1e-5, B_1_1=4e-6)
+    return cards
+
+
+@pytest.mark.parametrize('cards', [
+    sip_cards(1.5, -28.5),
+    dict(header_cards(1.5, -28.5, 'TAN'), LONPOLE=0.),
+    dict(header_cards(1.5, -28.5), PV1_3=0.),
+])
+def test_other_wcs_fall_back_to_astropy(cards):
+    assert not Projections([cards]).supported[0]
+
+    x, y = np.meshgrid(np.linspace(1, 2048, 5), np.linspace(1, 2048, 5))
+    x, y = x.ravel(), y.ravel()
+    ra, dec = extract_wcs_parameters.pix2world([{'wcs': cards}], x, y)
+    expected_ra, expected_dec = astropy_positions(cards, x, y)
+    assert np.allclose(ra[0], expected_ra, rtol=0, atol=1e-9)
+    assert np.allclose(dec[0], expected_dec, rtol=0, atol=1e-9)
+
+
+def test_wcs_cards_keep_sip_terms():
+    cards = sip_cards(1.5, -28.5)
+    header = fits.Header()
+    for (key, value) in sorted(cards.items()):
+        header[key] = value
+    header['OBJECT'] = 'field'
+    assert wcs_cards(header) == cards
+
+
+def test_extract_with_grid(tmpdir):
+    frames = synthetic.make_reduced_frames(str(tmpdir), nframes=3,
+                                           nsources=10)
+    filelist = tmpdir.join('files.list')
+    filelist.write(''.join('{}\n'.format(image) for (image, _) in frames))
+    output, grid_output = tmpdir.join('wcs.table'), tmpdir.join('grid.table')
+
+    with open(str(output), 'w') as outfile:
+        with open(str(grid_output), 'w') as grid_outfile:
+            extract_wcs_parameters.main(
+                extract_wcs_parameters.argparse.Namespace(
+                    filelist=str(filelist), output=outfile, threads=2,
+                    grid=4, grid_output=grid_outfile, cache=None,
+                    cache_hash=False, format='binary'))
+
+    with open(str(output)) as infile:
+        table = CSVContainer(infile)
+    for (i, (image, _)) in enumerate(frames):
+        header = fits.getheader(image)
+        expected = wcs.WCS(header).all_pix2world([1024], [1024], 1)
+        assert np.isclose(table.solved_ra[i], expected[0][0])
+        assert np.isclose(table.solved_dec[i], expected[1][0])
+
+    with open(str(grid_output)) as infile:
+        grid = CSVContainer(infile)
+    assert grid.ra.size == 3 * 16
+    assert np.all(np.abs(grid.dra) < 30.) and np.all(np.abs(grid.ddec) < 30.)
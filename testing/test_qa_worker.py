@@ -0,0 +1,108 @@
+import imp
+import multiprocessing as mp
+import os
+import subprocess as sp
+import sys
+import time
+import pytest
+sys.path.insert(0, '.')
+
+qa_worker = imp.load_source('qa_worker', os.path.join('scripts',
+                                                      'qa_worker.py'))
+
+SCRIPT = '''
+import os, sys
+sys.stdout.write('args {} {}\\n'.format(sys.argv[1:], os.environ['QA_TEST']))
+sys.stderr.write('cwd {}\\n'.format(os.getcwd()))
+sys.exit(int(sys.argv[1]))
+'''
+
+
+@pytest.fixture
+def worker(tmpdir):
+    path = str(tmpdir.join('worker.sock'))
+    process = mp.Process(target=qa_worker.serve, args=(path, []))
+    process.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.1)
+    yield path
+    process.terminate()
+    process.join()
+
+
+def run_client(socket_path, command, cwd):
+    client = sp.Popen([sys.executable, os.path.realpath(
+        os.path.join('scripts', 'qa_worker.py')), 'run', '--socket',
+                       socket_path] + command,
+                      stdout=sp.PIPE, stderr=sp.PIPE, cwd=cwd,
+                      env=dict(os.environ, QA_TEST='yes'))
+    stdout, stderr = client.communicate()
+    return client.returncode, stdout.decode(), stderr.decode()
+
+
+@pytest.mark.parametrize('code', [0, 3])
+def test_script_runs_in_worker(tmpdir, worker, code):
+    script = tmpdir.join('script.py')
+    script.write(SCRIPT)
+    returncode, stdout, stderr = run_client(
+        worker, [sys.executable, str(script), str(code)], str(tmpdir))
+    assert returncode == code
+    assert stdout == "args ['{}'] yes\n".format(code)
+    assert stderr == 'cwd {}\n'.format(os.path.realpath(str(tmpdir)))
+
+
+def test_falls_back_without_worker(tmpdir):
+    script = tmpdir.join('script.py')
+    script.write(SCRIPT)
+    returncode, stdout, stderr = run_client(
+        str(tmpdir.join('missing.sock')), [str(script), '2'], str(tmpdir))
+    assert returncode == 2
+    assert stdout == "args ['2'] yes\n"
+    assert 'running' in stderr
+
+
+POOL_SCRIPT = '''
+import os, sys, time
+if os.fork() == 0:
+    time.sleep(60)
+    os._exit(0)
+with open(sys.argv[1], 'w') as outfile:
+    outfile.write(str(os.getpid()))
+time.sleep(60)
+'''
+
+
+def is_running(pid):
+    try:
+        with open('/proc/{}/stat'.format(pid)) as infile:
+            return infile.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='Needs /proc')
+def test_killing_the_client_kills_the_script_children(tmpdir, worker):
+    script = tmpdir.join('script.py')
+    script.write(POOL_SCRIPT)
+    pidfile = tmpdir.join('pid')
+    client = sp.Popen([sys.executable, os.path.realpath(
+        os.path.join('scripts', 'qa_worker.py')), 'run', '--socket', worker,
+        sys.executable, str(script), str(pidfile)], cwd=str(tmpdir))
+    for _ in range(100):
+        if pidfile.check() and pidfile.read():
+            break
+        time.sleep(0.1)
+    pid = int(pidfile.read())
+    children = [int(child) for child in open(
+        '/proc/{0}/task/{0}/children'.format(pid)).read().split()]
+    assert children
+
+    client.kill()
+    client.wait()
+    for _ in range(50):
+        if not any(is_running(p) for p in [pid] + children):
+            break
+        time.sleep(0.1)
+    assert not any(is_running(p) for p in [pid] + children)
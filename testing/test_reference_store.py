@@ -0,0 +1,106 @@
+import sys
+import imp
+import os
+import numpy as np
+import pytest
+sys.path.insert(0, '.')
+
+from qa_common.reference_store import (ReferenceStore, parse_find2mass,
+                                       box_limits)
+from qa_common.sky import angular_separation
+
+
+def find2mass_line(ra, dec, name, jmag):
+    return '{:10.6f}  {:+9.5f}{:15s}{:16s}  {:6.3f}  extra'.format(
+        ra, dec, '', name, jmag)
+
+
+def find2mass_output(sources):
+    lines = ['# find2mass header']
+    lines.extend(find2mass_line(*source) for source in sources)
+    return '\n'.join(lines) + '\n'
+
+
+SOURCES = [(10.5, -28.5, '00420000-2830000', 12.5),
+           (10.6, -29.5, '00422400-2930000', 10.25),
+           (359.9, -28.5, '23593600-2830000', 14.),
+           (0.1, -28.5, '00002400-2830000', 11.)]
+
+
+@pytest.fixture
+def store(tmpdir):
+    store = ReferenceStore(str(tmpdir.join('store')))
+    store.add(parse_find2mass(find2mass_output(SOURCES)))
+    return store
+
+
+def test_parse_find2mass():
+    sources = parse_find2mass(find2mass_output(SOURCES[:2]))
+    assert np.allclose(sources['ra'], [10.5, 10.6])
+    assert np.allclose(sources['dec'], [-28.5, -29.5])
+    assert np.allclose(sources['jmag'], [12.5, 10.25])
+    assert list(sources['name_2mass']) == [b'00420000-2830000',
+                                           b'00422400-2930000']
+
+
+def test_box_limits_wrap_through_zero():
+    dec_min, dec_max, intervals = box_limits(0., 0., 2.)
+    assert (dec_min, dec_max) == (-1., 1.)
+    assert np.allclose(intervals, [(0., 1.00015), (358.99985, 360.)])
+    assert box_limits(0., 89.5, 2.)[2] == [(0., 360.)]
+
+
+def test_box_search(store):
+    found = store.box_search(10.5, -29., 3.)
+    assert sorted(found['ra']) == [10.5, 10.6]
+    assert sorted(store.box_search(0., -28.5, 1.)['ra']) == [0.1, 359.9]
+
+
+def test_cone_search(store):
+    found = store.cone_search(10.5, -28.5, 0.5)
+    assert list(found['ra']) == [10.5]
+    assert np.isclose(angular_separation(10.5, -28.5, 10.6, -29.5), 1.004,
+                      atol=1e-3)
+
+
+def test_add_replaces_sources_with_the_same_name(store):
+    store.add(parse_find2mass(find2mass_output([(10.5, -28.5,
+                                                 '00420000-2830000', 9.)])))
+    found = store.box_search(10.5, -28.5, 0.2)
+    assert list(found['jmag']) == [9.]
+
+    reopened = ReferenceStore(store.directory)
+    assert reopened.box_search(0., -29., 90.).size == len(SOURCES)
+
+
+def test_coverage(store):
+    assert not store.covers(10.5, -28.5, 1.)
+    store.add([], box=(10.5, -28.5, 3.))
+    assert store.covers(10.5, -28.5, 1.)
+    assert store.covers(10.5, -28.5, 3.)
+    assert not store.covers(10.5, -28.5, 4.)
+    assert not store.covers(20., -28.5, 1.)
+
+
+def test_fetch_runs_find2mass_once(tmpdir, monkeypatch):
+    fetch_2mass = imp.load_source('fetch_2mass', 'astrometry/fetch_2mass.py')
+    bindir = tmpdir.mkdir('bin')
+    output = tmpdir.join('find2mass.out')
+    output.write(find2mass_output(SOURCES))
+    calls = tmpdir.join('calls')
+    script = bindir.join('find2mass')
+    script.write('#!/bin/sh\necho run >> {}\ncat {}\n'.format(calls, output))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', '{}{}{}'.format(bindir, os.pathsep,
+                                               os.environ['PATH']))
+
+    store = ReferenceStore(str(tmpdir.join('store')))
+    for _ in range(2):
+        fetch_2mass.Catalogue(10.5, -29., store=store).build(
+            str(tmpdir.join('catalogue.csv')))
+    assert calls.read() == 'run\n'
+
+    with open(str(tmpdir.join('catalogue.csv'))) as infile:
+        lines = infile.read().splitlines()
+    assert lines[0] == 'ra,dec,jmag,name_2mass'
+    assert len(lines) == 3
@@ -0,0 +1,28 @@
+import sys
+import imp
+import pytest
+sys.path.insert(0, '.')
+
+render_photometry_plots = imp.load_source(
+    'render_photometry_plots', 'photometry/render_photometry_plots.py')
+PLOTS = render_photometry_plots.PLOTS
+
+
+@pytest.mark.parametrize('name', list(PLOTS))
+def test_every_argument_has_a_value(name):
+    plot = PLOTS[name]
+    args = plot.build_args('output.fits', 'plot.png', hdu='flux')
+    parser = plot.module.build_parser()
+    for action in parser._actions:
+        if action.dest != 'help':
+            assert hasattr(args, action.dest)
+    assert getattr(args, plot.filename_arg) == 'output.fits'
+    assert args.output == 'plot.png'
+
+
+def test_defaults_come_from_the_script():
+    plot = PLOTS['rms-vs-time']
+    args = plot.build_args('output.fits', 'plot.png', hdu='flux')
+    assert args.sketch_size == plot.module.DEFAULT_SKETCH_SIZE
+    assert args.exact is False
+    assert PLOTS['rms-with-binning'].defaults['statistic'] == 'median'
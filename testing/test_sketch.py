@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from qa_common.sketch import QuantileSketch, StreamingMoments
+
+
+def rank_error(values, estimates, q):
+    '''
+    Fractional distance between the rank of each estimate and the target
+    rank, per stream
+    '''
+    n = values.shape[0]
+    below = (values < estimates).sum(axis=0)
+    at_or_below = (values <= estimates).sum(axis=0)
+    target = q * n
+    return np.maximum(0, np.maximum(below - target, target - at_or_below)) / n
+
+
+@pytest.mark.parametrize('k', [16, 64])
+def test_quantiles_within_error_bound(k):
+    values = np.random.RandomState(3).standard_normal(size=(5000, 20))
+    sketch = QuantileSketch(values.shape[1], k=k)
+    for start in range(0, values.shape[0], 333):
+        sketch.update(values[start:start + 333])
+
+    qs = [0.25, 0.5, 0.75]
+    bound = QuantileSketch.error_bound(values.shape[0], k)
+    for (q, estimate) in zip(qs, sketch.quantiles(qs)):
+        assert np.all(rank_error(values, estimate, q) <= bound)
+
+
+def test_small_input_is_exact():
+    values = np.arange(10.)[:, np.newaxis]
+    sketch = QuantileSketch(1, k=16)
+    sketch.update(values)
+    assert sketch.quantiles([0., 0.5, 1.])[:, 0].tolist() == [0., 4., 9.]
+
+
+def test_merge_matches_single_sketch():
+    values = np.random.RandomState(4).uniform(size=(2000, 3))
+    first, second = QuantileSketch(3, k=32), QuantileSketch(3, k=32)
+    first.update(values[:1000])
+    second.update(values[1000:])
+    first.merge(second)
+    assert first.count == 2000
+    bound = QuantileSketch.error_bound(2000, 32)
+    median = first.quantiles([0.5])[0]
+    assert np.all(rank_error(values, median, 0.5) <= 2 * bound)
+
+
+def test_nan_streams():
+    values = np.ones((10, 2))
+    values[3, 1] = np.nan
+    sketch = QuantileSketch(2, k=4)
+    sketch.update(values)
+    median = sketch.quantiles([0.5])[0]
+    assert median[0] == 1 and np.isnan(median[1])
+
+
+def test_streaming_moments():
+    values = np.random.RandomState(5).normal(3, 2, size=(1000, 4))
+    moments = StreamingMoments(4)
+    for start in range(0, 1000, 77):
+        moments.update(values[start:start + 77])
+    assert np.allclose(moments.mean, values.mean(axis=0))
+    assert np.allclose(moments.std, values.std(axis=0))
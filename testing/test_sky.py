@@ -0,0 +1,41 @@
+import sys
+import numpy as np
+import fitsio
+from astropy import units as u
+from astropy.coordinates import ICRS
+sys.path.insert(0, '.')
+
+from qa_common.sky import angular_separation, offsets, match_separations
+
+
+def test_separation_agrees_with_astropy():
+    state = np.random.RandomState(3)
+    ra1, dec1 = state.uniform(0., 360., 100), state.uniform(-89., 89., 100)
+    ra2 = ra1 + state.normal(0., 1e-3, 100)
+    dec2 = np.clip(dec1 + state.normal(0., 1e-3, 100), -90., 90.)
+
+    expected = ICRS(ra=ra1 * u.degree, dec=dec1 * u.degree).separation(
+        ICRS(ra=ra2 * u.degree, dec=dec2 * u.degree)).degree
+    assert np.allclose(angular_separation(ra1, dec1, ra2, dec2), expected,
+                       rtol=0, atol=1e-10)
+
+
+def test_offsets_wrap_through_zero():
+    dra, ddec = offsets([359.999, 0.001], [60., 60.], [0.001, 359.999],
+                        [59.999, 60.])
+    assert np.allclose(dra, [-0.001, 0.001])
+    assert np.allclose(ddec, [0.001, 0.])
+
+
+def test_match_separations_without_column(tmpdir):
+    table = np.zeros(2, dtype=[('RA_1', 'f8'), ('DEC_1', 'f8'),
+                               ('ra_2', 'f8'), ('dec_2', 'f8')])
+    table['RA_1'] = np.radians([10., 20.])
+    table['DEC_1'] = np.radians([-30., -30.])
+    table['ra_2'] = [10., 20.]
+    table['dec_2'] = [-30. + 1. / 3600., -30. - 2. / 3600.]
+    fname = str(tmpdir.join('match.fits'))
+    fitsio.write(fname, table)
+
+    with fitsio.FITS(fname) as infile:
+        assert np.allclose(match_separations(infile[1]), [1., 2.])
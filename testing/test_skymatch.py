@@ -0,0 +1,113 @@
+import sys
+import imp
+import numpy as np
+import fitsio
+import pytest
+sys.path.insert(0, '.')
+
+from qa_common.skymatch import SkyMatcher, unit_vectors, chord_to_degrees
+from qa_common.sky import angular_separation
+
+
+@pytest.fixture
+def positions():
+    state = np.random.RandomState(5)
+    ra2 = state.uniform(0., 2., 2000)
+    dec2 = state.uniform(-1., 1., 2000)
+    ra1 = (ra2[:1500] + state.normal(0., 1e-3, 1500)) % 360.
+    dec1 = dec2[:1500] + state.normal(0., 1e-3, 1500)
+    return ra1, dec1, ra2, dec2
+
+
+def brute_force_pairs(ra1, dec1, ra2, dec2, radius):
+    separation = angular_separation(ra1[:, np.newaxis], dec1[:, np.newaxis],
+                                    ra2, dec2)
+    index1, index2 = np.nonzero(separation <= radius)
+    return index1, index2, separation[index1, index2]
+
+
+def greedy_best(index1, index2, separation):
+    used1, used2, chosen = set(), set(), []
+    for i in np.argsort(separation, kind='mergesort'):
+        if index1[i] not in used1 and index2[i] not in used2:
+            used1.add(index1[i])
+            used2.add(index2[i])
+            chosen.append((index1[i], index2[i]))
+    return sorted(chosen)
+
+
+def test_separation_from_unit_vectors():
+    vectors = unit_vectors([10., 10.5], [-30., -30.2])
+    chord = np.linalg.norm(vectors[0] - vectors[1])
+    assert np.isclose(chord_to_degrees(chord),
+                      angular_separation(10., -30., 10.5, -30.2))
+
+
+def test_all_matches_agree_with_brute_force(positions):
+    radius = 0.02
+    index1, index2, separation = SkyMatcher(*positions[2:]).match(
+        positions[0], positions[1], radius, mode='all')
+    expected = brute_force_pairs(*(positions + (radius,)))
+    assert sorted(zip(index1, index2)) == sorted(zip(*expected[:2]))
+    assert np.allclose(np.sort(separation), np.sort(expected[2]))
+
+
+def test_best_matches_take_pairs_in_order_of_separation(positions):
+    radius = 0.03
+    index1, index2, _ = SkyMatcher(*positions[2:]).match(
+        positions[0], positions[1], radius, mode='best')
+    assert sorted(zip(index1, index2)) == greedy_best(
+        *brute_force_pairs(*(positions + (radius,))))
+    assert np.unique(index1).size == index1.size
+    assert np.unique(index2).size == index2.size
+
+
+def test_best1_matches_are_nearest(positions):
+    radius = 0.03
+    index1, index2, separation = SkyMatcher(*positions[2:]).match(
+        positions[0], positions[1], radius, mode='best1')
+    pairs = brute_force_pairs(*(positions + (radius,)))
+    for (i1, i2, sep) in zip(index1, index2, separation):
+        candidates = pairs[0] == i1
+        assert np.isclose(sep, pairs[2][candidates].min())
+    assert np.all(np.in1d(pairs[0], index1))
+
+
+def test_matches_across_zero_and_the_pole():
+    matcher = SkyMatcher([359.9999, 120.], [0., 89.9999])
+    index1, index2, separation = matcher.match([0.0001, 300.], [0., 89.9999],
+                                               1. / 3600.)
+    assert list(index2) == [0, 1]
+    assert np.all(separation * 3600. < 1.)
+
+
+def test_match_with_2mass_output_columns(tmpdir):
+    match_with_2mass = imp.load_source('match_with_2mass',
+                                       'astrometry/match_with_2mass.py')
+    catalogue = np.zeros(3, dtype=[('Sequence_number', 'i4'), ('RA', 'f8'),
+                                   ('DEC', 'f8'), ('X_coordinate', 'f4')])
+    catalogue['Sequence_number'] = [1, 2, 3]
+    catalogue['RA'] = np.radians([10., 10.1, 50.])
+    catalogue['DEC'] = np.radians([-30., -30.1, -30.])
+    catalogue_fname = str(tmpdir.join('catalogue.fits'))
+    fitsio.write(catalogue_fname, catalogue,
+                 header=[{'name': 'GAINFACT', 'value': 2.}])
+
+    reference_fname = tmpdir.join('2mass.csv')
+    reference_fname.write('ra,dec,jmag,name_2mass\n'
+                          '10.0005,-30.,12.5,00400012-3000000\n'
+                          '10.1,-30.1002,13.,00402400-3006001\n')
+
+    output = str(tmpdir.join('match.fits'))
+    match_with_2mass.match(catalogue_fname, str(reference_fname), output)
+    with fitsio.FITS(output) as infile:
+        matched = infile[1].read()
+        assert infile[1].read_header()['GAINFACT'] == 2.
+
+    assert set(['RA_1', 'DEC_1', 'ra_2', 'dec_2', 'jmag', 'name_2mass',
+                'X_coordinate', 'Sequence_number', 'Separation',
+                'dRA_cosDEC', 'dDEC']) == set(matched.dtype.names)
+    assert list(matched['Sequence_number']) == [1, 2]
+    assert np.allclose(matched['Separation'], [1.56, 0.72], atol=0.01)
+    assert np.allclose(matched['dRA_cosDEC'], [-1.56, 0.], atol=0.01)
+    assert np.allclose(matched['dDEC'], [0., 0.72], atol=0.01)
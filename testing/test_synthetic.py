@@ -0,0 +1,33 @@
+import sys
+import imp
+import numpy as np
+sys.path.insert(0, '.')
+sys.path.insert(0, 'benchmarks')
+
+import synthetic
+from qa_common.photometry_file import PhotometryFile
+
+
+def test_photometry_file_shapes(tmpdir):
+    fname = str(tmpdir.join('output.fits'))
+    synthetic.make_photometry_file(fname, nstars=20, nframes=30)
+    with PhotometryFile.open(fname) as infile:
+        assert infile.read('flux').shape == (20, 30)
+        assert infile.read('ccdx').shape == (20, 30)
+        assert infile.column('imagelist', 'tmid').size == 30
+        assert infile.column('catalogue', 'flux_mean').size == 20
+
+
+def test_raw_frame_overscan_levels(tmpdir):
+    scan_raw_frames = imp.load_source('scan_raw_frames',
+                                      'reduction/scan_raw_frames.py')
+    dark, image = synthetic.make_raw_frames(str(tmpdir), nframes=2, ndarks=1,
+                                            shape=(64, 2088))
+
+    row = scan_raw_frames.extract_from_file(image)
+    assert abs(row['left'] - synthetic.BIAS_LEVEL) < 1.
+    assert abs(row['right'] - synthetic.BIAS_LEVEL - 4.) < 1.
+    assert row['roof_open'] and np.isnan(row['dark'])
+
+    row = scan_raw_frames.extract_from_file(dark, use_biassec=True)
+    assert abs(row['dark'] - 0.3) < 1.
@@ -2,10 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import glob
 import argparse
 from jinja2 import Template
 from qa_common import get_logger
+from qa_common.instrument import instrumented, read_timings, TIMING_ENV
 from collections import defaultdict
 
 logger = get_logger(__file__)
@@ -59,9 +61,65 @@ class Image(object):
     def __str__(self):
         return '<Image "{}">'.format(self.stub)
 
+def short_command(argv, width=80):
+    '''
+    `argv` with directories removed from paths, including those in
+    `option=path` arguments, truncated to `width` characters
+    '''
+    command = ' '.join(re.sub(r'[^\s=]*/', '', arg) for arg in argv)
+    if len(command) > width:
+        command = command[:width - 3] + '...'
+    return command
+
+
+def format_mb(nbytes):
+    if nbytes is None:
+        return '-'
+    return '{:.1f}'.format(nbytes / 1024. ** 2)
+
+
+def timing_rows(records):
+    '''
+    Rows of the timing table: each script run, slowest first, followed by
+    the stages measured within it
+    '''
+    processes = defaultdict(list)
+    for record in records:
+        processes[record['pid']].append(record)
+
+    def total_wall(stages):
+        return sum(record['wall'] for record in stages
+                   if record['depth'] == 0)
+
+    rows = []
+    for stages in sorted(processes.values(), key=total_wall, reverse=True):
+        stages = sorted(stages, key=lambda record: (record['start'],
+                                                    record['depth']))
+        for record in stages:
+            # Scripts may run other scripts' `main` in-process
+            stage_name = record['stage']
+            if record['script'] != stages[0]['script']:
+                stage_name = '{} {}'.format(record['script'], stage_name)
+            rows.append({
+                'script': record['script'],
+                'stage': stage_name,
+                'indent': record['depth'],
+                'command': short_command(record['argv']),
+                'status': record['status'],
+                'wall': '{:.2f}'.format(record['wall']),
+                'cpu': '{:.2f}'.format(record['cpu'] +
+                                       record['children_cpu']),
+                'peak_rss': '{:.0f}'.format(record['peak_rss_mb']),
+                'read': format_mb(record['bytes_read']),
+                'disk_read': format_mb(record['disk_bytes_read']),
+            })
+    return rows
+
+
 class Document(object):
     def __init__(self):
         self.images = []
+        self.timings = []
         self.template = Template(open("templates/index.html").read())
 
     def add_image(self, i):
@@ -73,10 +131,12 @@ class Document(object):
 
     def render(self, width=800):
         result = self.template.render(images=self.images,
+                timings=self.timings,
                 help_lookup=help_lookup,
                 width='{}px'.format(width))
         return(result)
         
+@instrumented
 def main(args):
     files = sorted(glob.glob('{}/plots/*.{}'.format(args.sourcedir, args.extension)))
     files = [os.path.relpath(fname, args.sourcedir) for fname in files]
@@ -87,6 +147,11 @@ def main(args):
         logger.debug('Adding image %s', filename)
         d.add_image(Image(filename))
 
+    timing_file = args.timing or os.environ.get(TIMING_ENV)
+    if timing_file and os.path.isfile(timing_file):
+        logger.info('Adding timings from %s', timing_file)
+        d.timings = timing_rows(read_timings(timing_file))
+
     logger.info('Rendering html file to %s', args.output)
     with open(args.output, 'w') as outfile:
         outfile.write(d.render())
@@ -98,4 +163,6 @@ if __name__ == '__main__':
             type=str)
     parser.add_argument('--extension', help='File extension to use',
             required=True, type=str)
+    parser.add_argument('--timing', help='Timing file of the QA run '
+            '[default: ${}]'.format(TIMING_ENV), required=False)
     main(parser.parse_args())